@@ -23,8 +23,7 @@ import os
 sys.path.append(os.path.dirname(__file__))
 
 from config import Config
-from routes.api_routes import api_bp
-from services.yakki_checker import YakkiChecker
+from routes.api_routes import api_bp, yakki_checker
 
 # ログ設定
 logging.basicConfig(
@@ -73,8 +72,7 @@ def initialize_services():
         Config.validate_config()
         logger.info("設定値検証完了")
         
-        # YakkiCheckerサービスの初期化（他のサービスも含む）
-        yakki_checker = YakkiChecker()
+        # YakkiCheckerサービスはAPIルートで初期化済みのものを使う（NG表現マッチャーの二重構築を避ける）
         
         # Claude APIの利用可能性確認
         if yakki_checker.claude_service.is_available():
@@ -82,10 +80,12 @@ def initialize_services():
         else:
             logger.warning("Claude APIが利用できません - デモモードで動作")
         
-        # データファイルの読み込み確認
-        ng_data = yakki_checker.data_service.load_ng_expressions()
-        if ng_data is not None:
-            logger.info(f"NG表現データ読み込み完了: {len(ng_data)}件")
+        # NG表現データの読み込み確認
+        ng_matchers = yakki_checker.ng_matchers
+        pattern_count = sum(len(matcher.patterns) for matcher in ng_matchers.all_matchers())
+        if pattern_count:
+            source = yakki_checker.ng_matcher_path or 'CSV'
+            logger.info(f"NG表現データ読み込み完了: {pattern_count}パターン（{source}）")
         else:
             logger.warning("NG表現データの読み込みに失敗")
         
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+一括薬機法チェック（オフライン実行用CLI）
+CSV/JSONLの広告テキストを読み込み、ローカルNG表現チェックをプロセスプールで並列実行して
+結果をJSONL/CSVへ逐次出力する。Webサーバーを経由しないため夜間バッチなどで使用する
+
+使用例:
+    python -m batch_check ads.csv -o results.jsonl --text-column 本文 --category 化粧品
+    python -m batch_check ads.jsonl -o results.csv --workers 8 --claude --text-type キャッチコピー
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Iterator, Optional, TextIO, Union
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from utils.bulk_scanner import BulkNGScanner, NUMPY_AVAILABLE
+from utils.category_matchers import CategoryNGMatchers, normalize_category
+from utils.compiled_matcher import load_compiled_matchers
+from utils.fuzzy_matcher import find_issues_fuzzy
+
+logger = logging.getLogger('batch_check')
+
+# ワーカープロセス内で共有する読み取り専用のコンパイル済みマッチャー
+_worker_matchers: Optional[CategoryNGMatchers] = None
+_worker_scanners: Dict[str, Any] = {}
+_worker_fuzzy = False
+
+RISK_KEYS = {'高': 'high', '中': 'medium', '低': 'low'}
+CSV_FIELDS = ['id', 'category', 'overall_risk', 'total', 'high', 'medium', 'low', 'fragments', 'source']
+
+
+def _init_worker(matcher_path: Optional[str], patterns: Optional[List[Dict[str, Any]]], fuzzy: bool):
+    """
+    ワーカープロセスの初期化
+
+    fork で起動した場合は親プロセスでコンパイル済みのマッチャーをそのまま共有し、
+    spawn で起動した場合のみコンパイル済みファイルをmmapで開く（ファイルがなければパターン情報から構築する）
+    """
+    global _worker_matchers, _worker_fuzzy
+    if _worker_matchers is None and matcher_path:
+        loaded = load_compiled_matchers(matcher_path, None, Config.NG_FUZZY_MAX_DISTANCE)
+        if loaded is not None:
+            _worker_matchers = loaded[0]
+    if _worker_matchers is None:
+        _worker_matchers = CategoryNGMatchers(patterns or [], fuzzy_max_distance=Config.NG_FUZZY_MAX_DISTANCE)
+    _worker_fuzzy = fuzzy
+
+
+def _get_scanner(category: str):
+    """ワーカー内でカテゴリごとの一括スキャナーを取得（numpy未導入時はNone）"""
+    if not NUMPY_AVAILABLE or _worker_fuzzy:
+        return None
+    scanner = _worker_scanners.get(category)
+    if scanner is None:
+        scanner = _worker_scanners[category] = BulkNGScanner(_worker_matchers.get(category))
+    return scanner
+
+
+def _summarize(issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """問題点から総合リスクとリスク別件数を集計"""
+    counts = {'total': len(issues), 'high': 0, 'medium': 0, 'low': 0}
+    for issue in issues:
+        key = RISK_KEYS.get(issue.get('risk_level', '中'))
+        if key:
+            counts[key] += 1
+
+    if counts['high']:
+        overall_risk = '高'
+    elif counts['medium']:
+        overall_risk = '中'
+    else:
+        overall_risk = '低'
+    return {'overall_risk': overall_risk, 'risk_counts': counts}
+
+
+def _error_result(record: Dict[str, Any], error: Union[Exception, str]) -> Dict[str, Any]:
+    """チェックに失敗したレコードの結果（リスクは判定せず、source を error にする）"""
+    return {
+        'id': record['id'],
+        'category': record['category'],
+        'overall_risk': '',
+        'risk_counts': {'total': 0, 'high': 0, 'medium': 0, 'low': 0},
+        'issues': [],
+        'source': 'error',
+        'error': str(error)
+    }
+
+
+def _check_chunk(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ワーカー処理: 1チャンク分のレコードをローカルNG表現チェック"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(records)
+
+    # カテゴリごとにまとめて一括スキャン
+    by_category: Dict[str, List[int]] = {}
+    for index, record in enumerate(records):
+        by_category.setdefault(record['category'], []).append(index)
+
+    for category, indexes in by_category.items():
+        matcher = _worker_matchers.get(category)
+        texts = [records[index]['text'] for index in indexes]
+        issues_list: List[List[Dict[str, Any]]]
+
+        scanner = _get_scanner(category)
+        if scanner is not None:
+            hits_by_text: Dict[int, list] = {}
+            for row in scanner.scan(texts).tolist():
+                hits_by_text.setdefault(row[0], []).append((row[2], row[3], row[1]))
+            issues_list = [
+                matcher.issues_from_hits(text, hits_by_text.get(position, []))
+                for position, text in enumerate(texts)
+            ]
+        elif _worker_fuzzy:
+            fuzzy_matcher = _worker_matchers.get_fuzzy(category)
+            issues_list = [find_issues_fuzzy(matcher, fuzzy_matcher, text) for text in texts]
+        else:
+            issues_list = [matcher.find_issues(text) for text in texts]
+
+        for index, issues in zip(indexes, issues_list):
+            record = records[index]
+            result = {'id': record['id'], 'category': record['category'], **_summarize(issues)}
+            result['issues'] = issues
+            result['source'] = 'local'
+            results[index] = result
+
+    return results
+
+
+def read_records(path: str, input_format: str, text_column: str, id_column: Optional[str],
+                 category: str, category_column: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """入力ファイルを1レコードずつ読み込む（全件をメモリに保持しない）"""
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8-sig', newline='')
+    try:
+        if input_format == 'csv':
+            rows = csv.DictReader(stream)
+        else:
+            rows = (json.loads(line) for line in stream if line.strip())
+
+        for line_number, row in enumerate(rows, 1):
+            text = row.get(text_column)
+            if text is None:
+                logger.warning(f"{line_number}件目: テキスト列 {text_column} がないためスキップ")
+                continue
+            yield {
+                'id': row.get(id_column, line_number) if id_column else line_number,
+                'text': str(text),
+                'category': normalize_category(row.get(category_column) or category) if category_column
+                            else normalize_category(category)
+            }
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def chunked(records: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """レコードを size 件ずつに分割"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ResultWriter:
+    """チェック結果をJSONL/CSVへ逐次書き出す"""
+
+    def __init__(self, stream: TextIO, output_format: str):
+        self.stream = stream
+        self.output_format = output_format
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, result: Dict[str, Any]):
+        if self.csv_writer is None:
+            self.stream.write(json.dumps(result, ensure_ascii=False) + '\n')
+            return
+        self.csv_writer.writerow({
+            'id': result['id'],
+            'category': result['category'],
+            'overall_risk': result['overall_risk'],
+            **{key: result['risk_counts'].get(key, 0) for key in ('total', 'high', 'medium', 'low')},
+            'fragments': ' / '.join(issue.get('fragment', '') for issue in result['issues']),
+            'source': result['source']
+        })
+
+
+class ClaudeFallback:
+    """ローカルチェックで問題が見つからなかったテキストをClaude APIで同時実行数を制限してチェック"""
+
+    def __init__(self, yakki_checker, text_type: str, concurrency: int):
+        self.yakki_checker = yakki_checker
+        self.text_type = text_type
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def check(self, results: List[Dict[str, Any]], texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        問題なしの結果をClaude APIの結果に置き換える（入力順は維持）
+
+        APIエラー・レスポンスの解析失敗（フォールバック応答）はチェックできなかったものとして source を error にする
+        """
+        futures = {
+            index: self.executor.submit(
+                self.yakki_checker._call_claude_api_check,
+                texts[index], self.text_type, result['category'] or '化粧品', '', False
+            )
+            for index, result in enumerate(results)
+            if not result['issues'] and result['source'] == 'local'
+        }
+        for index, future in futures.items():
+            claude_result = future.result()
+            if claude_result.get('is_fallback') or claude_result.get('error'):
+                logger.error(f"ID {results[index]['id']} のClaude APIチェックに失敗しました: {claude_result.get('error')}")
+                results[index] = _error_result(results[index], claude_result.get('error') or 'Claude APIチェックに失敗しました')
+                continue
+            issues = claude_result.get('issues', [])
+            results[index] = {
+                'id': results[index]['id'],
+                'category': results[index]['category'],
+                **_summarize(issues),
+                'issues': issues,
+                'source': 'claude'
+            }
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def run(args) -> Optional[int]:
+    """
+    一括チェックを実行し、処理件数を返す（実行できない場合はNone）
+
+    チェックに失敗したチャンクは処理を止めずに source が error の結果を書き出し、件数をログに出力する
+    """
+    from services.data_service import DataService
+    from services.yakki_checker import YakkiChecker
+
+    global _worker_matchers
+    # 1回で終わる処理のため、ファイル監視・バックグラウンドの再読み込みは行わない（ワーカーにも引き継がない）
+    yakki_checker = YakkiChecker(DataService(auto_reload=False))
+    # spawn で起動するワーカーにはコンパイル済みファイルがあればパスだけを渡す
+    matcher_path = yakki_checker.ng_matcher_path
+    patterns = None if matcher_path else yakki_checker.ng_patterns
+    # fork で起動するワーカーは親プロセスのコンパイル済みマッチャーを共有する
+    _worker_matchers = yakki_checker.ng_matchers
+
+    claude = None
+    if args.claude:
+        if not yakki_checker.claude_service.is_available():
+            logger.error("Claude APIが利用できないため --claude は使用できません")
+            return None
+        claude = ClaudeFallback(yakki_checker, args.text_type, args.claude_concurrency)
+
+    input_format = args.input_format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    output_format = args.output_format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    records = read_records(args.input, input_format, args.text_column, args.id_column,
+                           args.category, args.category_column)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    writer = ResultWriter(output, output_format)
+    processed = 0
+    failed = 0
+    start_time = time.perf_counter()
+
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                  initargs=(matcher_path, patterns, args.fuzzy)) as pool:
+            # 処理中のチャンク数を制限し、入力を先読みしすぎないようにする
+            pending = deque()
+            chunks = chunked(records, args.chunk_size)
+            exhausted = False
+
+            while pending or not exhausted:
+                while not exhausted and len(pending) < args.workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    texts = [record['text'] for record in chunk] if claude else None
+                    pending.append((pool.apply_async(_check_chunk, (chunk,)), chunk, texts))
+
+                if not pending:
+                    break
+
+                async_result, chunk, texts = pending.popleft()
+                try:
+                    results = async_result.get()
+                except Exception as e:
+                    logger.error(f"{processed + 1}〜{processed + len(chunk)}件目のチェックに失敗しました: {e}")
+                    results = [_error_result(record, e) for record in chunk]
+                if claude:
+                    results = claude.check(results, texts)
+                for result in results:
+                    writer.write(result)
+                    if result['source'] == 'error':
+                        failed += 1
+                processed += len(results)
+
+                elapsed = time.perf_counter() - start_time
+                logger.info(f"{processed}件処理（{processed / max(elapsed, 1e-9):.0f}件/秒）")
+    finally:
+        if claude:
+            claude.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if failed:
+        logger.warning(f"チェックに失敗したレコード: {failed}件（source: error）")
+    return processed
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog='python -m batch_check',
+        description='広告テキストを一括で薬機法チェック（ローカルNG表現チェック、任意でClaude API）'
+    )
+    parser.add_argument('input', help='入力ファイル（CSV/JSONL、- で標準入力）')
+    parser.add_argument('-o', '--output', default='-', help='出力ファイル（JSONL/CSV、既定は標準出力）')
+    parser.add_argument('--input-format', choices=['csv', 'jsonl'], help='入力形式（既定は拡張子で判定）')
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'], help='出力形式（既定は拡張子で判定）')
+    parser.add_argument('--text-column', default='text', help='テキストの列名・キー（既定: text）')
+    parser.add_argument('--id-column', help='IDの列名・キー（既定は行番号）')
+    parser.add_argument('--category', default='', help='商品カテゴリ（全件共通）')
+    parser.add_argument('--category-column', help='商品カテゴリの列名・キー（行ごとに指定する場合）')
+    parser.add_argument('--fuzzy', action='store_true', help='あいまい検出（記号・空白の挿入や軽微な改変の許容）を行う')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ワーカープロセス数（既定: CPUコア数）')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='ワーカーに渡す1回あたりの件数（既定: 2000）')
+    parser.add_argument('--claude', action='store_true', help='ローカルチェックで問題がなかったテキストをClaude APIでチェック')
+    parser.add_argument('--claude-concurrency', type=int, default=4, help='Claude APIの同時実行数（既定: 4）')
+    parser.add_argument('--text-type', default='商品説明文・広告文・通常テキスト', help='Claude APIチェック時の文章種類')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=Config.LOG_LEVEL, format=Config.LOG_FORMAT, stream=sys.stderr)
+
+    start_time = time.perf_counter()
+    processed = run(args)
+    if processed is None:
+        return 1
+    elapsed = time.perf_counter() - start_time
+    logger.info(f"一括チェック完了: {processed}件, {elapsed:.1f}秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
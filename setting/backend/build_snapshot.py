@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+データスナップショット作成（ビルド用CLI）
+data/ と rule/ の内容をプロンプト用に整形し、ガイダンス表・コンパイル済みNG表現マッチャーと合わせて
+1つのファイルに書き出す。サーバーは起動時にこのファイルを読み込むだけで済む
+
+使用例:
+    python -m build_snapshot                      # Config.DATA_SNAPSHOT_PATH に作成
+    python -m build_snapshot -o /tmp/snapshot.bin
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from services.data_service import DataService
+from services.data_snapshot import write_data_snapshot
+
+logger = logging.getLogger('build_snapshot')
+
+
+def build(output: str) -> str:
+    """元ファイルからスナップショットを作成し、バージョンを返す"""
+    data_service = DataService(use_snapshot=False, auto_reload=False)
+    return write_data_snapshot(output, data_service.snapshot)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog='python -m build_snapshot',
+        description='data/ と rule/ から起動用のデータスナップショットを作成'
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), Config.DATA_SNAPSHOT_PATH or ''),
+        help='出力ファイル（既定: Config.DATA_SNAPSHOT_PATH）'
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=Config.LOG_LEVEL, format=Config.LOG_FORMAT, stream=sys.stderr)
+
+    start_time = time.perf_counter()
+    try:
+        build(args.output)
+    except Exception as e:
+        logger.error(f"データスナップショットの作成に失敗: {e}")
+        return 1
+    logger.info(f"データスナップショット作成完了: {args.output}, {time.perf_counter() - start_time:.2f}秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
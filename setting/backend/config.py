@@ -25,7 +25,13 @@ class Config:
     CLAUDE_API_KEY = os.environ.get('CLAUDE_API_KEY')
     CLAUDE_MODEL = 'claude-3-5-sonnet-20241022'
     CLAUDE_MAX_TOKENS = 4000
+    # 詳細チェックの最大出力トークン数（応答の推定の大きさに合わせてこの範囲で決める）
+    # 下限は CLAUDE_MAX_TOKENS と同じにし、長いテキストの場合だけ大きくする
+    CLAUDE_MIN_OUTPUT_TOKENS = int(os.environ.get('CLAUDE_MIN_OUTPUT_TOKENS', CLAUDE_MAX_TOKENS))
+    CLAUDE_MAX_OUTPUT_TOKENS = int(os.environ.get('CLAUDE_MAX_OUTPUT_TOKENS', 8192))
     CLAUDE_TEMPERATURE = 0.3
+    # 変わらないプロンプトの接頭部分（システムプロンプト・参考データ・ルール）をプロンプトキャッシュの対象にする
+    CLAUDE_PROMPT_CACHE = os.environ.get('CLAUDE_PROMPT_CACHE', 'True').lower() == 'true'
     
     # アプリケーション用API設定
     VALID_API_KEYS = os.environ.get('VALID_API_KEYS', '').split(',') if os.environ.get('VALID_API_KEYS') else []
@@ -37,6 +43,42 @@ class Config:
     # ファイルパス設定
     DATA_DIR = 'data'
     RULE_DIR = 'rule'
+    # 参照ファイル（data/・rule/）の役割・対象・優先度を記述したマニフェスト（相対パスはbackend/基準）
+    REFERENCE_MANIFEST_PATH = os.environ.get('REFERENCE_MANIFEST_PATH', 'reference_manifest.json')
+    # 詳細チェックのプロンプトには参考資料のうちチェック対象テキストに関連するセクションのみを含める（マニフェストの retrieval）
+    PROMPT_RETRIEVAL = os.environ.get('PROMPT_RETRIEVAL', 'True').lower() == 'true'
+    PROMPT_RETRIEVAL_TOP_K = int(os.environ.get('PROMPT_RETRIEVAL_TOP_K', 8))  # 含めるセクション数
+    # 参考データ・ルールのマークダウン装飾・繰り返しの定型文を除き、NG表現データを表形式にする（スナップショット作成時）
+    PROMPT_MINIFY = os.environ.get('PROMPT_MINIFY', 'True').lower() == 'true'
+    # 詳細チェックのプロンプトの入力トークン数の上限（推定値。0で無制限。超える場合は優先度の低い参考データから省略）
+    PROMPT_INPUT_TOKEN_BUDGET = int(os.environ.get('PROMPT_INPUT_TOKEN_BUDGET', 100000))
+    # 上限のうちチェック対象テキスト・検索した参考データなどリクエストごとの部分に残す分
+    PROMPT_REQUEST_TOKEN_RESERVE = int(os.environ.get('PROMPT_REQUEST_TOKEN_RESERVE', 12000))
+    # ビルド済みデータスナップショット（python -m build_snapshot で作成。相対パスはbackend/基準）
+    DATA_SNAPSHOT_PATH = os.environ.get('DATA_SNAPSHOT_PATH', os.path.join('build', 'data_snapshot.bin'))
+    # ファイル監視（プロセスごとに1つ。watchdogがない場合はポーリング）
+    FILE_WATCH_DEBOUNCE = float(os.environ.get('FILE_WATCH_DEBOUNCE', 1.0))  # 連続する変更をまとめる待ち時間（秒）
+    FILE_WATCH_INTERVAL = float(os.environ.get('FILE_WATCH_INTERVAL', 2.0))  # ポーリング時の確認間隔（秒）
+    
+    # 簡易チェック（ローカルNG表現スキャン）設定
+    QUICK_CHECK_MAX_LENGTH = 50000
+    QUICK_CHECK_SESSION_MAX = 1000  # 逐次再走査セッションの保持数
+    QUICK_CHECK_SESSION_TTL = 1800  # 30分（秒）
+    
+    # あいまいNG表現検出（記号・空白の挿入や1文字程度の改変を許容）
+    NG_FUZZY_MATCHING = os.environ.get('NG_FUZZY_MATCHING', 'False').lower() == 'true'  # 詳細チェックの前処理で使用
+    NG_FUZZY_MAX_DISTANCE = 1  # 許容する編集距離の上限
+    
+    # コンパイル済みNG表現マッチャーの保存先（backend/からの相対パス。各ワーカーがmmapで共有。空にすると無効）
+    # 読み込んだファイルはそのまま信頼するため、他のユーザーが書き込める共有の一時ディレクトリは使わない
+    NG_MATCHER_CACHE_DIR = os.environ.get('NG_MATCHER_CACHE_DIR', os.path.join('build', 'ng_matchers'))
+    
+    # WebSocketライブチェック設定
+    LIVE_CHECK_IDLE_SECONDS = float(os.environ.get('LIVE_CHECK_IDLE_SECONDS', 1.5))  # 詳細チェックまでの入力待ち時間（秒）
+    LIVE_CHECK_MAX_WORKERS = 4  # 詳細チェックの同時実行数
+    # 1ワーカープロセスで同時に受け付けるWebSocket接続数（上限を超えた接続は拒否する）
+    # 各接続は閉じるまでgunicornのスレッドを1つ占有するため、--threads より小さくしてHTTPリクエスト用のスレッドを残す
+    LIVE_CHECK_MAX_CONNECTIONS = int(os.environ.get('LIVE_CHECK_MAX_CONNECTIONS', 4))
     
     # キャッシュ設定
     CACHE_MAX_SIZE = 100
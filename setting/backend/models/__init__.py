@@ -5,6 +5,6 @@
 薬機法チェッカーのデータ構造とモデルクラスを定義
 """
 
-from .data_models import DataCache, CheckCache
+from .data_models import DataCache, CheckCache, ScanSessionStore
 
-__all__ = ['DataCache', 'CheckCache']
\ No newline at end of file
+__all__ = ['DataCache', 'CheckCache', 'ScanSessionStore']
\ No newline at end of file
@@ -2,11 +2,14 @@
 # 変更内容: DataCache、CheckCache、DataFileEventHandlerクラスを独立したモジュールに移動
 """
 データモデルモジュール
-キャッシュ管理とファイル監視に関するクラスを定義
+キャッシュ管理に関するクラスを定義（ファイル監視は utils.file_watcher）
 """
 
 import os
+import io
+import csv
 import time
+import uuid
 import threading
 import hashlib
 import logging
@@ -14,218 +17,149 @@ from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
-# watchdogの可用性チェック
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
-    WATCHDOG_AVAILABLE = True
-except ImportError:
-    WATCHDOG_AVAILABLE = False
-    logger.warning("watchdogが利用できません。ファイル監視機能が制限されます。")
+class FileSegment:
+    """参照ファイル1つ分の読み込み結果（パスと内容ハッシュで識別）"""
+    __slots__ = ('path', 'size', 'mtime_ns', 'sha256', 'value', 'variant')
+    
+    def __init__(self, path, size, mtime_ns, sha256, value, variant=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+        self.value = value  # ファイルの内容を変換した結果
+        self.variant = variant
+    
+    def state(self):
+        """元ファイルの状態（データスナップショットに記録する形式）"""
+        return {'size': self.size, 'mtime_ns': self.mtime_ns, 'sha256': self.sha256}
+
 
 class DataCache:
-    """データファイルのキャッシュとリアルタイム更新を管理"""
+    """参照ファイルの読み込み結果（セグメント）のキャッシュを管理"""
     
     def __init__(self):
-        self.data_cache = {}
-        self.rule_cache = {}
-        self.file_timestamps = {}
+        self.segments = {}  # ファイルの絶対パス -> FileSegment
         self.lock = threading.Lock()
-        self.observer = None
+    
+    def invalidate_cache(self, cache_type="all"):
+        """キャッシュを無効化（セグメントは次回の取得時に内容を確認し直す）"""
+        self.invalidate_segments()
+        logger.info(f"参照ファイルのキャッシュを無効化しました: {cache_type}")
+    
+    def get_segment(self, file_path, render, variant=None):
+        """
+        参照ファイル1つ分の読み込み結果（セグメント）を取得
+        
+        サイズ・更新時刻が前回と同じなら読み込まず、読み込んでも内容ハッシュが前回と同じなら変換し直さない
         
-    def get_file_timestamp(self, file_path):
-        """ファイルのタイムスタンプを取得"""
+        Args:
+            file_path: ファイルのパス
+            render: ファイルの内容（バイト列）を変換する関数
+            variant: 変換方法の識別子（エンコーディングなど。前回と異なる場合は変換し直す）
+        
+        Returns:
+            FileSegment（ファイルがない場合はNone）
+        """
+        file_path = os.path.abspath(file_path)
         try:
-            return os.path.getmtime(file_path)
+            stat = os.stat(file_path)
         except OSError:
-            return 0
-    
-    def is_file_modified(self, file_path):
-        """ファイルが変更されたかチェック"""
-        current_timestamp = self.get_file_timestamp(file_path)
-        cached_timestamp = self.file_timestamps.get(file_path, 0)
-        return current_timestamp > cached_timestamp
-    
-    def update_file_timestamp(self, file_path):
-        """ファイルのタイムスタンプを更新"""
-        self.file_timestamps[file_path] = self.get_file_timestamp(file_path)
-    
-    def invalidate_cache(self, cache_type="all"):
-        """キャッシュを無効化"""
+            with self.lock:
+                self.segments.pop(file_path, None)
+            return None
+        
         with self.lock:
-            if cache_type == "all" or cache_type == "data":
-                self.data_cache.clear()
-                logger.info("データキャッシュを無効化しました")
-            if cache_type == "all" or cache_type == "rule":
-                self.rule_cache.clear()
-                logger.info("ルールキャッシュを無効化しました")
-    
-    def get_cached_data_content(self, load_all_data_files_func):
-        """キャッシュされたデータコンテンツを取得（必要に応じて更新）"""
+            cached = self.segments.get(file_path)
+        if cached is not None and cached.variant != variant:
+            cached = None
+        if cached is not None and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+            return cached
+        
+        # 状態は内容より先に取得しておき、読み込み中に更新された場合は次回の確認で読み込み直す
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+        if cached is not None and cached.sha256 == content_hash:
+            value = cached.value
+        else:
+            value = render(data)
+            logger.info(f"参照ファイルを読み込み: {os.path.basename(file_path)}")
+        
+        segment = FileSegment(file_path, stat.st_size, stat.st_mtime_ns, content_hash, value, variant)
         with self.lock:
-            data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-            cache_key = "all_data_content"
-            
-            # データディレクトリ内のファイルをチェック
-            needs_update = False
-            if cache_key not in self.data_cache:
-                needs_update = True
-            else:
-                # 全ファイルの変更チェック
-                try:
-                    for filename in os.listdir(data_dir):
-                        file_path = os.path.join(data_dir, filename)
-                        if os.path.isfile(file_path) and self.is_file_modified(file_path):
-                            needs_update = True
-                            break
-                except OSError:
-                    needs_update = True
-            
-            # 必要に応じてキャッシュを更新
-            if needs_update:
-                logger.info("dataディレクトリの変更を検知 - キャッシュを更新中...")
-                self.data_cache[cache_key] = load_all_data_files_func()
-                
-                # タイムスタンプを更新
-                try:
-                    for filename in os.listdir(data_dir):
-                        file_path = os.path.join(data_dir, filename)
-                        if os.path.isfile(file_path):
-                            self.update_file_timestamp(file_path)
-                except OSError:
-                    pass
-                
-                logger.info(f"データキャッシュ更新完了: {len(self.data_cache[cache_key])}文字")
-            
-            return self.data_cache[cache_key]
+            self.segments[file_path] = segment
+        return segment
     
-    def get_cached_rule_content(self, text_type, load_rule_file_func):
-        """キャッシュされたルールコンテンツを取得（必要に応じて更新）"""
+    def get_segment_state(self, file_path):
+        """読み込み済みセグメントの元ファイルの状態（サイズ・更新時刻・内容ハッシュ）"""
         with self.lock:
-            rule_dir = os.path.join(os.path.dirname(__file__), '..', 'rule')
-            cache_key = f"rule_{text_type}"
-            
-            # ルールファイルのマッピング
-            rule_file_mapping = {
-                'キャッチコピー': 'キャッチコピー.md',
-                'LP見出し・タイトル': 'LP見出し・タイトル.md',
-                '商品説明文・広告文・通常テキスト': '商品説明文.md',
-                'お客様の声': 'お客様の声.md'
-            }
-            
-            filename = rule_file_mapping.get(text_type)
-            if not filename:
-                return ""
-            
-            file_path = os.path.join(rule_dir, filename)
-            
-            # ファイル変更チェック
-            needs_update = False
-            if cache_key not in self.rule_cache:
-                needs_update = True
-            elif self.is_file_modified(file_path):
-                needs_update = True
-            
-            # 必要に応じてキャッシュを更新
-            if needs_update:
-                logger.info(f"ルールファイル '{filename}' の変更を検知 - キャッシュを更新中...")
-                self.rule_cache[cache_key] = load_rule_file_func(text_type)
-                self.update_file_timestamp(file_path)
-                logger.info(f"ルールキャッシュ更新完了: {filename}")
-            
-            return self.rule_cache[cache_key]
+            segment = self.segments.get(os.path.abspath(file_path))
+        return segment.state() if segment is not None else None
     
-    def start_file_watcher(self):
-        """ファイル監視を開始"""
-        if not WATCHDOG_AVAILABLE:
-            logger.info("watchdogが利用できないため、ポーリングベースの更新を使用します")
-            return
+    def invalidate_segments(self, file_paths=None):
+        """
+        セグメントを次回の取得時に確認し直すようにする（省略時は全セグメント）
         
-        try:
-            data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-            rule_dir = os.path.join(os.path.dirname(__file__), '..', 'rule')
-            
-            event_handler = DataFileEventHandler(self)
-            self.observer = Observer()
-            
-            # dataディレクトリを監視
-            if os.path.exists(data_dir):
-                self.observer.schedule(event_handler, data_dir, recursive=False)
-                logger.info(f"ファイル監視開始: {data_dir}")
-            
-            # ruleディレクトリを監視
-            if os.path.exists(rule_dir):
-                self.observer.schedule(event_handler, rule_dir, recursive=False)
-                logger.info(f"ファイル監視開始: {rule_dir}")
-            
-            self.observer.start()
-            logger.info("リアルタイムファイル監視が開始されました")
-            
-        except Exception as e:
-            logger.error(f"ファイル監視の開始に失敗: {str(e)}")
-    
-    def stop_file_watcher(self):
-        """ファイル監視を停止"""
-        if self.observer and self.observer.is_alive():
-            self.observer.stop()
-            self.observer.join()
-            logger.info("ファイル監視を停止しました")
+        内容が変わっていなければ前回の変換結果をそのまま使う
+        """
+        targets = None if file_paths is None else {os.path.abspath(path) for path in file_paths}
+        with self.lock:
+            for path, segment in self.segments.items():
+                if targets is None or path in targets:
+                    segment.mtime_ns = None
 
 
-class DataFileEventHandler:
-    """ファイル変更イベントハンドラー"""
+class NGExpressionTable:
+    """NG表現データ（CSVの列名と各行の値。空欄は空文字列）"""
+    __slots__ = ('columns', 'rows', '_index')
     
-    def __init__(self, data_cache):
-        self.data_cache = data_cache
-        self.last_event_time = {}
-        self.debounce_time = 1.0  # 1秒のデバウンス
+    def __init__(self, columns, rows):
+        self.columns = tuple(columns)
+        self.rows = rows  # 列順に値を並べたタプルのリスト
+        self._index = {column: index for index, column in enumerate(self.columns)}
     
-    def on_modified(self, event):
-        if event.is_directory:
-            return
+    @classmethod
+    def from_csv_text(cls, text):
+        """CSVテキストから作成（空行は読み飛ばす）"""
+        reader = csv.reader(io.StringIO(text.lstrip('\ufeff')))
+        header = next(reader, None) or []
+        columns = [column.strip() for column in header]
+        width = len(columns)
         
-        # デバウンス処理（短時間での重複イベントを防ぐ）
-        current_time = time.time()
-        last_time = self.last_event_time.get(event.src_path, 0)
-        if current_time - last_time < self.debounce_time:
-            return
-        
-        self.last_event_time[event.src_path] = current_time
-        
-        file_path = event.src_path
-        filename = os.path.basename(file_path)
-        
-        logger.info(f"ファイル変更検知: {filename}")
-        
-        # dataディレクトリのファイルが変更された場合
-        if '/data/' in file_path:
-            self.data_cache.invalidate_cache("data")
-            logger.info("dataディレクトリの変更によりキャッシュを無効化")
-        
-        # ruleディレクトリのファイルが変更された場合
-        elif '/rule/' in file_path:
-            self.data_cache.invalidate_cache("rule")
-            logger.info("ruleディレクトリの変更によりキャッシュを無効化")
+        rows = []
+        for values in reader:
+            if not any(value.strip() for value in values):
+                continue
+            # 列数の過不足は空欄で補う・切り捨てる
+            rows.append(tuple(values[:width]) + ('',) * (width - len(values)))
+        return cls(columns, rows)
     
-    def on_created(self, event):
-        if not event.is_directory:
-            logger.info(f"新規ファイル作成検知: {os.path.basename(event.src_path)}")
-            self.on_modified(event)
+    @classmethod
+    def from_records(cls, records):
+        """辞書のリストから作成（列は最初に現れた順）"""
+        columns = list(dict.fromkeys(column for record in records for column in record))
+        rows = [tuple(str(record.get(column, '')) for column in columns) for record in records]
+        return cls(columns, rows)
     
-    def on_deleted(self, event):
-        if not event.is_directory:
-            logger.info(f"ファイル削除検知: {os.path.basename(event.src_path)}")
-            # ファイル削除の場合も同様にキャッシュを無効化
-            if '/data/' in event.src_path:
-                self.data_cache.invalidate_cache("data")
-            elif '/rule/' in event.src_path:
-                self.data_cache.invalidate_cache("rule")
-
-
-# watchdog が利用可能な場合のみ FileSystemEventHandler を継承
-if WATCHDOG_AVAILABLE:
-    class DataFileEventHandler(FileSystemEventHandler, DataFileEventHandler):
-        pass
+    def __len__(self):
+        return len(self.rows)
+    
+    @property
+    def empty(self):
+        return not self.rows
+    
+    def column(self, name):
+        """列の値のリスト（列がない場合は空文字列のリスト）"""
+        index = self._index.get(name)
+        if index is None:
+            return [''] * len(self.rows)
+        return [row[index] for row in self.rows]
+    
+    def records(self):
+        """各行を空欄を除いた辞書（列名 -> 値）として順に返す"""
+        columns = self.columns
+        for row in self.rows:
+            yield {column: value for column, value in zip(columns, row) if value != ''}
 
 
 class CheckCache:
@@ -238,9 +172,9 @@ class CheckCache:
         self.misses = 0
         self.lock = threading.Lock()
     
-    def get_cache_key(self, text, category, text_type, special_points=None, medical_approval=False):
-        """キャッシュキーの生成"""
-        content = f"{text}|{category}|{text_type}|{special_points or ''}|{medical_approval}"
+    def get_cache_key(self, text, category, text_type, special_points=None, medical_approval=False, data_version=''):
+        """キャッシュキーの生成（data_version: 参照データのバージョン）"""
+        content = f"{text}|{category}|{text_type}|{special_points or ''}|{medical_approval}|{data_version}"
         return hashlib.sha256(content.encode()).hexdigest()
     
     def get(self, key):
@@ -285,4 +219,71 @@ class CheckCache:
             self.cache.clear()
             self.hits = 0
             self.misses = 0
-            logger.info("キャッシュをクリアしました")
\ No newline at end of file
+            logger.info("キャッシュをクリアしました")
+
+
+class ScanSessionStore:
+    """逐次再走査用の編集セッション（テキストと検出結果）を保持"""
+    def __init__(self, max_size=1000, ttl=1800):
+        self.sessions = OrderedDict()  # 順序を保持して古いものから削除
+        self.max_size = max_size
+        self.ttl = ttl  # Time To Live (秒)
+        self.lock = threading.Lock()
+    
+    def create(self, text, hits, category='', data_version=''):
+        """新しいセッションを作成してIDを返す"""
+        session_id = uuid.uuid4().hex
+        self.set(session_id, text, hits, category, data_version)
+        return session_id
+    
+    def get(self, session_id):
+        """セッションの (テキスト, 検出結果, 商品カテゴリ, 走査時の参照データのバージョン) を取得"""
+        with self.lock:
+            if session_id in self.sessions:
+                text, hits, category, data_version, timestamp = self.sessions[session_id]
+                if time.time() - timestamp < self.ttl:
+                    self.sessions.move_to_end(session_id)
+                    return text, hits, category, data_version
+                # 期限切れ
+                del self.sessions[session_id]
+            return None
+    
+    def edited_length(self, session_id, edits):
+        """
+        編集差分（offset, delete, insert）を順に適用した後のテキストの文字数（セッションが存在しない場合はNone）
+        
+        文字数上限の確認用に、編集の適用・再走査の前に保存済みのテキストから計算する
+        
+        Raises:
+            TypeError: edits が編集差分の辞書のリストでない場合
+            ValueError: delete が整数でない場合
+        """
+        if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+            raise TypeError("edits must be a list of {offset, delete, insert}")
+        session = self.get(session_id)
+        if session is None:
+            return None
+        length = len(session[0])
+        for edit in edits:
+            length += len(str(edit.get('insert', ''))) - int(edit.get('delete', 0))
+        return length
+    
+    def set(self, session_id, text, hits, category='', data_version=''):
+        """セッションを保存（最終アクセス時刻を更新）"""
+        with self.lock:
+            if session_id not in self.sessions and len(self.sessions) >= self.max_size:
+                # 最も古いものを削除
+                self.sessions.popitem(last=False)
+            
+            self.sessions[session_id] = (text, hits, category, data_version, time.time())
+            self.sessions.move_to_end(session_id)
+    
+    def delete(self, session_id):
+        """セッションを削除"""
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+    
+    def clear(self):
+        """全セッションを削除"""
+        with self.lock:
+            self.sessions.clear()
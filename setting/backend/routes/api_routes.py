@@ -12,59 +12,82 @@ from flask import Blueprint, request, jsonify, Response, stream_with_context
 from functools import wraps
 
 from services.yakki_checker import YakkiChecker
+from services.live_check import LiveCheckSession, acquire_connection, release_connection
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# flask-sock（WebSocket）の可用性チェック
+try:
+    from flask_sock import Sock
+    SOCK_AVAILABLE = True
+except ImportError:
+    SOCK_AVAILABLE = False
+    logger.warning("flask-sockが利用できません。WebSocketライブチェックは無効です。")
+
 # Blueprintの作成
 api_bp = Blueprint('api', __name__)
+sock = Sock() if SOCK_AVAILABLE else None
 
 # サービスインスタンス
 yakki_checker = YakkiChecker()
 
 # セキュリティ機能
+def verify_api_key():
+    """
+    リクエストのAPIキーを検証
+    
+    Returns:
+        認証エラーの内容（認証成功・認証不要の場合はNone）
+    """
+    # 開発環境かつAPIキーが設定されていない場合は認証をスキップ
+    if Config.DEBUG and not Config.VALID_API_KEYS:
+        logger.info(f"開発環境: 認証スキップ - {request.remote_addr}")
+        return None
+    
+    # 認証が無効化されている場合はスキップ
+    if not Config.VALID_API_KEYS:
+        return None
+    
+    # APIキーの確認
+    api_key = None
+    
+    # Headerから取得
+    if 'X-API-Key' in request.headers:
+        api_key = request.headers['X-API-Key']
+    # クエリパラメータから取得（後方互換性）
+    elif 'api_key' in request.args:
+        api_key = request.args.get('api_key')
+    # JSONボディから取得
+    elif request.is_json and request.json and 'api_key' in request.json:
+        api_key = request.json['api_key']
+    
+    if not api_key:
+        return {
+            "error": "API key required",
+            "message": "API key must be provided in X-API-Key header, query parameter, or request body"
+        }
+    
+    # APIキーの検証（ハッシュ化して比較）
+    import hashlib
+    hashed_key = hashlib.sha256(api_key.encode()).hexdigest()
+    
+    if hashed_key not in {hashlib.sha256(key.encode()).hexdigest() for key in Config.VALID_API_KEYS}:
+        logger.warning(f"無効なAPIキーでのアクセス試行: {request.remote_addr}")
+        return {
+            "error": "Invalid API key",
+            "message": "The provided API key is not valid"
+        }
+    
+    return None
+
 def require_api_key(f):
     """APIキー認証デコレータ"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # 開発環境かつAPIキーが設定されていない場合は認証をスキップ
-        if Config.DEBUG and not Config.VALID_API_KEYS:
-            logger.info(f"開発環境: 認証スキップ - {request.remote_addr}")
-            return f(*args, **kwargs)
-        
-        # 認証が無効化されている場合はスキップ
-        if not Config.VALID_API_KEYS:
-            return f(*args, **kwargs)
-        
-        # APIキーの確認
-        api_key = None
-        
-        # Headerから取得
-        if 'X-API-Key' in request.headers:
-            api_key = request.headers['X-API-Key']
-        # クエリパラメータから取得（後方互換性）
-        elif 'api_key' in request.args:
-            api_key = request.args.get('api_key')
-        # JSONボディから取得
-        elif request.is_json and request.json and 'api_key' in request.json:
-            api_key = request.json['api_key']
-        
-        if not api_key:
-            return jsonify({
-                "error": "API key required",
-                "message": "API key must be provided in X-API-Key header, query parameter, or request body"
-            }), 401
-        
-        # APIキーの検証（ハッシュ化して比較）
-        import hashlib
-        hashed_key = hashlib.sha256(api_key.encode()).hexdigest()
-        
-        if hashed_key not in {hashlib.sha256(key.encode()).hexdigest() for key in Config.VALID_API_KEYS}:
-            logger.warning(f"無効なAPIキーでのアクセス試行: {request.remote_addr}")
-            return jsonify({
-                "error": "Invalid API key",
-                "message": "The provided API key is not valid"
-            }), 401
+        auth_error = verify_api_key()
+        if auth_error:
+            return jsonify(auth_error), 401
         
         return f(*args, **kwargs)
     
@@ -165,6 +188,190 @@ def check_text():
             "message": "チェック処理中にエラーが発生しました"
         }), 500
 
+@api_bp.route('/api/quick-check', methods=['POST'])
+@require_api_key
+def quick_check():
+    """ローカルNG表現スキャンのみの簡易チェックエンドポイント（Claude API不使用）"""
+    try:
+        start_time = time.perf_counter()
+        
+        if not request.is_json:
+            return jsonify({"error": "Content-Type must be application/json"}), 400
+        
+        data = request.json
+        if 'text' not in data:
+            return jsonify({
+                "error": "Missing required fields",
+                "missing_fields": ['text']
+            }), 400
+        
+        text = str(data['text'])
+        
+        if len(text) > Config.QUICK_CHECK_MAX_LENGTH:
+            return jsonify({
+                "error": f"Text is too long (max {Config.QUICK_CHECK_MAX_LENGTH} characters)"
+            }), 400
+        
+        result = yakki_checker.quick_check(
+            text,
+            category=str(data.get('category', '')).strip(),
+            fuzzy=bool(data.get('fuzzy', False))
+        )
+        result['processing_time_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+        
+        response = jsonify(result)
+        return add_security_headers(response)
+        
+    except Exception as e:
+        logger.error(f"簡易チェック処理エラー: {e}")
+        return jsonify({
+            "error": "Internal server error",
+            "message": "簡易チェック処理中にエラーが発生しました"
+        }), 500
+
+@api_bp.route('/api/quick-check/session', methods=['POST'])
+@require_api_key
+def start_quick_check_session():
+    """逐次再走査用の簡易チェックセッション開始エンドポイント"""
+    try:
+        start_time = time.perf_counter()
+        
+        if not request.is_json:
+            return jsonify({"error": "Content-Type must be application/json"}), 400
+        
+        data = request.json
+        if 'text' not in data:
+            return jsonify({
+                "error": "Missing required fields",
+                "missing_fields": ['text']
+            }), 400
+        
+        text = str(data['text'])
+        
+        if len(text) > Config.QUICK_CHECK_MAX_LENGTH:
+            return jsonify({
+                "error": f"Text is too long (max {Config.QUICK_CHECK_MAX_LENGTH} characters)"
+            }), 400
+        
+        result = yakki_checker.start_quick_check_session(text, str(data.get('category', '')).strip())
+        result['processing_time_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+        
+        response = jsonify(result)
+        return add_security_headers(response)
+        
+    except Exception as e:
+        logger.error(f"簡易チェックセッション開始エラー: {e}")
+        return jsonify({
+            "error": "Internal server error",
+            "message": "簡易チェック処理中にエラーが発生しました"
+        }), 500
+
+@api_bp.route('/api/quick-check/session/<session_id>', methods=['POST'])
+@require_api_key
+def update_quick_check_session(session_id):
+    """編集差分（offset, delete, insert）による逐次再走査エンドポイント"""
+    try:
+        start_time = time.perf_counter()
+        
+        if not request.is_json:
+            return jsonify({"error": "Content-Type must be application/json"}), 400
+        
+        data = request.json
+        # 複数の編集差分（edits）または単一の編集差分を受け付ける
+        edits = data.get('edits')
+        if edits is None:
+            edits = [data]
+        
+        if not isinstance(edits, list) or not all(isinstance(edit, dict) for edit in edits):
+            return jsonify({"error": "edits must be a list of {offset, delete, insert}"}), 400
+        
+        try:
+            # 文字数上限を超える編集は適用・再走査せずに拒否する（WebSocketライブチェックと同じ判定）
+            length = yakki_checker.scan_sessions.edited_length(session_id, edits)
+            if length is not None and length > Config.QUICK_CHECK_MAX_LENGTH:
+                yakki_checker.scan_sessions.delete(session_id)
+                return jsonify({
+                    "error": f"Text is too long (max {Config.QUICK_CHECK_MAX_LENGTH} characters)"
+                }), 400
+            
+            result = yakki_checker.update_quick_check_session(session_id, edits)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": "Invalid edit", "message": str(e)}), 400
+        
+        if result is None:
+            response = jsonify({
+                "error": "Session not found",
+                "message": "The session has expired or does not exist. Start a new session with the full text."
+            })
+            return add_security_headers(response), 404
+        
+        result['processing_time_ms'] = round((time.perf_counter() - start_time) * 1000, 3)
+        
+        response = jsonify(result)
+        return add_security_headers(response)
+        
+    except Exception as e:
+        logger.error(f"簡易チェックセッション更新エラー: {e}")
+        return jsonify({
+            "error": "Internal server error",
+            "message": "簡易チェック処理中にエラーが発生しました"
+        }), 500
+
+@api_bp.route('/api/patterns', methods=['GET'])
+@require_api_key
+def pattern_bundle_info():
+    """NG表現パターンバンドルの現行バージョン確認エンドポイント"""
+    try:
+        version, _ = yakki_checker.pattern_bundle
+        
+        response = jsonify({
+            "version": version,
+            "url": f"/api/patterns/{version}.json"
+        })
+        # 現行バージョンは毎回再検証させる（変更がなければ304）
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(version)
+        response.make_conditional(request)
+        
+        return add_security_headers(response)
+        
+    except Exception as e:
+        logger.error(f"パターンバンドル情報取得エラー: {e}")
+        return jsonify({
+            "error": "Failed to get pattern bundle info",
+            "message": str(e)
+        }), 500
+
+@api_bp.route('/api/patterns/<version>.json', methods=['GET'])
+@require_api_key
+def pattern_bundle(version):
+    """NG表現パターンバンドル取得エンドポイント（内容ハッシュ付きURLで無期限キャッシュ可能）"""
+    try:
+        current_version, body = yakki_checker.pattern_bundle
+        
+        if version != current_version:
+            response = jsonify({
+                "error": "Not Found",
+                "message": "The requested pattern bundle version is not available",
+                "version": current_version,
+                "url": f"/api/patterns/{current_version}.json"
+            })
+            return add_security_headers(response), 404
+        
+        response = Response(body, mimetype='application/json')
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.set_etag(current_version)
+        response.make_conditional(request)
+        
+        return add_security_headers(response)
+        
+    except Exception as e:
+        logger.error(f"パターンバンドル取得エラー: {e}")
+        return jsonify({
+            "error": "Failed to get pattern bundle",
+            "message": str(e)
+        }), 500
+
 @api_bp.route('/api/check/stream', methods=['POST'])
 @require_api_key
 def check_text_stream():
@@ -252,6 +459,47 @@ def check_text_stream():
             "message": str(e)
         }), 500
 
+def live_check(ws):
+    """
+    WebSocketライブチェックエンドポイント
+    
+    入力のたびにローカルNG表現チェックの結果を即時に返し、入力が止まってから
+    LIVE_CHECK_IDLE_SECONDS 経過後に1回だけClaude APIによる詳細チェックを行う。
+    新しい入力が届いた時点で、実行中の詳細チェックの結果は破棄される。
+    接続数が LIVE_CHECK_MAX_CONNECTIONS に達している場合は接続を拒否する。
+    """
+    auth_error = verify_api_key()
+    if auth_error:
+        ws.send(json.dumps({"type": "error", **auth_error}, ensure_ascii=False))
+        ws.close(reason=1008, message=auth_error['error'])
+        return
+    
+    if not acquire_connection():
+        error = {
+            "error": "Too many live check connections",
+            "message": f"Live check accepts up to {Config.LIVE_CHECK_MAX_CONNECTIONS} connections. Try again later."
+        }
+        ws.send(json.dumps({"type": "error", **error}, ensure_ascii=False))
+        ws.close(reason=1013, message=error['error'])
+        return
+    
+    session = LiveCheckSession(yakki_checker)
+    try:
+        while True:
+            message = ws.receive(timeout=session.next_timeout())
+            
+            outgoing = session.handle_message(message) if message is not None else []
+            outgoing.extend(session.poll())
+            
+            for data in outgoing:
+                ws.send(json.dumps(data, ensure_ascii=False))
+    finally:
+        session.close()
+        release_connection()
+
+if SOCK_AVAILABLE:
+    live_check = sock.route('/api/check/ws', bp=api_bp)(live_check)
+
 @api_bp.route('/api/cache/refresh', methods=['POST'])
 @require_api_key
 def refresh_cache():
@@ -8,8 +8,9 @@ Anthropic Claude APIとの通信とレスポンス処理を管理
 import json
 import re
 import logging
+import threading
 import anthropic
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 
@@ -17,12 +18,45 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
+# プロンプトキャッシュのマーカー（このブロックまでの接頭部分がキャッシュされ、次回以降はキャッシュから読み込まれる）
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# 文字列またはテキストブロックのリスト
+PromptContent = Union[str, List[Dict[str, Any]]]
+
+# 記録するトークン数（APIレスポンスの usage の項目）
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
+
+
+def text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    """
+    メッセージのテキストブロックを作成
+    
+    Args:
+        text: テキスト
+        cache: このブロックまでをプロンプトキャッシュの対象にする（リクエストごとに変わらない部分の末尾に指定）
+    """
+    block = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+def content_text(content: PromptContent) -> str:
+    """テキストブロックのリストを1つの文字列にする（ログ・キャッシュキー用）"""
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') for block in content)
+
+
 class ClaudeService:
     """Claude APIサービスクラス"""
     
     def __init__(self):
         self.client = None
         self.executor = ThreadPoolExecutor(max_workers=4)
+        self.usage_lock = threading.Lock()
+        self.usage_stats = {'requests': 0, **{field: 0 for field in USAGE_FIELDS}}
         self._initialize_client()
     
     def _initialize_client(self):
@@ -42,15 +76,18 @@ class ClaudeService:
         """Claude APIが利用可能かチェック"""
         return self.client is not None
     
-    def call_api(self, system_prompt: str, user_prompt: str, 
+    def call_api(self, system_prompt: PromptContent, user_prompt: PromptContent, 
                  model: str = None, max_tokens: int = None, 
                  temperature: float = None) -> Dict[str, Any]:
         """
         Claude APIを呼び出す
         
+        プロンプトはテキストブロックのリストでも指定でき、cache_control を付けたブロックまでは
+        プロンプトキャッシュの対象になる（CLAUDE_PROMPT_CACHE が無効の場合はマーカーを除いて送信）
+        
         Args:
-            system_prompt: システムプロンプト
-            user_prompt: ユーザープロンプト
+            system_prompt: システムプロンプト（文字列またはテキストブロックのリスト）
+            user_prompt: ユーザープロンプト（文字列またはテキストブロックのリスト）
             model: 使用するモデル（デフォルト：設定値）
             max_tokens: 最大トークン数（デフォルト：設定値）
             temperature: 温度パラメータ（デフォルト：設定値）
@@ -69,16 +106,7 @@ class ClaudeService:
         try:
             logger.info(f"Claude API呼び出し開始 - Model: {model}")
             
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }]
-            )
+            response = self._create_message(model, max_tokens, temperature, system_prompt, user_prompt)
             
             response_text = response.content[0].text.strip()
             logger.info(f"Claude API応答受信: {len(response_text)} characters")
@@ -86,7 +114,8 @@ class ClaudeService:
             return {
                 'text': response_text,
                 'model': model,
-                'usage': getattr(response, 'usage', None)
+                'usage': getattr(response, 'usage', None),
+                'token_usage': self._record_usage(response)
             }
             
         except anthropic.APIError as e:
@@ -95,12 +124,12 @@ class ClaudeService:
             # 認証エラーの場合のフォールバック
             if self._is_auth_error(e):
                 logger.warning("認証エラー - フォールバックモデルで再試行")
-                return self._call_fallback_model(system_prompt, user_prompt)
+                return self._call_fallback_model(system_prompt, user_prompt, max_tokens)
             
             # モデル未対応の場合のフォールバック
             if self._is_model_error(e):
                 logger.warning("モデルエラー - フォールバックモデルで再試行")
-                return self._call_fallback_model(system_prompt, user_prompt)
+                return self._call_fallback_model(system_prompt, user_prompt, max_tokens)
             
             raise
     
@@ -118,20 +147,66 @@ class ClaudeService:
             "model_not_found", "does not exist", "invalid model"
         ])
     
-    def _call_fallback_model(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+    def _create_message(self, model: str, max_tokens: int, temperature: float,
+                        system_prompt: PromptContent, user_prompt: PromptContent):
+        """Messages APIを呼び出す（キャッシュ対象の変わらない部分が先、リクエストごとの部分が後の順で送る）"""
+        if not Config.CLAUDE_PROMPT_CACHE:
+            system_prompt = self._strip_cache_control(system_prompt)
+            user_prompt = self._strip_cache_control(user_prompt)
+        return self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_prompt,
+            messages=[{
+                "role": "user",
+                "content": user_prompt
+            }]
+        )
+    
+    def _strip_cache_control(self, content: PromptContent) -> PromptContent:
+        """プロンプトキャッシュのマーカーを除く"""
+        if isinstance(content, str):
+            return content
+        return [{key: value for key, value in block.items() if key != 'cache_control'} for block in content]
+    
+    def _record_usage(self, response) -> Dict[str, int]:
+        """レスポンスの usage からトークン数（キャッシュの読み込み・書き込みを含む）を記録"""
+        usage = getattr(response, 'usage', None)
+        token_usage = {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+        with self.usage_lock:
+            self.usage_stats['requests'] += 1
+            for field, count in token_usage.items():
+                self.usage_stats[field] += count
+        
+        logger.info(
+            f"Claude APIトークン数 - 入力: {token_usage['input_tokens']}, "
+            f"キャッシュ読み込み: {token_usage['cache_read_input_tokens']}, "
+            f"キャッシュ書き込み: {token_usage['cache_creation_input_tokens']}, "
+            f"出力: {token_usage['output_tokens']}"
+        )
+        return token_usage
+    
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """トークン使用量の累計とプロンプトキャッシュの読み込み率を取得"""
+        with self.usage_lock:
+            stats = dict(self.usage_stats)
+        prompt_tokens = (
+            stats['input_tokens'] + stats['cache_creation_input_tokens'] + stats['cache_read_input_tokens']
+        )
+        stats['cache_read_rate'] = (stats['cache_read_input_tokens'] / prompt_tokens) if prompt_tokens else 0.0
+        stats['prompt_cache_enabled'] = Config.CLAUDE_PROMPT_CACHE
+        return stats
+    
+    def _call_fallback_model(self, system_prompt: PromptContent, user_prompt: PromptContent,
+                             max_tokens: int = None) -> Dict[str, Any]:
         """フォールバックモデルでAPI呼び出し"""
         fallback_model = "claude-3-5-sonnet-20241022"
         
         try:
-            response = self.client.messages.create(
-                model=fallback_model,
-                max_tokens=Config.CLAUDE_MAX_TOKENS,
-                temperature=Config.CLAUDE_TEMPERATURE,
-                system=system_prompt,
-                messages=[{
-                    "role": "user",
-                    "content": user_prompt
-                }]
+            response = self._create_message(
+                fallback_model, max_tokens or Config.CLAUDE_MAX_TOKENS, Config.CLAUDE_TEMPERATURE,
+                system_prompt, user_prompt
             )
             
             response_text = response.content[0].text.strip()
@@ -141,6 +216,7 @@ class ClaudeService:
                 'text': response_text,
                 'model': fallback_model,
                 'usage': getattr(response, 'usage', None),
+                'token_usage': self._record_usage(response),
                 'is_fallback': True
             }
             
@@ -148,7 +224,7 @@ class ClaudeService:
             logger.error(f"フォールバック呼び出しも失敗: {e}")
             raise
     
-    async def call_api_async(self, system_prompt: str, user_prompt: str, 
+    async def call_api_async(self, system_prompt: PromptContent, user_prompt: PromptContent, 
                            **kwargs) -> Dict[str, Any]:
         """
         非同期でClaude APIを呼び出す
@@ -8,38 +8,384 @@
 import os
 import csv
 import json
+import hashlib
 import logging
-import pandas as pd
-from typing import Dict, List, Optional, Any
-from functools import lru_cache
+import threading
+from typing import Callable, Dict, List, Optional, Any, Tuple
 
 from config import Config
-from models.data_models import DataCache
+from models.data_models import DataCache, NGExpressionTable
+from services.data_snapshot import DataSnapshot, load_data_snapshot
+from services.reference_manifest import (
+    ReferenceManifest, ReferenceManifestError, ROLE_REFERENCE, ROLE_NG_EXPRESSIONS, ROLE_RULE, DATA_ROLES,
+    RETRIEVAL_FULL, parse_reference_manifest, bundle_selections
+)
 from utils.cache import CacheManager
+from utils.category_matchers import CategoryNGMatchers, parse_categories
+from utils.compiled_matcher import source_fingerprint, save_compiled_matchers, load_compiled_matchers
+from utils.file_watcher import get_file_watcher
+from utils.ng_matcher import build_pattern_bundle
+from utils.prompt_minifier import minify_markdown, dedupe_lines, format_table_compact
+from utils.token_estimator import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# 商品カテゴリ別ガイダンス
+CATEGORY_GUIDANCE = {
+    "化粧品": "一般化粧品として、効果効能の表現に特に注意が必要です。",
+    "薬用化粧品": "医薬部外品として承認された効果効能のみ表現可能です。",
+    "医薬部外品": "承認された効果効能の範囲内での表現が必要です。",
+    "サプリメント・健康食品": "健康食品として、医薬品的な効果表現は禁止されています。",
+    "美容機器・健康器具・その他": "機器の分類に応じた適切な表現が必要です。"
+}
+
+# 文章種類別ガイダンス
+TEXT_TYPE_GUIDANCE = {
+    "キャッチコピー": "短く印象的でありながら、誇大表現を避ける必要があります。",
+    "LP見出し・タイトル": "注目を集めつつ、薬機法に準拠した表現が重要です。",
+    "商品説明文・広告文・通常テキスト": "詳細な説明において、客観的で根拠のある表現を心がけてください。",
+    "お客様の声": "個人の感想として、効果を断定しない表現が必要です。"
+}
+
 class DataService:
     """データ管理サービスクラス"""
     
-    def __init__(self):
+    def __init__(self, use_snapshot: bool = True, auto_reload: bool = True):
+        """
+        Args:
+            use_snapshot: ビルド済みデータスナップショットがあれば使用する（Falseの場合は常に元ファイルを読み込む）
+            auto_reload: 元ファイルの変更を監視し、バックグラウンドでスナップショットを作り直す
+        """
         self.cache_manager = CacheManager()
         self.data_cache = DataCache()
         self.base_dir = os.path.dirname(__file__)
+        self.backend_dir = os.path.normpath(os.path.join(self.base_dir, '..'))
         self.data_dir = os.path.join(self.base_dir, '..', Config.DATA_DIR)
         self.rule_dir = os.path.join(self.base_dir, '..', Config.RULE_DIR)
+        self.manifest_path = os.path.join(self.backend_dir, Config.REFERENCE_MANIFEST_PATH)
+        
+        # 参照ファイルの一覧（マニフェストの内容。読み込めない場合は前回の内容を使う）
+        self._manifest = ReferenceManifest([])
+        self._read_manifest()
+        
+        # NG表現データから作成したプロンプト用テキスト・マッチャー（CSVが変わらなければ再利用）
+        self._ng_derived = None
+        # このインスタンスが保存したコンパイル済みファイル（古くなったものを削除する対象）
+        self._saved_matcher_paths: List[str] = []
+        
+        # 参考データの最小化前後の推定トークン数（元ファイルから作成した場合のみ）
+        self.minify_stats: Optional[Dict[str, int]] = None
+        self._token_estimates: Dict[str, Tuple[str, int]] = {}  # セグメント -> (内容, 推定トークン数)
+        
+        # 現在のスナップショット（読み取り側は参照を1回読むだけで、差し替えは参照の代入のみ）
+        snapshot = None
+        if use_snapshot and Config.DATA_SNAPSHOT_PATH:
+            snapshot = load_data_snapshot(
+                os.path.join(self.backend_dir, Config.DATA_SNAPSHOT_PATH), self.backend_dir,
+                fuzzy_max_distance=Config.NG_FUZZY_MAX_DISTANCE
+            )
+        self._snapshot: DataSnapshot = snapshot or self.build_snapshot()
+        
+        # 元ファイルの変更時はバックグラウンドで次のスナップショットを作成して差し替える
+        self._reload_event = threading.Event()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reload_listeners: List[Callable[[DataSnapshot], None]] = []
+        self._watch_subscriptions: List[int] = []
+        self._watched_directories = set()
+        if auto_reload:
+            self._setup_file_watching()
+            self._reload_thread = threading.Thread(
+                target=self._reload_loop, name='data-snapshot-reload', daemon=True
+            )
+            self._reload_thread.start()
+    
+    @property
+    def snapshot(self) -> DataSnapshot:
+        """現在のデータスナップショット（1リクエスト内では1回だけ取得して使う）"""
+        return self._snapshot
+    
+    def request_reload(self):
+        """スナップショットの再作成を要求（バックグラウンドで実行）"""
+        self._reload_event.set()
+    
+    def add_reload_listener(self, listener: Callable[[DataSnapshot], None]):
+        """スナップショットの内容が変わって差し替えた後に、新しいスナップショットを渡して呼び出す関数を登録"""
+        self._reload_listeners.append(listener)
+    
+    def reload(self) -> bool:
+        """
+        元ファイルからスナップショットを作り直して差し替える
+        
+        Returns:
+            内容が変わって差し替えた場合はTrue
+        """
+        with self._reload_lock:
+            previous = self._snapshot
+            snapshot = self.build_snapshot()
+            # 内容が同じでも元ファイルの状態を更新するため差し替える
+            self._snapshot = snapshot
+        
+        if snapshot.version == previous.version:
+            logger.info(f"データスナップショットに変更はありません: バージョン {previous.version}")
+            return False
+        logger.info(f"データスナップショットを差し替え: {previous.version} -> {snapshot.version}")
+        # マニフェストの変更で参照ファイルのディレクトリが増えた場合に備えて監視対象を更新
+        if self._watch_subscriptions:
+            self._setup_file_watching()
         
-        # ファイル監視の設定
-        self._setup_file_watching()
+        for listener in self._reload_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"スナップショット差し替え後の処理でエラー: {e}")
+        return True
+    
+    def _reload_loop(self):
+        """変更通知（ファイル監視・キャッシュ無効化）を待ってスナップショットを作り直す"""
+        while True:
+            self._reload_event.wait()
+            self._reload_event.clear()
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"データスナップショットの再作成に失敗: {e}")
+    
+    def build_snapshot(self) -> DataSnapshot:
+        """
+        元ファイルからスナップショットを作成
+        
+        元ファイルはファイルごとのセグメント（パスと内容ハッシュで識別）として保持しており、
+        前回から変更されたファイルのみを読み込み・変換し直して結合し直す
+        
+        参考データは（商品カテゴリ, 文章種類）ごとにマニフェストで対象としたファイルのみを含め、
+        NG表現データも共通の行とそのカテゴリの行のみに絞り込む
+        """
+        manifest = self._read_manifest()
+        ng_data = self._read_ng_expressions()
+        ng_texts, ng_tokens, ng_patterns, ng_matchers, pattern_bundle, matcher_path = self._derive_ng_data(ng_data)
+        
+        segments = self._load_segments(manifest, ng_texts[''], ng_tokens)
+        retrieval = {
+            reference_file.path: reference_file.retrieval for reference_file in manifest.files
+            if reference_file.role in DATA_ROLES and reference_file.retrieval != RETRIEVAL_FULL
+        }
+        selections = bundle_selections(
+            manifest, list(dict.fromkeys(list(CATEGORY_GUIDANCE) + ng_matchers.categories)), list(TEXT_TYPE_GUIDANCE)
+        )
+        
+        # NG表現データはカテゴリごとに絞り込んだセグメント（パス#カテゴリ）に差し替える
+        for ng_file in manifest.files_for(ROLE_NG_EXPRESSIONS):
+            for (category, text_type), (data_paths, rule_paths) in selections.items():
+                if not category or category not in ng_texts or ng_file.path not in data_paths:
+                    continue
+                scoped_path = f"{ng_file.path}#{category}"
+                segments.setdefault(scoped_path, f"=== {ng_file.title} ===\n{ng_texts[category]}\n")
+                if ng_file.path in retrieval:
+                    retrieval[scoped_path] = retrieval[ng_file.path]
+                selections[(category, text_type)] = (
+                    tuple(scoped_path if path == ng_file.path else path for path in data_paths), rule_paths
+                )
+        
+        sources = {
+            relative_path: self.data_cache.get_segment_state(os.path.join(self.backend_dir, relative_path))
+            for relative_path in self.snapshot_source_paths()
+        }
+        
+        return DataSnapshot(
+            segments=segments,
+            selections=selections,
+            retrieval=retrieval,
+            category_guidance=CATEGORY_GUIDANCE,
+            text_type_guidance=TEXT_TYPE_GUIDANCE,
+            ng_matchers=ng_matchers,
+            pattern_bundle=pattern_bundle,
+            sources=sources,
+            ng_patterns=ng_patterns,
+            matcher_path=matcher_path
+        )
+    
+    def _read_manifest(self) -> ReferenceManifest:
+        """参照データマニフェストを読み込み（読み込めない場合は前回の内容のまま）"""
+        try:
+            segment = self.data_cache.get_segment(
+                self.manifest_path, lambda data: parse_reference_manifest(data, self.manifest_path)
+            )
+            if segment is None:
+                raise ReferenceManifestError(f"マニフェストが見つかりません: {self.manifest_path}")
+            self._manifest = segment.value
+        except (OSError, ReferenceManifestError) as e:
+            logger.error(f"参照データマニフェストの読み込みに失敗: {e}")
+        return self._manifest
+    
+    def _load_segments(self, manifest: ReferenceManifest, ng_text: str, ng_tokens: int = 0) -> Dict[str, str]:
+        """
+        マニフェストの参照ファイルをプロンプト用に整形（内容が前回と同じファイルはセグメントを再利用）
+        
+        PROMPT_MINIFY が有効な場合はマークダウンの装飾を除き、繰り返される定型文を除く
+        （全カテゴリ・全文章種類で全体を含めるファイルにある行は、後に並ぶファイルからも除く）
+        
+        Args:
+            manifest: 参照データマニフェスト
+            ng_text: プロンプト用に整形済みのNG表現データ
+            ng_tokens: 最小化前のNG表現データの推定トークン数
+        
+        Returns:
+            参照ファイルのパス -> 整形済みの内容（ファイルがない場合は含めない）
+        """
+        segments = {}
+        shared_lines = {ROLE_RULE: set(), ROLE_REFERENCE: set()}
+        tokens_before = ng_tokens
+        for reference_file in manifest.files:
+            if reference_file.role == ROLE_NG_EXPRESSIONS:
+                # CSVがない場合もデフォルトのNG表現データを含める
+                segments[reference_file.path] = f"=== {reference_file.title} ===\n{ng_text}\n"
+                continue
+            
+            file_path = os.path.join(self.backend_dir, reference_file.path)
+            if not os.path.exists(file_path):
+                logger.warning(f"参照ファイルが見つかりません: {file_path}")
+                continue
+            
+            if Config.PROMPT_MINIFY:
+                content, raw_tokens = self._read_minified_text(file_path, reference_file.encoding)
+                tokens_before += raw_tokens
+                seen = shared_lines[reference_file.role]
+                if reference_file.categories or reference_file.text_types or reference_file.retrieval != RETRIEVAL_FULL:
+                    # 対象を限定したファイル・一部のみを含めるファイルの行は他のファイルから除かない
+                    seen = set(seen)
+                content = dedupe_lines(content, seen)
+            else:
+                content = self._read_text_file(file_path, reference_file.encoding)
+            
+            if reference_file.role == ROLE_RULE:
+                segments[reference_file.path] = content
+            else:
+                segments[reference_file.path] = f"=== {reference_file.title} ===\n{content}\n"
+        
+        logger.info(f"参照ファイル読み込み完了: {len(segments)}件, {sum(len(text) for text in segments.values())}文字")
+        if Config.PROMPT_MINIFY:
+            self._record_minify_stats(segments, tokens_before)
+        return segments
+    
+    def _record_minify_stats(self, segments: Dict[str, str], tokens_before: int) -> None:
+        """最小化前後の推定トークン数を記録（内容が前回と同じセグメントは前回の推定値を使う）"""
+        estimates = {}
+        for path, text in segments.items():
+            previous = self._token_estimates.get(path)
+            estimates[path] = previous if previous is not None and previous[0] == text else (text, estimate_tokens(text))
+        self._token_estimates = estimates
+        
+        tokens_after = sum(tokens for _, tokens in estimates.values())
+        self.minify_stats = {'estimated_tokens_before': tokens_before, 'estimated_tokens_after': tokens_after}
+        if tokens_before:
+            logger.info(
+                f"参考データ最小化: 推定 {tokens_before} → {tokens_after} トークン"
+                f"（{(1 - tokens_after / tokens_before) * 100:.1f}%削減）"
+            )
+    
+    def _derive_ng_data(self, ng_data: NGExpressionTable):
+        """
+        NG表現データからプロンプト用テキスト・パターン情報・マッチャーを作成
+        
+        CSVの内容が変わっていなければセグメントは同じNG表現データを返すため、前回の結果をそのまま使う
+        
+        Returns:
+            (商品カテゴリ -> プロンプト用テキスト（空のキーは全行）, 最小化前の全行の推定トークン数, パターン情報,
+             カテゴリ別マッチャー, パターンバンドル, コンパイル済みファイルのパス)
+        """
+        derived = self._ng_derived
+        if derived is None or derived[0] is not ng_data:
+            ng_patterns = self.load_ng_patterns(ng_data)
+            ng_matchers, pattern_bundle, matcher_path = self._compile_ng_matchers(ng_patterns)
+            ng_texts = {'': self._format_csv_for_prompt(ng_data)}
+            for category in dict.fromkeys(list(CATEGORY_GUIDANCE) + ng_matchers.categories):
+                ng_texts[category] = self._format_csv_for_prompt(ng_data, category)
+            ng_tokens = estimate_tokens(
+                self._format_csv_for_prompt(ng_data, compact=False) if Config.PROMPT_MINIFY else ng_texts['']
+            )
+            derived = (ng_data, ng_texts, ng_tokens, ng_patterns, ng_matchers, pattern_bundle, matcher_path)
+            self._ng_derived = derived
+        return derived[1:]
+    
+    def _compile_ng_matchers(self, ng_patterns: List[Dict[str, Any]]):
+        """
+        カテゴリ別NG表現マッチャーとブラウザ簡易チェック用のパターンバンドルを準備
+        
+        パターン情報と一致するコンパイル済みファイルがあればmmapで読み込み（ワーカー間で共有）、
+        なければ構築してファイルに保存する
+        
+        Returns:
+            (カテゴリ別マッチャー, パターンバンドル, コンパイル済みファイルのパス（保存しない場合はNone）)
+        """
+        cache_dir = Config.NG_MATCHER_CACHE_DIR and os.path.join(self.backend_dir, Config.NG_MATCHER_CACHE_DIR)
+        source_hash = None
+        path = None
+        if cache_dir:
+            patterns_hash = hashlib.sha256(
+                json.dumps(ng_patterns, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+            ).hexdigest()
+            source_hash = source_fingerprint([]) + patterns_hash
+            path = os.path.join(cache_dir, f"ng_matchers-{hashlib.sha256(source_hash.encode()).hexdigest()[:16]}.bin")
+            loaded = load_compiled_matchers(path, source_hash, Config.NG_FUZZY_MAX_DISTANCE)
+            if loaded is not None:
+                return loaded[0], loaded[1], path
+        
+        ng_matchers = CategoryNGMatchers(ng_patterns, fuzzy_max_distance=Config.NG_FUZZY_MAX_DISTANCE)
+        pattern_bundle = build_pattern_bundle(*ng_matchers.all_matchers())
+        
+        if path:
+            try:
+                save_compiled_matchers(path, ng_matchers, source_hash, pattern_bundle)
+                # 自分が古いデータから作ったファイルのみ削除（同じディレクトリを使う他のデプロイ・ワーカーのファイルは残す。
+                # 開いているプロセスのmmapはそのまま有効）
+                for previous_path in self._saved_matcher_paths:
+                    if previous_path != path and os.path.exists(previous_path):
+                        os.remove(previous_path)
+                self._saved_matcher_paths = [path]
+            except OSError as e:
+                logger.warning(f"コンパイル済みNG表現マッチャーを保存できません: {e}")
+                path = None
+        
+        return ng_matchers, pattern_bundle, path
+    
+    def snapshot_source_paths(self) -> List[str]:
+        """スナップショットの元ファイル（マニフェストとそこに記載された参照ファイル。backend/からの相対パス）"""
+        return [Config.REFERENCE_MANIFEST_PATH] + [reference_file.path for reference_file in self._manifest.files]
     
     def _setup_file_watching(self):
-        """ファイル監視を設定"""
+        """プロセス共通のファイル監視に、マニフェストと参照ファイルのあるディレクトリの変更を購読"""
         try:
-            self.data_cache.start_file_watcher()
+            file_watcher = get_file_watcher(
+                debounce_time=Config.FILE_WATCH_DEBOUNCE, poll_interval=Config.FILE_WATCH_INTERVAL
+            )
+            directories = dict.fromkeys(
+                os.path.dirname(os.path.normpath(os.path.join(self.backend_dir, relative_path)))
+                for relative_path in self.snapshot_source_paths()
+            )
+            for directory in directories:
+                if directory not in self._watched_directories:
+                    self._watch_subscriptions.append(file_watcher.subscribe(directory, self._on_reference_files_changed))
+                    self._watched_directories.add(directory)
         except Exception as e:
             logger.error(f"ファイル監視の設定に失敗: {e}")
     
-    def load_ng_expressions(self) -> Optional[pd.DataFrame]:
+    def _on_reference_files_changed(self, paths: List[str]):
+        """参照ファイルの変更時: 変更されたファイルのセグメントのみ読み込み直してスナップショットを作り直す"""
+        sources = {
+            os.path.normpath(os.path.join(self.backend_dir, relative_path))
+            for relative_path in self.snapshot_source_paths()
+        }
+        changed = [path for path in paths if os.path.normpath(path) in sources]
+        if not changed:
+            return
+        
+        self.cache_manager.invalidate('data_files')
+        self.cache_manager.invalidate('rule_files')
+        self.data_cache.invalidate_segments(changed)
+        self.request_reload()
+    
+    def load_ng_expressions(self) -> Optional[NGExpressionTable]:
         """NG表現CSVファイルを読み込み"""
         cache_key = "ng_expressions_data"
         cached_data = self.cache_manager.get('data_files', cache_key)
@@ -47,15 +393,24 @@ class DataService:
         if cached_data is not None:
             return cached_data
         
+        data = self._read_ng_expressions()
+        self.cache_manager.set('data_files', cache_key, data)
+        return data
+    
+    def _read_ng_expressions(self) -> NGExpressionTable:
+        """NG表現CSVファイルを直接読み込み（キャッシュバイパス。ファイルがなければデフォルトデータ）"""
         try:
-            csv_file_path = os.path.join(self.data_dir, 'ng_expressions.csv')
+            ng_files = self._manifest.files_for(ROLE_NG_EXPRESSIONS)
+            if not ng_files:
+                logger.warning("マニフェストにNG表現CSVファイル（ng_expressions）がありません")
+                return self._create_default_ng_data()
+            
+            csv_file_path = os.path.join(self.backend_dir, ng_files[0].path)
             if not os.path.exists(csv_file_path):
                 logger.warning(f"NG表現CSVファイルが見つかりません: {csv_file_path}")
                 return self._create_default_ng_data()
             
-            data = self._read_csv_file(csv_file_path)
-            self.cache_manager.set('data_files', cache_key, data)
-            
+            data = self._read_csv_file(csv_file_path, ng_files[0].encoding)
             logger.info(f"NG表現データ読み込み完了: {len(data)}件")
             return data
             
@@ -63,28 +418,23 @@ class DataService:
             logger.error(f"NG表現データの読み込みに失敗: {e}")
             return self._create_default_ng_data()
     
-    def _read_csv_file(self, file_path: str) -> pd.DataFrame:
-        """CSVファイルを読み込む"""
+    def _read_csv_file(self, file_path: str, encoding: str = 'auto') -> NGExpressionTable:
+        """CSVファイルを読み込む（内容が前回と同じなら前回のデータを返す）"""
         try:
-            # 複数のエンコーディングを試行
-            encodings = ['utf-8', 'shift_jis', 'cp932', 'utf-8-sig']
-            
-            for encoding in encodings:
-                try:
-                    data = pd.read_csv(file_path, encoding=encoding)
-                    logger.debug(f"CSVファイル読み込み成功: {encoding}")
-                    return data
-                except UnicodeDecodeError:
-                    continue
-            
-            # 全て失敗した場合はエラーをraise
-            raise ValueError(f"CSVファイルの読み込みに失敗: {file_path}")
+            segment = self.data_cache.get_segment(
+                file_path,
+                lambda data: NGExpressionTable.from_csv_text(self._decode_text(data, file_path, encoding)),
+                variant=encoding
+            )
+            if segment is None:
+                raise ValueError(f"CSVファイルの読み込みに失敗: {file_path}")
+            return segment.value
             
         except Exception as e:
             logger.error(f"CSVファイル読み込みエラー: {e}")
             raise
     
-    def _create_default_ng_data(self) -> pd.DataFrame:
+    def _create_default_ng_data(self) -> NGExpressionTable:
         """デフォルトのNG表現データを作成"""
         default_data = [
             {"表現": "即効性", "理由": "効果の即時性を示唆", "リスクレベル": "高", "代替表現": "お手入れ"},
@@ -92,70 +442,140 @@ class DataService:
             {"表現": "美白", "理由": "薬用化粧品以外では使用不可", "リスクレベル": "中", "代替表現": "透明感"}
         ]
         
+        # 商品カテゴリ別のNG表現
+        category_specific_words = {
+            "化粧品": ["シミが消える", "シワが消える", "たるみ解消", "美白効果", "アンチエイジング"],
+            "薬用化粧品": ["アトピー", "アレルギー", "皮膚病", "炎症を治す"],
+            "サプリメント・健康食品": ["病気", "疾病", "疾患", "症状", "診断", "処方"],
+            "美容機器・健康器具・その他": ["治療器", "医療機器", "診察", "検査"]
+        }
+        for category, words in category_specific_words.items():
+            for word in words:
+                default_data.append({
+                    "表現": word,
+                    "理由": f"{category}では使用できない表現です",
+                    "リスクレベル": "高",
+                    "代替表現": "",
+                    "商品カテゴリ": category
+                })
+        
         logger.info("デフォルトNG表現データを作成しました")
-        return pd.DataFrame(default_data)
+        return NGExpressionTable.from_records(default_data)
+    
+    def load_ng_patterns(self, ng_data: Optional[NGExpressionTable] = None) -> List[Dict[str, Any]]:
+        """NG表現データ（省略時はCSVファイル）からマッチャー用のパターン情報を生成"""
+        if ng_data is None:
+            ng_data = self.load_ng_expressions()
+        if ng_data is None or ng_data.empty:
+            return []
+        
+        patterns = []
+        for row in ng_data.records():
+            if '表現' in row:
+                patterns.append({
+                    'pattern': row['表現'],
+                    'reason': row.get('理由', ''),
+                    'risk_level': row.get('リスクレベル', '中'),
+                    'alternative': row.get('代替表現', ''),
+                    'conjugation': row.get('活用', ''),
+                    'syntax': row.get('記法', ''),
+                    'categories': parse_categories(row.get('商品カテゴリ'))
+                })
+        return patterns
     
     def load_all_data_files(self) -> str:
-        """全データファイルを読み込んでテキスト結合"""
-        return self.data_cache.get_cached_data_content(self._load_all_data_files_direct)
+        """参考データを結合したテキスト（商品カテゴリ・文章種類で対象を限定していないファイルと全カテゴリのNG表現データ）"""
+        return self._snapshot.data_text
     
-    def _load_all_data_files_direct(self) -> str:
-        """データファイルを直接読み込み（キャッシュバイパス）"""
+    def _read_text_file(self, file_path: str, encoding: str = 'auto') -> str:
+        """テキストファイルを読み込む（内容が前回と同じなら前回の結果を返す）"""
         try:
-            all_content = []
-            
-            # マークダウンファイルを読み込み
-            md_files = ['law1.md', 'law2.md', 'ng.md', '美容・健康関連機器.md', '医療機器.md']
-            
-            for filename in md_files:
-                file_path = os.path.join(self.data_dir, filename)
-                if os.path.exists(file_path):
-                    content = self._read_text_file(file_path)
-                    all_content.append(f"=== {filename} ===\n{content}\n")
-            
-            # CSVファイルの内容を追加
-            ng_data = self.load_ng_expressions()
-            if ng_data is not None:
-                csv_content = self._format_csv_for_prompt(ng_data)
-                all_content.append(f"=== NG表現データ ===\n{csv_content}\n")
-            
-            result = "\n".join(all_content)
-            logger.info(f"全データファイル読み込み完了: {len(result)}文字")
-            
-            return result
+            # テキストモードでの読み込みと同様に改行はLFに統一する
+            segment = self.data_cache.get_segment(
+                file_path,
+                lambda data: self._decode_text(data, file_path, encoding).replace('\r\n', '\n').replace('\r', '\n'),
+                variant=encoding
+            )
+            if segment is None:
+                raise ValueError(f"テキストファイルの読み込みに失敗: {file_path}")
+            return segment.value
             
         except Exception as e:
-            logger.error(f"データファイル読み込みエラー: {e}")
+            logger.error(f"テキストファイル読み込みエラー: {e}")
             return ""
     
-    def _read_text_file(self, file_path: str) -> str:
-        """テキストファイルを読み込む"""
+    def _read_minified_text(self, file_path: str, encoding: str = 'auto') -> Tuple[str, int]:
+        """
+        テキストファイルを読み込み、マークダウンの装飾を除く（内容が前回と同じなら前回の結果を返す）
+        
+        Returns:
+            (装飾を除いたテキスト, 元のテキストの推定トークン数)
+        """
+        def render(data: bytes):
+            text = self._decode_text(data, file_path, encoding).replace('\r\n', '\n').replace('\r', '\n')
+            return minify_markdown(text), estimate_tokens(text)
+        
         try:
-            # 複数のエンコーディングを試行
-            encodings = ['utf-8', 'shift_jis', 'cp932', 'utf-8-sig']
-            
-            for encoding in encodings:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        return f.read()
-                except UnicodeDecodeError:
-                    continue
-            
-            raise ValueError(f"テキストファイルの読み込みに失敗: {file_path}")
+            segment = self.data_cache.get_segment(file_path, render, variant=f"{encoding}:minified")
+            if segment is None:
+                raise ValueError(f"テキストファイルの読み込みに失敗: {file_path}")
+            return segment.value
             
         except Exception as e:
             logger.error(f"テキストファイル読み込みエラー: {e}")
-            return ""
+            return "", 0
+    
+    def _decode_text(self, data: bytes, file_path: str, encoding: str = 'auto') -> str:
+        """ファイルの内容をデコード（auto の場合は複数のエンコーディングを試行）"""
+        if encoding != 'auto':
+            return data.decode(encoding)
+        
+        # 複数のエンコーディングを試行
+        encodings = ['utf-8', 'shift_jis', 'cp932', 'utf-8-sig']
+        
+        for encoding in encodings:
+            try:
+                text = data.decode(encoding)
+                logger.debug(f"ファイル読み込み成功: {encoding}")
+                return text
+            except UnicodeDecodeError:
+                continue
+        
+        raise ValueError(f"テキストファイルの読み込みに失敗: {file_path}")
     
-    def _format_csv_for_prompt(self, df: pd.DataFrame) -> str:
-        """CSVデータをプロンプト用にフォーマット"""
-        if df.empty:
+    def _format_csv_for_prompt(self, table: NGExpressionTable, category: Optional[str] = None,
+                               compact: Optional[bool] = None) -> str:
+        """
+        CSVデータをプロンプト用にフォーマット（商品カテゴリ指定時は全カテゴリ共通の行とそのカテゴリの行のみ）
+        
+        compact（省略時は PROMPT_MINIFY）の場合は列名を1行目に1回だけ記載する表形式にし、含める全行が空欄の列は除く
+        """
+        if table.empty:
             return "NG表現データはありません。"
         
+        if compact is None:
+            compact = Config.PROMPT_MINIFY
+        
         try:
+            rows = table.rows
+            if category is not None:
+                index = table.columns.index('商品カテゴリ') if '商品カテゴリ' in table.columns else None
+                if index is not None:
+                    rows = [
+                        row for row in rows
+                        if not parse_categories(row[index]) or category in parse_categories(row[index])
+                    ]
+            
+            if compact:
+                used_columns = [
+                    column for index, column in enumerate(table.columns)
+                    if any(str(row[index]).strip() for row in rows)
+                ]
+                return format_table_compact(table.columns, rows, keep_columns=used_columns)
+            
             formatted_rows = []
-            for _, row in df.iterrows():
-                row_text = " | ".join([f"{col}: {row[col]}" for col in df.columns if pd.notna(row[col])])
+            for row in rows:
+                row_text = " | ".join([f"{col}: {value}" for col, value in zip(table.columns, row) if value != ''])
                 formatted_rows.append(row_text)
             
             return "\n".join(formatted_rows)
@@ -166,65 +586,18 @@ class DataService:
     
     def load_rule_file(self, text_type: str) -> str:
         """文章種類に対応するルールファイルを読み込み"""
-        return self.data_cache.get_cached_rule_content(text_type, self._load_rule_file_direct)
-    
-    def _load_rule_file_direct(self, text_type: str) -> str:
-        """ルールファイルを直接読み込み（キャッシュバイパス）"""
-        try:
-            # ルールファイルのマッピング
-            rule_file_mapping = {
-                'キャッチコピー': 'キャッチコピー.md',
-                'LP見出し・タイトル': 'LP見出し・タイトル.md',
-                '商品説明文・広告文・通常テキスト': '商品説明文.md',
-                'お客様の声': 'お客様の声.md'
-            }
-            
-            filename = rule_file_mapping.get(text_type)
-            if not filename:
-                logger.warning(f"未知の文章種類: {text_type}")
-                return ""
-            
-            file_path = os.path.join(self.rule_dir, filename)
-            if not os.path.exists(file_path):
-                logger.warning(f"ルールファイルが見つかりません: {file_path}")
-                return ""
-            
-            content = self._read_text_file(file_path)
-            logger.info(f"ルールファイル読み込み完了: {filename}")
-            
-            return content
-            
-        except Exception as e:
-            logger.error(f"ルールファイル読み込みエラー: {e}")
-            return ""
+        return self._snapshot.rules.get(text_type, "")
     
-    @lru_cache(maxsize=32)
     def get_category_guidance(self, category: str) -> str:
         """商品カテゴリ別のガイダンスを取得"""
-        guidance_map = {
-            "化粧品": "一般化粧品として、効果効能の表現に特に注意が必要です。",
-            "薬用化粧品": "医薬部外品として承認された効果効能のみ表現可能です。",
-            "医薬部外品": "承認された効果効能の範囲内での表現が必要です。",
-            "サプリメント・健康食品": "健康食品として、医薬品的な効果表現は禁止されています。",
-            "美容機器・健康器具・その他": "機器の分類に応じた適切な表現が必要です。"
-        }
-        
-        return guidance_map.get(category, "適切な薬機法表現を心がけてください。")
+        return self._snapshot.category_guidance.get(category, "適切な薬機法表現を心がけてください。")
     
-    @lru_cache(maxsize=32)
     def get_text_type_guidance(self, text_type: str) -> str:
         """文章種類別のガイダンスを取得"""
-        guidance_map = {
-            "キャッチコピー": "短く印象的でありながら、誇大表現を避ける必要があります。",
-            "LP見出し・タイトル": "注目を集めつつ、薬機法に準拠した表現が重要です。",
-            "商品説明文・広告文・通常テキスト": "詳細な説明において、客観的で根拠のある表現を心がけてください。",
-            "お客様の声": "個人の感想として、効果を断定しない表現が必要です。"
-        }
-        
-        return guidance_map.get(text_type, "薬機法に準拠した適切な表現を使用してください。")
+        return self._snapshot.text_type_guidance.get(text_type, "薬機法に準拠した適切な表現を使用してください。")
     
     def invalidate_cache(self, cache_type: str = "all"):
-        """キャッシュを無効化"""
+        """キャッシュを無効化（スナップショットはバックグラウンドで作り直す）"""
         if cache_type == "all":
             self.cache_manager.invalidate()
             self.data_cache.invalidate_cache()
@@ -234,14 +607,20 @@ class DataService:
         elif cache_type == "rule":
             self.cache_manager.invalidate('rule_files')
             self.data_cache.invalidate_cache('rule')
+        self.request_reload()
         
         logger.info(f"キャッシュ無効化完了: {cache_type}")
     
     def get_cache_status(self) -> Dict[str, Any]:
         """キャッシュの状態を取得"""
+        snapshot = self._snapshot
         return {
             'cache_manager_stats': self.cache_manager.get_stats(),
-            'file_watcher_status': 'active' if self.data_cache.observer else 'inactive',
+            'file_watcher_status': get_file_watcher().get_status() if self._watch_subscriptions else 'inactive',
+            'snapshot_version': snapshot.version,
+            'snapshot_built_at': snapshot.built_at,
+            'snapshot_file': snapshot.path,
+            'prompt_minify': self.minify_stats,
             'data_dir': self.data_dir,
             'rule_dir': self.rule_dir
         }
\ No newline at end of file
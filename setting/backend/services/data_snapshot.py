@@ -0,0 +1,471 @@
+"""
+データスナップショットモジュール
+data/ と rule/ から作成したプロンプト用テキスト・ルール・ガイダンス表・コンパイル済みNG表現マッチャーを
+1つの不変オブジェクト（DataSnapshot）にまとめる
+参考データ・ルールは（商品カテゴリ, 文章種類）ごとに組み立て済みのもの（PromptBundle）を持ち、
+リクエストは現在のスナップショットへの参照を1回読むだけで一貫したデータを参照でき、
+更新時は新しいスナップショットを別途作成して参照を差し替える
+
+スナップショットは `python -m build_snapshot` でファイルに書き出しておくと、起動時にファイル1つを開くだけで読み込める
+元ファイルの内容ハッシュを記録しておき、元ファイルが更新されていれば使用せず元ファイルから読み込む（開発時）
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Tuple, Mapping
+
+from services.reference_manifest import RETRIEVAL_SECTIONS
+from utils.category_matchers import CategoryNGMatchers, normalize_category
+from utils.compiled_matcher import compiled_matcher_sections, matchers_from_section_file, source_fingerprint
+from utils.section_file import SectionFile, SectionFileError, write_section_file
+from utils.section_index import Section, SectionIndex, split_markdown_sections
+from utils.token_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# スナップショット形式の版（形式を変更した場合に上げる）
+SNAPSHOT_FORMAT_VERSION = 3
+
+# 参考データ・ルールのファイルが複数ある場合の区切り
+DATA_SEPARATOR = "\n"
+RULE_SEPARATOR = "\n\n"
+
+# 詳細チェックのプロンプトのうち、データのバージョン・商品カテゴリ・文章種類ごとに変わらない部分
+REFERENCE_PROMPT_TEMPLATE = """**カテゴリ別ガイダンス:**
+{guidance}
+
+**参考データ:**
+{data}
+
+"""
+RULE_PROMPT_TEMPLATE = """**文章種類別ガイダンス:**
+{guidance}
+
+**文章種類別ルール:**
+{rules}
+
+"""
+DEFAULT_CATEGORY_GUIDANCE = "適切な薬機法表現を心がけてください。"
+DEFAULT_TEXT_TYPE_GUIDANCE = "薬機法に準拠した適切な表現を使用してください。"
+# 関連部分の検索時に常に含める参考データがない場合の表記
+EMPTY_BASE_DATA = "（共通の参考データはありません）"
+# 入力トークン数の上限に収めるため参考データを省略した場合の表記
+TRIMMED_DATA_NOTE = "（入力トークン数の上限のため、以降の参考データは省略しました）"
+
+# （商品カテゴリ, 文章種類）-> （参考データのパス, ルールのパス）
+BundleSelections = Dict[Tuple[str, str], Tuple[Tuple[str, ...], Tuple[str, ...]]]
+
+
+def _sha256_file(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def snapshot_version(segments: Mapping[str, str], selections: BundleSelections,
+                     category_guidance: Mapping[str, str], text_type_guidance: Mapping[str, str],
+                     bundle_version: str, retrieval: Optional[Mapping[str, str]] = None) -> str:
+    """スナップショットの内容ハッシュ（同じ内容なら元ファイルから作成してもファイルから読み込んでも同じ値）"""
+    digest = hashlib.sha256()
+    for part in (segments, category_guidance, text_type_guidance, retrieval or {}):
+        for key, value in part.items():
+            digest.update(f"{key}\0{value}\0".encode('utf-8'))
+        digest.update(b'\1')
+    for (category, text_type), (data_paths, rule_paths) in selections.items():
+        digest.update(f"{category}\0{text_type}\0{'|'.join(data_paths)}\0{'|'.join(rule_paths)}\0".encode('utf-8'))
+    digest.update(b'\1')
+    digest.update(bundle_version.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _split_segment_title(segment: str) -> Tuple[str, str]:
+    """「=== 見出し ===」で始まる参考データのセグメントを見出しと本文に分ける"""
+    first_line, _, body = segment.partition('\n')
+    if first_line.startswith('=== ') and first_line.endswith(' ==='):
+        return first_line[4:-4], body
+    return '', segment
+
+
+class PromptBundle:
+    """（商品カテゴリ, 文章種類）ごとに組み立て済みの参考データ・ルール"""
+    __slots__ = (
+        'category', 'text_type', 'data_text', 'rule_text', 'data_paths', 'rule_paths', 'base_text', 'section_paths'
+    )
+
+    def __init__(self, category: str, text_type: str, data_text: str, rule_text: str,
+                 data_paths: Tuple[str, ...], rule_paths: Tuple[str, ...],
+                 base_text: Optional[str] = None, section_paths: Tuple[str, ...] = ()):
+        self.category = category
+        self.text_type = text_type
+        self.data_text = data_text  # 参考データ全体
+        self.rule_text = rule_text
+        self.data_paths = data_paths
+        self.rule_paths = rule_paths
+        # 関連部分の検索時に常に含める参考データ（セクション検索・NG表現の検出結果で置き換えるファイルを除く）
+        self.base_text = data_text if base_text is None else base_text
+        self.section_paths = section_paths  # セクション検索の対象ファイル
+
+
+class PromptPrefix:
+    """
+    詳細チェックのプロンプトのうち変わらない部分（描画済みの不変の文字列）
+
+    リクエストごとにはチェック対象テキストなどの部分のみを後ろに付けて送る
+    """
+    __slots__ = ('reference_text', 'rule_text', 'tokens', 'trimmed')
+
+    def __init__(self, reference_text: str, rule_text: str, trimmed: bool = False):
+        self.reference_text = reference_text  # 商品カテゴリ別ガイダンスと参考データ
+        self.rule_text = rule_text  # 文章種類別ガイダンスとルール
+        self.tokens = estimate_tokens(reference_text) + estimate_tokens(rule_text)  # 推定トークン数
+        self.trimmed = trimmed  # 入力トークン数の上限のため参考データの一部を省略した
+
+
+class DataSnapshot:
+    """
+    参照データの不変スナップショット
+
+    作成後は変更しない。更新時は新しいインスタンスを作成して参照ごと差し替える
+    """
+    __slots__ = (
+        'version', 'segments', 'selections', 'retrieval', 'bundles', 'data_text', 'rules', 'category_guidance',
+        'text_type_guidance', 'ng_matchers', 'pattern_bundle', 'ng_patterns', 'matcher_path', 'sources',
+        'built_at', 'path', '_section_index', '_section_index_lock', '_prompt_prefixes', '_segment_tokens'
+    )
+
+    def __init__(self, segments: Dict[str, str], selections: BundleSelections, category_guidance: Dict[str, str],
+                 text_type_guidance: Dict[str, str], ng_matchers: CategoryNGMatchers,
+                 pattern_bundle: Tuple[str, bytes], sources: Dict[str, Optional[Dict[str, Any]]],
+                 ng_patterns: Optional[List[Dict[str, Any]]] = None, matcher_path: Optional[str] = None,
+                 built_at: str = '', path: Optional[str] = None, retrieval: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            segments: 参照ファイルのパス -> プロンプト用に整形済みの内容
+            selections: (商品カテゴリ, 文章種類) -> (参考データのパス, ルールのパス)。空のカテゴリ・文章種類は指定なし・未知を表す
+            category_guidance: 商品カテゴリ別ガイダンス
+            text_type_guidance: 文章種類別ガイダンス
+            ng_matchers: コンパイル済みのカテゴリ別NG表現マッチャー
+            pattern_bundle: ブラウザ簡易チェック用のパターンバンドル（バージョン, JSONバイト列）
+            sources: 元ファイルの相対パス -> 状態（サイズ・更新時刻・内容ハッシュ。ファイルがない場合はNone）
+            ng_patterns: マッチャーの構築に使ったパターン情報（ファイルから読み込んだ場合はNone）
+            matcher_path: マッチャーをmmapしているファイル（子プロセスで開き直す場合に使う）
+            built_at: 作成日時
+            path: 読み込んだスナップショットファイル（元ファイルから作成した場合はNone）
+            retrieval: 参考データのパス -> 関連部分の検索時の扱い（マニフェストの retrieval。ないものは全体を含める）
+        """
+        self.segments = MappingProxyType(dict(segments))
+        self.selections = MappingProxyType(dict(selections))
+        self.retrieval = MappingProxyType(dict(retrieval or {}))
+        self.category_guidance = MappingProxyType(dict(category_guidance))
+        self.text_type_guidance = MappingProxyType(dict(text_type_guidance))
+        self.ng_matchers = ng_matchers
+        self.pattern_bundle = pattern_bundle
+        self.sources = sources
+        self.ng_patterns = ng_patterns
+        self.matcher_path = matcher_path
+        self.built_at = built_at or time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        self.path = path
+        self.version = snapshot_version(
+            self.segments, self.selections, self.category_guidance, self.text_type_guidance, pattern_bundle[0],
+            self.retrieval
+        )
+
+        # 組み合わせごとの参考データ・ルールを組み立てておく（同じファイル構成の組み合わせは同じ文字列を共有）
+        joined: Dict[Tuple[str, ...], str] = {}
+
+        def join(paths: Tuple[str, ...], separator: str) -> str:
+            key = (separator,) + paths
+            if key not in joined:
+                joined[key] = separator.join(self.segments[path] for path in paths if path in self.segments)
+            return joined[key]
+
+        def always_included(paths: Tuple[str, ...]) -> Tuple[str, ...]:
+            return tuple(path for path in paths if path not in self.retrieval)
+
+        def sections_of(paths: Tuple[str, ...]) -> Tuple[str, ...]:
+            return tuple(path for path in paths if self.retrieval.get(path) == RETRIEVAL_SECTIONS)
+
+        self.bundles = MappingProxyType({
+            (category, text_type): PromptBundle(
+                category, text_type,
+                join(data_paths, DATA_SEPARATOR), join(rule_paths, RULE_SEPARATOR), data_paths, rule_paths,
+                base_text=join(always_included(data_paths), DATA_SEPARATOR),
+                section_paths=sections_of(data_paths)
+            )
+            for (category, text_type), (data_paths, rule_paths) in self.selections.items()
+        })
+        self.data_text = self.bundle('', '').data_text
+        self.rules = MappingProxyType({
+            text_type: bundle.rule_text for (category, text_type), bundle in self.bundles.items()
+            if not category and text_type
+        })
+
+        # セクション検索の索引は初回の検索時に作成する（起動・差し替えを遅くしない）
+        self._section_index: Optional[SectionIndex] = None
+        self._section_index_lock = threading.Lock()
+        # 描画済みのプロンプトの変わらない部分（初回の使用時に作成）
+        self._prompt_prefixes: Dict[Tuple[str, str, str, str, bool, Optional[int]], PromptPrefix] = {}
+        self._segment_tokens: Dict[str, int] = {}  # セグメント -> 推定トークン数（参考データを省略する場合に使う）
+
+    def bundle(self, category: str = '', text_type: str = '') -> PromptBundle:
+        """
+        商品カテゴリ・文章種類に対応する組み立て済みの参考データ・ルール
+
+        マニフェスト・ガイダンスにないカテゴリ・文章種類は、その項目で対象を限定していないファイルのみを使う
+        """
+        category = normalize_category(category)
+        if (category, '') not in self.bundles:
+            category = ''
+        if ('', text_type) not in self.bundles:
+            text_type = ''
+        bundle = self.bundles.get((category, text_type))
+        if bundle is None:
+            return PromptBundle(category, text_type, '', '', (), ())
+        return bundle
+
+    def prompt_prefix(self, category: str = '', text_type: str = '', retrieval: bool = False,
+                      token_budget: Optional[int] = None) -> PromptPrefix:
+        """
+        商品カテゴリ・文章種類に対応するプロンプトの変わらない部分（スナップショットごとに1回だけ描画）
+
+        Args:
+            category: 商品カテゴリ
+            text_type: 文章の種類
+            retrieval: 関連部分の検索を行う（参考データは検索で置き換えないファイルのみを含める）
+            token_budget: 推定トークン数（estimate_tokens）の上限。超える場合は優先度の低い参考データから省略する
+                （プロンプトキャッシュが効くよう、リクエストごとに変わらない値を指定する）
+        """
+        bundle = self.bundle(category, text_type)
+        # 同じ内容になる指定は同じキーにまとめる（未知のカテゴリ・文章種類でキーが増え続けないようにする）
+        category_key = category if category in self.category_guidance else ''
+        text_type_key = text_type if text_type in self.text_type_guidance else ''
+        retrieval = retrieval and bool(self.retrieval)
+        key = (bundle.category, bundle.text_type, category_key, text_type_key, retrieval, None)
+
+        prefix = self._prompt_prefixes.get(key)
+        if prefix is None:
+            if retrieval:
+                data = bundle.base_text or EMPTY_BASE_DATA
+            else:
+                data = bundle.data_text
+            prefix = PromptPrefix(
+                REFERENCE_PROMPT_TEMPLATE.format(
+                    guidance=self.category_guidance.get(category_key, DEFAULT_CATEGORY_GUIDANCE), data=data
+                ),
+                RULE_PROMPT_TEMPLATE.format(
+                    guidance=self.text_type_guidance.get(text_type_key, DEFAULT_TEXT_TYPE_GUIDANCE),
+                    rules=bundle.rule_text
+                )
+            )
+            # 同時に作成された場合も内容は同じため、先に登録されたものを使う
+            prefix = self._prompt_prefixes.setdefault(key, prefix)
+        if token_budget is None or prefix.tokens <= token_budget:
+            # 上限に収まる場合は上限によらず同じものを使う
+            return prefix
+
+        trimmed_key = key[:-1] + (token_budget,)
+        trimmed = self._prompt_prefixes.get(trimmed_key)
+        if trimmed is None:
+            paths = tuple(path for path in bundle.data_paths if not retrieval or path not in self.retrieval)
+            data_budget = token_budget - estimate_tokens(prefix.rule_text) - estimate_tokens(
+                REFERENCE_PROMPT_TEMPLATE.format(
+                    guidance=self.category_guidance.get(category_key, DEFAULT_CATEGORY_GUIDANCE), data=''
+                )
+            )
+            trimmed = PromptPrefix(
+                REFERENCE_PROMPT_TEMPLATE.format(
+                    guidance=self.category_guidance.get(category_key, DEFAULT_CATEGORY_GUIDANCE),
+                    data=self._trim_data(paths, data_budget)
+                ),
+                prefix.rule_text, trimmed=True
+            )
+            if trimmed.tokens < prefix.tokens:
+                logger.warning(
+                    f"参考データを入力トークン数の上限に合わせて省略: {bundle.category or '指定なし'} / "
+                    f"{bundle.text_type or '指定なし'}（推定 {prefix.tokens} → {trimmed.tokens} / 上限 {token_budget} トークン）"
+                )
+            else:
+                # 省略できる参考データがない（ガイダンス・ルールのみで上限を超える）場合はそのまま使う
+                trimmed = prefix
+            trimmed = self._prompt_prefixes.setdefault(trimmed_key, trimmed)
+        return trimmed
+
+    def _trim_data(self, paths: Tuple[str, ...], token_budget: int) -> str:
+        """
+        参考データを優先度の高い順（マニフェストの priority 順）に推定トークン数の上限まで結合
+
+        上限を超えるファイルは上限に収まる行までを含め、以降のファイルは省略する
+        """
+        budget = token_budget - estimate_tokens(TRIMMED_DATA_NOTE)
+        parts = []
+        for path in paths:
+            segment = self.segments.get(path)
+            if segment is None:
+                continue
+            tokens = self._segment_tokens.get(path)
+            if tokens is None:
+                tokens = self._segment_tokens.setdefault(path, estimate_tokens(segment))
+            if tokens <= budget:
+                parts.append(segment)
+                budget -= tokens
+                continue
+
+            lines = []
+            for line in segment.split('\n'):
+                line_tokens = estimate_tokens(line) + 1
+                if line_tokens > budget:
+                    break
+                lines.append(line)
+                budget -= line_tokens
+            if lines:
+                parts.append('\n'.join(lines))
+            break
+        parts.append(TRIMMED_DATA_NOTE)
+        return DATA_SEPARATOR.join(parts)
+
+    def section_index(self) -> SectionIndex:
+        """セクション検索の対象ファイルを見出し単位に分割した索引（初回呼び出し時に作成）"""
+        if self._section_index is None:
+            with self._section_index_lock:
+                if self._section_index is None:
+                    started = time.perf_counter()
+                    sections = []
+                    for source_path, mode in self.retrieval.items():
+                        if mode == RETRIEVAL_SECTIONS and source_path in self.segments:
+                            title, body = _split_segment_title(self.segments[source_path])
+                            sections.extend(split_markdown_sections(body, source_path, title))
+                    self._section_index = SectionIndex(sections)
+                    logger.info(
+                        f"参考資料のセクション索引を作成: {len(sections)}セクション"
+                        f"（{(time.perf_counter() - started) * 1000:.0f}ms）"
+                    )
+        return self._section_index
+
+    def retrieve_sections(self, bundle: PromptBundle, query: str, top_k: int) -> List[Section]:
+        """参考データのうち、クエリ（チェック対象テキスト）に関連するセクション（関連度の高い順）"""
+        if not bundle.section_paths or top_k <= 0:
+            return []
+        return [section for _, section in self.section_index().search(query, top_k, sources=bundle.section_paths)]
+
+    def stale_sources(self, base_dir: str) -> List[str]:
+        """作成後に変更・追加・削除された元ファイルの相対パス"""
+        stale = []
+        for relative_path, state in self.sources.items():
+            path = os.path.join(base_dir, relative_path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if state is not None:
+                    stale.append(relative_path)
+                continue
+
+            if state is None or stat.st_size != state['size']:
+                stale.append(relative_path)
+            elif stat.st_mtime_ns != state['mtime_ns'] and _sha256_file(path) != state['sha256']:
+                # 更新時刻のみが変わった場合（チェックアウトし直しなど）は内容で判定する
+                stale.append(relative_path)
+        return stale
+
+
+def write_data_snapshot(path: str, snapshot: DataSnapshot) -> str:
+    """
+    データスナップショットをファイルに書き出す
+
+    Returns:
+        スナップショットのバージョン（内容ハッシュ）
+    """
+    sections: Dict[str, bytes] = {}
+    segment_sections = {}
+    for index, (source_path, content) in enumerate(snapshot.segments.items()):
+        segment_sections[source_path] = f"segment.{index}"
+        sections[f"segment.{index}"] = content.encode('utf-8')
+
+    matcher_sections, matcher_metadata = compiled_matcher_sections(
+        snapshot.ng_matchers, snapshot.pattern_bundle, prefix='ng.'
+    )
+    sections.update(matcher_sections)
+
+    write_section_file(path, sections, metadata={
+        'snapshot_format_version': SNAPSHOT_FORMAT_VERSION,
+        'version': snapshot.version,
+        'built_at': snapshot.built_at,
+        'compiler_hash': source_fingerprint([]),
+        'sources': snapshot.sources,
+        'segments': segment_sections,
+        'retrieval': dict(snapshot.retrieval),
+        'selections': [
+            [category, text_type, list(data_paths), list(rule_paths)]
+            for (category, text_type), (data_paths, rule_paths) in snapshot.selections.items()
+        ],
+        'category_guidance': dict(snapshot.category_guidance),
+        'text_type_guidance': dict(snapshot.text_type_guidance),
+        'ng_matchers': matcher_metadata
+    })
+    logger.info(f"データスナップショットを作成: {path}（バージョン {snapshot.version}, {os.path.getsize(path)}バイト）")
+    return snapshot.version
+
+
+def load_data_snapshot(path: str, base_dir: str, fuzzy_max_distance: int = 1) -> Optional[DataSnapshot]:
+    """
+    データスナップショットをファイルから読み込む（NG表現マッチャーはmmapで参照）
+
+    Args:
+        path: スナップショットのパス
+        base_dir: 元ファイルの基準ディレクトリ（backend/）
+        fuzzy_max_distance: あいまい検出で許容する編集距離の上限
+
+    Returns:
+        スナップショット。ファイルがない・形式が異なる・元ファイルが更新されている場合はNone
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        section_file = SectionFile(path)
+        metadata = section_file.metadata
+        if metadata.get('snapshot_format_version') != SNAPSHOT_FORMAT_VERSION:
+            logger.warning(f"データスナップショットの形式が異なるため使用しません: {path}")
+            return None
+        if metadata.get('compiler_hash') != source_fingerprint([]):
+            logger.warning(f"NG表現マッチャーのソースが更新されているためデータスナップショットを使用しません: {path}")
+            return None
+
+        loaded = matchers_from_section_file(section_file, fuzzy_max_distance)
+        if loaded is None:
+            logger.warning(f"データスナップショットのNG表現マッチャーを読み込めません: {path}")
+            return None
+
+        ng_matchers, pattern_bundle = loaded
+        snapshot = DataSnapshot(
+            segments={
+                source_path: bytes(section_file.bytes(name)).decode('utf-8')
+                for source_path, name in metadata.get('segments', {}).items()
+            },
+            selections={
+                (category, text_type): (tuple(data_paths), tuple(rule_paths))
+                for category, text_type, data_paths, rule_paths in metadata.get('selections', [])
+            },
+            category_guidance=metadata.get('category_guidance', {}),
+            text_type_guidance=metadata.get('text_type_guidance', {}),
+            ng_matchers=ng_matchers,
+            pattern_bundle=pattern_bundle,
+            sources=metadata.get('sources', {}),
+            matcher_path=path,
+            built_at=metadata.get('built_at', ''),
+            path=path,
+            retrieval=metadata.get('retrieval', {})
+        )
+    except (OSError, ValueError, KeyError, TypeError, SectionFileError) as e:
+        logger.warning(f"データスナップショットを読み込めません: {e}")
+        return None
+
+    stale = snapshot.stale_sources(base_dir)
+    if stale:
+        logger.warning(f"元ファイルが更新されているためデータスナップショットを使用しません: {', '.join(stale)}")
+        return None
+
+    logger.info(f"データスナップショットを読み込み: {path}（バージョン {snapshot.version}, 作成 {snapshot.built_at}）")
+    return snapshot
@@ -0,0 +1,247 @@
+"""
+ライブチェックサービスモジュール
+WebSocket接続ごとの入力状態を管理し、ローカルNG表現チェックの即時応答と
+入力が止まった後の1回分のClaude APIチェック（デバウンス）を制御する
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 全接続で共有するClaude APIチェック用スレッドプール
+_full_check_executor = ThreadPoolExecutor(max_workers=Config.LIVE_CHECK_MAX_WORKERS)
+
+# 詳細チェック実行中に結果を確認する間隔（秒）
+POLL_INTERVAL = 0.1
+
+# 詳細チェックの文字数上限（/api/check と同じ）
+FULL_CHECK_MAX_LENGTH = 5000
+
+# このプロセスで開いているライブチェック接続数
+_connection_lock = threading.Lock()
+_connection_count = 0
+
+
+def acquire_connection() -> bool:
+    """
+    ライブチェック接続の枠を確保（LIVE_CHECK_MAX_CONNECTIONS に達している場合はFalse）
+
+    接続はワーカーのスレッドを占有し続けるため、上限を超えた接続は待たせずに拒否する
+    """
+    global _connection_count
+    with _connection_lock:
+        if _connection_count >= Config.LIVE_CHECK_MAX_CONNECTIONS:
+            return False
+        _connection_count += 1
+        return True
+
+
+def release_connection():
+    """acquire_connection() で確保した枠を解放"""
+    global _connection_count
+    with _connection_lock:
+        _connection_count = max(0, _connection_count - 1)
+
+
+class LiveCheckSession:
+    """WebSocketライブチェック1接続分の状態"""
+
+    def __init__(self, yakki_checker, idle_seconds: float = None):
+        self.yakki_checker = yakki_checker
+        self.idle_seconds = Config.LIVE_CHECK_IDLE_SECONDS if idle_seconds is None else idle_seconds
+
+        self.scan_session_id: Optional[str] = None
+        self.text = ''
+        self.options = {
+            'category': '',
+            'text_type': '',
+            'special_points': '',
+            'medical_approval': False
+        }
+
+        # 入力のたびに進む世代番号（古い世代の詳細チェック結果は破棄する）
+        self.generation = 0
+        self.deadline: Optional[float] = None
+        self.future: Optional[Future] = None
+        self.future_generation = 0
+
+    def handle_message(self, raw_message: str) -> List[Dict[str, Any]]:
+        """
+        クライアントからのメッセージを処理し、即時に返すメッセージを返す
+
+        メッセージ形式:
+            {"type": "text", "text": "...", "category": "...", "text_type": "...", ...}
+            {"type": "edit", "edits": [{"offset": 0, "delete": 0, "insert": "..."}]}
+            {"type": "options", "category": "...", "text_type": "...", ...}
+        """
+        try:
+            message = json.loads(raw_message)
+            if not isinstance(message, dict):
+                raise ValueError("message must be a JSON object")
+        except ValueError as e:
+            return [{'type': 'error', 'message': f"Invalid message: {e}"}]
+
+        message_type = message.get('type', 'text')
+        previous_category = self.options['category']
+        self._update_options(message)
+        # カテゴリが変わった場合はそのカテゴリのマッチャーで全文を走査し直す
+        category_changed = self.options['category'] != previous_category and self.scan_session_id is not None
+
+        try:
+            # 簡易チェックと同じ文字数上限（QUICK_CHECK_MAX_LENGTH）を超えるテキストは走査・保持しない
+            if message_type == 'text':
+                text = str(message.get('text', ''))
+                if len(text) > Config.QUICK_CHECK_MAX_LENGTH:
+                    return self._reject_too_long()
+                result = self._start_scan(text)
+            elif message_type == 'edit':
+                edits = message.get('edits') or [message]
+                length = self.yakki_checker.scan_sessions.edited_length(self.scan_session_id, edits)
+                if length is not None and length > Config.QUICK_CHECK_MAX_LENGTH:
+                    return self._reject_too_long()
+                result = self._apply_edits(edits)
+                if category_changed:
+                    result = self._start_scan(self.text)
+            elif message_type == 'options':
+                result = self._start_scan(self.text) if category_changed else None
+            else:
+                return [{'type': 'error', 'message': f"Unknown message type: {message_type}"}]
+        except (TypeError, ValueError) as e:
+            return [{'type': 'error', 'message': f"Invalid edit: {e}"}]
+
+        self._supersede()
+
+        if result is None:
+            return []
+        result['type'] = 'quick'
+        result['generation'] = self.generation
+        return [result]
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """待機時間の経過と詳細チェックの完了を確認し、送信すべきメッセージを返す"""
+        messages = []
+
+        if self.future is not None and self.future.done():
+            future, generation = self.future, self.future_generation
+            self.future = None
+            if generation == self.generation and not future.cancelled():
+                try:
+                    result = future.result()
+                    result['type'] = 'full'
+                    result['generation'] = generation
+                    messages.append(result)
+                except Exception as e:
+                    logger.error(f"ライブチェックの詳細チェックでエラー: {e}")
+                    messages.append({'type': 'error', 'generation': generation, 'message': str(e)})
+
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.deadline = None
+            message = self._launch_full_check()
+            if message:
+                messages.append(message)
+
+        return messages
+
+    def next_timeout(self) -> Optional[float]:
+        """次にpoll()が必要になるまでの秒数（Noneは入力待ちのみ）"""
+        timeouts = []
+        if self.deadline is not None:
+            timeouts.append(max(0.0, self.deadline - time.monotonic()))
+        if self.future is not None:
+            timeouts.append(POLL_INTERVAL)
+        return min(timeouts) if timeouts else None
+
+    def close(self):
+        """接続終了時の後処理"""
+        self._cancel_in_flight()
+        if self.scan_session_id:
+            self.yakki_checker.scan_sessions.delete(self.scan_session_id)
+
+    def _update_options(self, message: Dict[str, Any]):
+        """チェック条件（カテゴリ・文章種類など）を更新"""
+        for key in ('category', 'text_type', 'special_points'):
+            if key in message:
+                self.options[key] = str(message[key]).strip()
+        if 'medical_approval' in message:
+            self.options['medical_approval'] = bool(message['medical_approval'])
+
+    def _start_scan(self, text: str) -> Dict[str, Any]:
+        """全文でローカルチェックを行い、逐次再走査セッションを開始"""
+        if self.scan_session_id:
+            self.yakki_checker.scan_sessions.delete(self.scan_session_id)
+
+        result = self.yakki_checker.start_quick_check_session(text, self.options['category'])
+        self.scan_session_id = result['session_id']
+        self.text = text
+        return result
+
+    def _reject_too_long(self) -> List[Dict[str, Any]]:
+        """文字数上限を超えた場合は走査中のテキストと詳細チェックを破棄し、エラーを返す（次はtextで全文を送る）"""
+        if self.scan_session_id:
+            self.yakki_checker.scan_sessions.delete(self.scan_session_id)
+            self.scan_session_id = None
+        self.text = ''
+        self.generation += 1
+        self._cancel_in_flight()
+        self.deadline = None
+        return [{
+            'type': 'error',
+            'generation': self.generation,
+            'message': f"Text is too long (max {Config.QUICK_CHECK_MAX_LENGTH} characters)"
+        }]
+
+    def _apply_edits(self, edits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """編集差分を適用して影響範囲のみローカルチェック"""
+        result = None
+        if self.scan_session_id:
+            result = self.yakki_checker.update_quick_check_session(self.scan_session_id, edits)
+        if result is None:
+            raise ValueError("no text has been sent yet or the session has expired; send a text message first")
+
+        self.text = self.yakki_checker.scan_sessions.get(self.scan_session_id)[0]
+        return result
+
+    def _supersede(self):
+        """入力の更新により実行中の詳細チェックを無効化し、待機時間を再設定"""
+        self.generation += 1
+        self._cancel_in_flight()
+        self.deadline = time.monotonic() + self.idle_seconds
+
+    def _cancel_in_flight(self):
+        """実行待ちの詳細チェックを取り消す（実行中のものは結果を破棄する）"""
+        if self.future is not None:
+            self.future.cancel()
+            self.future = None
+
+    def _launch_full_check(self) -> Optional[Dict[str, Any]]:
+        """入力が止まった時点のテキストでClaude APIによる詳細チェックを開始"""
+        text = self.text.strip()
+        options = dict(self.options)
+
+        if not text or not options['category'] or not options['text_type']:
+            return None
+        if len(text) > FULL_CHECK_MAX_LENGTH:
+            return {
+                'type': 'error',
+                'generation': self.generation,
+                'message': f"Text is too long for full check (max {FULL_CHECK_MAX_LENGTH} characters)"
+            }
+
+        self.future = _full_check_executor.submit(
+            self.yakki_checker.check_text,
+            text=text,
+            text_type=options['text_type'],
+            category=options['category'],
+            special_points=options['special_points'],
+            medical_approval=options['medical_approval']
+        )
+        self.future_generation = self.generation
+
+        return {'type': 'status', 'generation': self.generation, 'status': 'analyzing', 'message': 'AI分析中'}
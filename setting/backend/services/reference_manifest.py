@@ -0,0 +1,220 @@
+"""
+参照データマニフェストモジュール
+プロンプトに使う参照ファイル（data/ と rule/）ごとに、役割・対象の商品カテゴリと文章種類・
+エンコーディング・優先度を記述したマニフェスト（reference_manifest.json）を読み込む
+参照ファイルの追加や対象の変更はマニフェストの編集のみで行える
+
+マニフェストの形式:
+    {
+      "version": 1,
+      "files": [
+        {"path": "data/law1.md", "role": "reference", "priority": 100},
+        {"path": "rule/キャッチコピー.md", "role": "rule", "text_types": ["キャッチコピー"]}
+      ]
+    }
+
+各ファイルの項目:
+    path: backend/ からの相対パス（必須）
+    role: reference（参考データ）| ng_expressions（NG表現CSV）| rule（文章種類別ルール）
+    title: 参考データの見出し（省略時はファイル名）
+    categories: 対象の商品カテゴリ（省略・空は全カテゴリ）
+    text_types: 対象の文章種類（省略・空は全種類）
+    encoding: エンコーディング（省略時・auto は utf-8 / shift_jis / cp932 を順に試行）
+    priority: 優先度（大きいほど先に並べる。同じ場合は記載順）
+    retrieval: 関連部分の検索時の扱い（省略時は全体を含める）
+        sections: 見出し単位のセクションに分割し、チェック対象テキストに関連するセクションのみを含める
+        hits: 表全体の代わりにローカルで検出したNG表現のみを含める（ng_expressions のみ）
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List, Any, Tuple, Optional
+
+from utils.category_matchers import normalize_category
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FORMAT_VERSION = 1
+
+ROLE_REFERENCE = 'reference'
+ROLE_NG_EXPRESSIONS = 'ng_expressions'
+ROLE_RULE = 'rule'
+ROLES = (ROLE_REFERENCE, ROLE_NG_EXPRESSIONS, ROLE_RULE)
+
+# プロンプトの参考データに含める役割
+DATA_ROLES = (ROLE_REFERENCE, ROLE_NG_EXPRESSIONS)
+
+# 関連部分の検索時の扱い
+RETRIEVAL_FULL = 'full'
+RETRIEVAL_SECTIONS = 'sections'
+RETRIEVAL_HITS = 'hits'
+
+
+class ReferenceManifestError(ValueError):
+    """マニフェストの形式エラー"""
+
+
+class ReferenceFile:
+    """マニフェストに記載された参照ファイル1つ分の情報"""
+    __slots__ = ('path', 'role', 'title', 'categories', 'text_types', 'encoding', 'priority', 'retrieval')
+
+    def __init__(self, path: str, role: str = ROLE_REFERENCE, title: str = '',
+                 categories: Tuple[str, ...] = (), text_types: Tuple[str, ...] = (),
+                 encoding: str = 'auto', priority: int = 0, retrieval: str = RETRIEVAL_FULL):
+        self.path = path
+        self.role = role
+        self.title = title or os.path.basename(path)
+        self.categories = tuple(normalize_category(category) for category in categories)
+        self.text_types = tuple(text_types)
+        self.encoding = encoding or 'auto'
+        self.priority = priority
+        self.retrieval = retrieval or RETRIEVAL_FULL
+
+    def applies_to(self, category: str, text_type: str) -> bool:
+        """
+        商品カテゴリ・文章種類が対象か
+
+        カテゴリ・文章種類が空（指定なし・未知）の場合は、その項目で対象を限定していないファイルのみが該当する
+        """
+        return (
+            (not self.categories or category in self.categories)
+            and (not self.text_types or text_type in self.text_types)
+        )
+
+
+class ReferenceManifest:
+    """参照ファイルの一覧（優先度の高い順）"""
+
+    def __init__(self, files: List[ReferenceFile], path: Optional[str] = None):
+        # 優先度の高い順（同じ場合は記載順）
+        self.files = tuple(sorted(files, key=lambda reference_file: -reference_file.priority))
+        self.path = path
+
+    def files_for(self, role: str) -> List[ReferenceFile]:
+        """役割に該当するファイル"""
+        return [reference_file for reference_file in self.files if reference_file.role == role]
+
+    def select(self, category: str, text_type: str, roles: Tuple[str, ...]) -> Tuple[ReferenceFile, ...]:
+        """商品カテゴリ・文章種類・役割に該当するファイル（優先度の高い順）"""
+        return tuple(
+            reference_file for reference_file in self.files
+            if reference_file.role in roles and reference_file.applies_to(category, text_type)
+        )
+
+    @property
+    def categories(self) -> List[str]:
+        """対象を限定しているファイルがある商品カテゴリ"""
+        return list(dict.fromkeys(
+            category for reference_file in self.files for category in reference_file.categories
+        ))
+
+    @property
+    def text_types(self) -> List[str]:
+        """対象を限定しているファイルがある文章種類"""
+        return list(dict.fromkeys(
+            text_type for reference_file in self.files for text_type in reference_file.text_types
+        ))
+
+
+def _string_list(value: Any, field: str, path: str) -> Tuple[str, ...]:
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ReferenceManifestError(f"{field} は文字列のリストで指定してください: {path}")
+    return tuple(item for item in value if item)
+
+
+def parse_reference_manifest(data: bytes, path: Optional[str] = None) -> ReferenceManifest:
+    """
+    マニフェスト（JSON）を解析
+
+    Raises:
+        ReferenceManifestError: 形式が正しくない場合
+    """
+    try:
+        document = json.loads(data.decode('utf-8-sig'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ReferenceManifestError(f"マニフェストを解析できません: {e}")
+
+    if not isinstance(document, dict) or not isinstance(document.get('files'), list):
+        raise ReferenceManifestError("マニフェストには files（リスト）が必要です")
+    if document.get('version', MANIFEST_FORMAT_VERSION) != MANIFEST_FORMAT_VERSION:
+        raise ReferenceManifestError(f"未対応のマニフェストの版です: {document.get('version')}")
+
+    files = []
+    for entry in document['files']:
+        if not isinstance(entry, dict) or not entry.get('path'):
+            raise ReferenceManifestError(f"path のない項目があります: {entry}")
+        file_path = entry['path']
+        role = entry.get('role', ROLE_REFERENCE)
+        if role not in ROLES:
+            raise ReferenceManifestError(f"未知の役割です: {role}（{file_path}）")
+        try:
+            priority = int(entry.get('priority', 0))
+        except (TypeError, ValueError):
+            raise ReferenceManifestError(f"priority は整数で指定してください: {file_path}")
+
+        retrieval = entry.get('retrieval', RETRIEVAL_FULL)
+        allowed = {
+            ROLE_REFERENCE: (RETRIEVAL_FULL, RETRIEVAL_SECTIONS),
+            ROLE_NG_EXPRESSIONS: (RETRIEVAL_FULL, RETRIEVAL_HITS),
+            ROLE_RULE: (RETRIEVAL_FULL,)
+        }[role]
+        if retrieval not in allowed:
+            raise ReferenceManifestError(f"{role} の retrieval には {' / '.join(allowed)} を指定してください: {file_path}")
+
+        files.append(ReferenceFile(
+            path=file_path,
+            role=role,
+            title=entry.get('title', ''),
+            categories=_string_list(entry.get('categories'), 'categories', file_path),
+            text_types=_string_list(entry.get('text_types'), 'text_types', file_path),
+            encoding=entry.get('encoding', 'auto'),
+            priority=priority,
+            retrieval=retrieval
+        ))
+
+    if len([reference_file for reference_file in files if reference_file.role == ROLE_NG_EXPRESSIONS]) > 1:
+        raise ReferenceManifestError("ng_expressions の役割を持つファイルは1つまでです")
+
+    return ReferenceManifest(files, path=path)
+
+
+def load_reference_manifest(path: str) -> ReferenceManifest:
+    """
+    マニフェストをファイルから読み込む
+
+    Raises:
+        OSError: ファイルを読み込めない場合
+        ReferenceManifestError: 形式が正しくない場合
+    """
+    with open(path, 'rb') as f:
+        return parse_reference_manifest(f.read(), path)
+
+
+def bundle_keys(manifest: ReferenceManifest, categories: List[str],
+                text_types: List[str]) -> List[Tuple[str, str]]:
+    """事前に組み立てる（商品カテゴリ, 文章種類）の組み合わせ（空は指定なし・未知を表す）"""
+    all_categories = [''] + list(dict.fromkeys(list(categories) + manifest.categories))
+    all_text_types = [''] + list(dict.fromkeys(list(text_types) + manifest.text_types))
+    return [(category, text_type) for category in all_categories for text_type in all_text_types]
+
+
+def bundle_selections(manifest: ReferenceManifest, categories: List[str],
+                      text_types: List[str]) -> Dict[Tuple[str, str], Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+    """
+    （商品カテゴリ, 文章種類）ごとに使用する参照ファイル
+
+    Returns:
+        (商品カテゴリ, 文章種類) -> (参考データのパス, ルールのパス)
+    """
+    return {
+        (category, text_type): (
+            tuple(reference_file.path for reference_file in manifest.select(category, text_type, DATA_ROLES)),
+            tuple(reference_file.path for reference_file in manifest.select(category, text_type, (ROLE_RULE,)))
+        )
+        for category, text_type in bundle_keys(manifest, categories, text_types)
+    }
@@ -5,34 +5,84 @@
 薬機法違反チェック、プロンプト生成、結果処理のメインロジック
 """
 
-import re
 import json
 import logging
 import hashlib
-import pandas as pd
 from typing import Dict, List, Any, Optional, Tuple
 
-from services.claude_service import ClaudeService
+from services.claude_service import ClaudeService, text_block, content_text
 from services.data_service import DataService
-from models.data_models import CheckCache
+from services.data_snapshot import DataSnapshot, PromptBundle, DATA_SEPARATOR
+from services.reference_manifest import RETRIEVAL_HITS
+from models.data_models import CheckCache, ScanSessionStore
 from utils.cache import CacheManager
+from utils.ng_matcher import NGMatcher, select_longest
+from utils.fuzzy_matcher import find_issues_fuzzy
+from utils.category_matchers import CategoryNGMatchers
+from utils.token_estimator import TokenEstimator, estimate_tokens
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# 詳細チェックの応答（JSON）の推定トークン数の内訳
+OUTPUT_BASE_TOKENS = 300  # JSONの構造・総合リスク
+REWRITE_COUNT = 3  # リライト案の数（それぞれチェック対象テキストと同程度の長さ）
+REWRITE_EXPLANATION_TOKENS = 120  # リライト案1つあたりの説明
+ISSUE_TOKENS = 180  # 問題点1つあたり（理由・代替案3つ）
+MIN_EXPECTED_ISSUES = 3  # ローカルで検出したNG表現が少ない場合も見込む問題点の数
+OUTPUT_TOKEN_MARGIN = 1.5  # 推定値に対する余裕
+
 class YakkiChecker:
     """薬機法チェッカーメインサービス"""
     
-    def __init__(self):
+    def __init__(self, data_service: Optional[DataService] = None):
+        """
+        Args:
+            data_service: 参照データの読み込みに使うデータサービス（省略時はファイル監視・自動再読み込みありで作成）
+        """
         self.claude_service = ClaudeService()
-        self.data_service = DataService()
+        self.data_service = data_service or DataService()
         self.check_cache = CheckCache(
             max_size=Config.CACHE_MAX_SIZE,
             ttl=Config.CACHE_TTL
         )
-        
-        # プリプロセシング用NG表現パターン
-        self.ng_patterns = self._generate_ng_patterns()
+        self.scan_sessions = ScanSessionStore(
+            max_size=Config.QUICK_CHECK_SESSION_MAX,
+            ttl=Config.QUICK_CHECK_SESSION_TTL
+        )
+        # 参照データが変わるとキャッシュ済みのチェック結果は参照されなくなるため破棄する
+        self.data_service.add_reload_listener(lambda snapshot: self.check_cache.clear())
+        # プロンプトの入力トークン数の推定（APIが返した実際のトークン数で補正）
+        self.token_estimator = TokenEstimator()
+        self._system_prompt_tokens = estimate_tokens(self._create_system_prompt())
+    
+    # プリプロセシング用NG表現マッチャー・パターンバンドルは現在のデータスナップショットから参照する
+    # （1リクエスト内で複数回参照する場合は self.data_service.snapshot を1回だけ取得して使う）
+    
+    @property
+    def ng_matchers(self) -> CategoryNGMatchers:
+        """商品カテゴリごとのコンパイル済みNG表現マッチャー"""
+        return self.data_service.snapshot.ng_matchers
+    
+    @property
+    def ng_matcher(self) -> NGMatcher:
+        """カテゴリ共通パターンのみのマッチャー"""
+        return self.data_service.snapshot.ng_matchers.default
+    
+    @property
+    def pattern_bundle(self) -> Tuple[str, bytes]:
+        """ブラウザ簡易チェック用のパターンバンドル（バージョン, JSONバイト列）"""
+        return self.data_service.snapshot.pattern_bundle
+    
+    @property
+    def ng_patterns(self) -> Optional[List[Dict[str, Any]]]:
+        """マッチャーの構築に使ったパターン情報（コンパイル済みファイルから読み込んだ場合はNone）"""
+        return self.data_service.snapshot.ng_patterns
+    
+    @property
+    def ng_matcher_path(self) -> Optional[str]:
+        """マッチャーをmmapしているコンパイル済みファイル"""
+        return self.data_service.snapshot.matcher_path
     
     def check_text(self, text: str, text_type: str, category: str, 
                    special_points: str = '', medical_approval: bool = False) -> Dict[str, Any]:
@@ -51,8 +101,10 @@ class YakkiChecker:
         """
         try:
             # キャッシュチェック
+            # 参照データが更新されたら以前の結果は使わない（キーにスナップショットのバージョンを含める）
             cache_key = self.check_cache.get_cache_key(
-                text, category, text_type, special_points, medical_approval
+                text, category, text_type, special_points, medical_approval,
+                data_version=self.data_service.snapshot.version
             )
             
             cached_result = self.check_cache.get(cache_key)
@@ -62,7 +114,7 @@ class YakkiChecker:
                 return cached_result
             
             # プリプロセシング（基本的なNG表現チェック）
-            preprocessing_issues = self._check_ng_expressions_in_text(text)
+            preprocessing_issues = self._check_ng_expressions_in_text(text, category)
             
             # Claude APIが利用可能かチェック
             if not self.claude_service.is_available():
@@ -74,7 +126,7 @@ class YakkiChecker:
             else:
                 # Claude APIで詳細チェック
                 result = self._call_claude_api_check(
-                    text, text_type, category, special_points, medical_approval
+                    text, text_type, category, special_points, medical_approval, preprocessing_issues
                 )
             
             # 結果をキャッシュに保存
@@ -88,19 +140,31 @@ class YakkiChecker:
             return self._create_fallback_response(text, f"チェック処理エラー: {str(e)}")
     
     def _call_claude_api_check(self, text: str, text_type: str, category: str, 
-                              special_points: str, medical_approval: bool) -> Dict[str, Any]:
-        """Claude APIを使用した詳細チェック"""
+                              special_points: str, medical_approval: bool,
+                              ng_issues: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Claude APIを使用した詳細チェック（ng_issues はプリプロセシングで検出済みのNG表現）"""
         try:
-            # プロンプト生成
-            system_prompt = self._create_system_prompt()
-            user_prompt = self._create_user_prompt(
-                text, text_type, category, special_points, medical_approval
+            # プロンプト生成（変わらない接頭部分はプロンプトキャッシュの対象）
+            system_prompt = [text_block(self._create_system_prompt(), cache=True)]
+            user_prompt, estimated_tokens = self._create_user_content(
+                text, text_type, category, special_points, medical_approval, ng_issues
             )
             
-            # Claude API呼び出し
-            api_response = self.claude_service.call_api(system_prompt, user_prompt)
+            # Claude API呼び出し（最大出力トークン数は応答の推定の大きさに合わせる）
+            api_response = self.claude_service.call_api(
+                system_prompt, user_prompt, max_tokens=self._estimate_max_tokens(text, ng_issues)
+            )
             response_text = api_response['text']
             
+            # 実際の入力トークン数で推定を補正
+            token_usage = api_response.get('token_usage')
+            if token_usage:
+                self.token_estimator.observe(
+                    estimated_tokens,
+                    token_usage['input_tokens'] + token_usage['cache_read_input_tokens']
+                    + token_usage['cache_creation_input_tokens']
+                )
+            
             # レスポンス解析
             result = self.claude_service.parse_response(response_text, text)
             
@@ -166,17 +230,47 @@ class YakkiChecker:
 ```'''
     
     def _create_user_prompt(self, text: str, text_type: str, category: str, 
-                           special_points: str, medical_approval: bool) -> str:
+                           special_points: str, medical_approval: bool,
+                           ng_issues: Optional[List[Dict[str, Any]]] = None) -> str:
         """ユーザープロンプトを生成"""
-        # データファイルの内容を取得
-        all_data_content = self.data_service.load_all_data_files()
-        rule_content = self.data_service.load_rule_file(text_type)
+        content, _ = self._create_user_content(text, text_type, category, special_points, medical_approval, ng_issues)
+        return content_text(content)
+    
+    def _create_user_content(self, text: str, text_type: str, category: str, 
+                             special_points: str, medical_approval: bool,
+                             ng_issues: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        ユーザープロンプトをテキストブロックのリストで生成
         
-        # カテゴリ別ガイダンス
-        category_guidance = self.data_service.get_category_guidance(category)
-        text_type_guidance = self.data_service.get_text_type_guidance(text_type)
+        リクエストごとに変わらない部分（商品カテゴリ別の参考データ、文章種類別のルール）はスナップショットで
+        描画済みのものをそのまま先に置いてプロンプトキャッシュの対象にし、チェック対象テキストなど
+        リクエストごとの部分のみを作成して最後に置く
         
-        prompt = f"""以下のテキストを薬機法の観点から詳細に分析してください。
+        入力トークン数の上限（PROMPT_INPUT_TOKEN_BUDGET）がある場合、変わらない部分は優先度の低い参考データから、
+        検索した参考データは関連度の低いセクションから省略して上限に収める
+        
+        Returns:
+            (テキストブロックのリスト, システムプロンプトを含む推定トークン数（estimate_tokens の単位）)
+        """
+        # 同じスナップショットから一貫して参照
+        snapshot = self.data_service.snapshot
+        retrieval = Config.PROMPT_RETRIEVAL and bool(snapshot.retrieval)
+        
+        # 上限は補正前の推定トークン数の単位にする
+        input_budget = None
+        prefix_budget = None
+        if Config.PROMPT_INPUT_TOKEN_BUDGET > 0:
+            input_budget = self.token_estimator.unapply(Config.PROMPT_INPUT_TOKEN_BUDGET)
+            # 変わらない部分の上限はリクエストによらず一定にし（プロンプトキャッシュが効くように）、
+            # 補正係数の小さな変化で変わらないよう1000トークン単位に切り捨てる
+            prefix_budget = self.token_estimator.unapply(
+                Config.PROMPT_INPUT_TOKEN_BUDGET - Config.PROMPT_REQUEST_TOKEN_RESERVE
+            ) - self._system_prompt_tokens
+            prefix_budget = max(prefix_budget // 1000 * 1000, 0)
+        prefix = snapshot.prompt_prefix(category, text_type, retrieval, token_budget=prefix_budget)
+        
+        # リクエストごとの部分
+        request_prompt = f"""以下のテキストを薬機法の観点から詳細に分析してください。
 
 **チェック対象テキスト:**
 {text}
@@ -185,19 +279,8 @@ class YakkiChecker:
 **文章の種類:** {text_type}
 **特に訴求したいポイント:** {special_points or 'なし'}
 **医薬品・医療機器承認:** {'あり' if medical_approval else 'なし'}
-
-**カテゴリ別ガイダンス:**
-{category_guidance}
-
-**文章種類別ガイダンス:**
-{text_type_guidance}
-
-**参考データ:**
-{all_data_content}
-
-**文章種類別ルール:**
-{rule_content}
-
+"""
+        analysis_request = """
 **分析要求:**
 1. 薬機法違反の可能性がある表現を特定
 2. 各問題のリスクレベル（高・中・低）を判定
@@ -206,62 +289,108 @@ class YakkiChecker:
 5. 3パターンのリライト案を作成（保守的・バランス・訴求力重視）
 
 必ずJSON形式で回答してください。"""
+        estimated_tokens = (
+            self._system_prompt_tokens + prefix.tokens
+            + estimate_tokens(request_prompt) + estimate_tokens(analysis_request)
+        )
+        
+        if retrieval:
+            retrieved_budget = None if input_budget is None else input_budget - estimated_tokens
+            retrieved_data = self._create_retrieved_data(
+                snapshot, snapshot.bundle(category, text_type), text, category, ng_issues, retrieved_budget
+            )
+            retrieved_prompt = f"""
+**チェック対象テキストに関連する参考データ:**
+{retrieved_data}
+"""
+            request_prompt += retrieved_prompt
+            estimated_tokens += estimate_tokens(retrieved_prompt)
+        request_prompt += analysis_request
+        
+        if input_budget is not None and estimated_tokens > input_budget:
+            logger.warning(f"プロンプトが入力トークン数の上限を超えています: 推定 {estimated_tokens} / 上限 {input_budget}")
         
-        return prompt
+        return [
+            text_block(prefix.reference_text, cache=True),
+            text_block(prefix.rule_text, cache=True),
+            text_block(request_prompt)
+        ], estimated_tokens
     
-    def _generate_ng_patterns(self) -> List[Dict[str, Any]]:
-        """NG表現のパターンを生成"""
-        try:
-            ng_data = self.data_service.load_ng_expressions()
-            if ng_data is None or ng_data.empty:
-                return []
-            
-            patterns = []
-            for _, row in ng_data.iterrows():
-                if '表現' in row and pd.notna(row['表現']):
-                    patterns.append({
-                        'pattern': row['表現'],
-                        'reason': row.get('理由', ''),
-                        'risk_level': row.get('リスクレベル', '中'),
-                        'alternative': row.get('代替表現', '')
-                    })
-            
-            logger.info(f"NG表現パターン生成完了: {len(patterns)}件")
-            return patterns
-            
-        except Exception as e:
-            logger.error(f"NG表現パターン生成エラー: {e}")
-            return []
+    def _create_retrieved_data(self, snapshot: DataSnapshot, bundle: PromptBundle, text: str, category: str,
+                               ng_issues: Optional[List[Dict[str, Any]]] = None,
+                               token_budget: Optional[int] = None) -> str:
+        """
+        チェック対象テキストに応じて検索した参考データを作成
+        
+        マニフェストで retrieval を指定した参考資料はチェック対象テキストに関連するセクションのみ、
+        NG表現データはローカルで検出したNG表現のみを含める
+        token_budget（推定トークン数）を超える場合は関連度の低いセクションから省略する
+        """
+        parts = []
+        
+        hits_text = None
+        if any(snapshot.retrieval.get(path) == RETRIEVAL_HITS for path in bundle.data_paths):
+            if ng_issues is None:
+                ng_issues = self._check_ng_expressions_in_text(text, category)
+            hit_lines = []
+            for issue in ng_issues:
+                line = f"- 「{issue['fragment']}」 リスク: {issue.get('risk_level', '中')} | 理由: {issue.get('reason', '')}"
+                if issue.get('suggestions'):
+                    line += f" | 代替表現: {'、'.join(issue['suggestions'])}"
+                hit_lines.append(line)
+            hit_text = "\n".join(hit_lines) or "NG表現データベースに該当する表現は検出されませんでした。"
+            hits_text = f"=== NG表現データベースで検出した表現 ===\n{hit_text}\n"
+            if token_budget is not None:
+                token_budget -= estimate_tokens(hits_text)
+        
+        if bundle.section_paths:
+            sections = snapshot.retrieve_sections(bundle, text, Config.PROMPT_RETRIEVAL_TOP_K)
+            section_texts = [section.format() for section in sections]
+            if token_budget is not None:
+                # 関連度の高い順に上限まで含める
+                fitted = []
+                for section_text in section_texts:
+                    section_tokens = estimate_tokens(section_text) + 1
+                    if section_tokens > token_budget:
+                        break
+                    fitted.append(section_text)
+                    token_budget -= section_tokens
+                if len(fitted) < len(section_texts):
+                    logger.info(f"関連する参考資料を入力トークン数の上限に合わせて省略: {len(section_texts)} → {len(fitted)}セクション")
+                section_texts = fitted
+            section_text = "\n\n".join(section_texts) or "該当する資料はありません。"
+            parts.append(f"=== 関連する参考資料（抜粋） ===\n{section_text}\n")
+        
+        if hits_text is not None:
+            parts.append(hits_text)
+        
+        return DATA_SEPARATOR.join(parts)
     
-    def _check_ng_expressions_in_text(self, text: str) -> List[Dict[str, Any]]:
-        """テキスト内のNG表現をチェック"""
-        issues = []
+    def _estimate_max_tokens(self, text: str, ng_issues: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        応答の推定の大きさに合わせた最大出力トークン数
         
+        リライト案はチェック対象テキストと同程度の長さになるため、長いテキストでは応答が途中で切れないよう大きくする
+        """
+        text_tokens = self.token_estimator.estimate(text)
+        issue_count = max(len(ng_issues or []), MIN_EXPECTED_ISSUES)
+        expected = (
+            OUTPUT_BASE_TOKENS
+            + REWRITE_COUNT * (text_tokens + REWRITE_EXPLANATION_TOKENS)
+            + issue_count * ISSUE_TOKENS
+        )
+        max_tokens = int(expected * OUTPUT_TOKEN_MARGIN)
+        if max_tokens > Config.CLAUDE_MAX_OUTPUT_TOKENS:
+            logger.warning(f"応答の推定トークン数が上限を超えています: 推定 {expected} / 上限 {Config.CLAUDE_MAX_OUTPUT_TOKENS}")
+        return min(max(max_tokens, Config.CLAUDE_MIN_OUTPUT_TOKENS), Config.CLAUDE_MAX_OUTPUT_TOKENS)
+    
+    def _check_ng_expressions_in_text(self, text: str, category: str = '', fuzzy: bool = None) -> List[Dict[str, Any]]:
+        """テキスト内のNG表現をチェック（fuzzy省略時は設定 NG_FUZZY_MATCHING に従う）"""
         try:
-            for pattern_info in self.ng_patterns:
-                pattern = pattern_info['pattern']
-                
-                # 正規表現として使用可能かチェック
-                try:
-                    matches = re.finditer(re.escape(pattern), text, re.IGNORECASE)
-                    for match in matches:
-                        issues.append({
-                            'fragment': match.group(),
-                            'reason': pattern_info['reason'],
-                            'risk_level': pattern_info['risk_level'],
-                            'suggestions': [pattern_info['alternative']] if pattern_info['alternative'] else [],
-                            'start': match.start(),
-                            'end': match.end()
-                        })
-                except re.error:
-                    # 正規表現エラーの場合は単純な文字列検索
-                    if pattern.lower() in text.lower():
-                        issues.append({
-                            'fragment': pattern,
-                            'reason': pattern_info['reason'],
-                            'risk_level': pattern_info['risk_level'],
-                            'suggestions': [pattern_info['alternative']] if pattern_info['alternative'] else []
-                        })
+            if fuzzy is None:
+                fuzzy = Config.NG_FUZZY_MATCHING
+            
+            issues = self._find_ng_issues(text, category, fuzzy)
             
             if issues:
                 logger.info(f"プリプロセシングで{len(issues)}件の問題を検出")
@@ -307,8 +436,119 @@ class YakkiChecker:
             logger.error(f"結果後処理エラー: {e}")
             return result
     
-    def _create_preprocessing_fallback_response(self, text: str, issues: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """プリプロセシング結果をベースにしたフォールバック応答"""
+    def quick_check(self, text: str, category: str = '', fuzzy: bool = False) -> Dict[str, Any]:
+        """
+        ローカルのNG表現スキャンのみを行う簡易チェック
+        
+        Claude API・プロンプト生成・チェック結果キャッシュを一切経由しないため、
+        高頻度の呼び出しでもLLMの処理枠を消費しない
+        
+        Args:
+            text: チェック対象テキスト
+            category: 商品カテゴリ（カテゴリ別のNG表現も検出。省略時は共通パターンのみ）
+            fuzzy: あいまい検出（記号・空白の挿入や軽微な改変の許容）を行うか
+        
+        Returns:
+            簡易チェック結果辞書（問題点・位置・リスク集計）
+        """
+        issues = self._find_ng_issues(text, category, fuzzy)
+        overall_risk, risk_counts = self._summarize_risks(issues)
+        
+        return {
+            "overall_risk": overall_risk,
+            "risk_counts": risk_counts,
+            "issues": issues,
+            "is_quick_check": True
+        }
+    
+    def _find_ng_issues(self, text: str, category: str, fuzzy: bool) -> List[Dict[str, Any]]:
+        """商品カテゴリに対応するマッチャーでNG表現を検出"""
+        ng_matchers = self.ng_matchers
+        matcher = ng_matchers.get(category)
+        if fuzzy:
+            # 完全一致に加え、記号・空白の挿入や軽微な改変を許容して検出
+            return find_issues_fuzzy(matcher, ng_matchers.get_fuzzy(category), text)
+        # コンパイル済みマッチャーで全パターンを1回の走査で検出
+        return matcher.find_issues(text)
+    
+    def start_quick_check_session(self, text: str, category: str = '') -> Dict[str, Any]:
+        """
+        逐次再走査用の簡易チェックセッションを開始
+        
+        Args:
+            text: 編集開始時点の全文
+            category: 商品カテゴリ（セッション中は同じカテゴリのマッチャーを使用）
+        
+        Returns:
+            簡易チェック結果辞書（session_id を含む）
+        """
+        snapshot = self.data_service.snapshot
+        matcher = snapshot.ng_matchers.get(category)
+        hits = matcher.scan(text)
+        session_id = self.scan_sessions.create(text, hits, category, snapshot.version)
+        
+        result = self._create_session_result(text, hits, matcher)
+        result['session_id'] = session_id
+        result['scanned_chars'] = len(text)
+        return result
+    
+    def update_quick_check_session(self, session_id: str, edits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        編集差分を適用し、影響範囲のみを再走査
+        
+        Args:
+            session_id: start_quick_check_session で発行されたセッションID
+            edits: 順に適用する編集差分（offset, delete, insert）のリスト
+        
+        Returns:
+            簡易チェック結果辞書（セッションが存在しない場合はNone）
+        
+        Raises:
+            ValueError: 編集範囲がテキストの範囲外の場合
+        """
+        session = self.scan_sessions.get(session_id)
+        if session is None:
+            return None
+        
+        text, hits, category, data_version = session
+        snapshot = self.data_service.snapshot
+        matcher = snapshot.ng_matchers.get(category)
+        scanned_chars = 0
+        if data_version != snapshot.version:
+            # セッション開始後にNG表現データが更新された場合は、新しいマッチャーで全文を走査し直す
+            hits = matcher.scan(text)
+            scanned_chars = len(text)
+        for edit in edits:
+            text, hits, scanned = matcher.rescan_edit(
+                text, hits,
+                int(edit.get('offset', 0)),
+                int(edit.get('delete', 0)),
+                str(edit.get('insert', ''))
+            )
+            scanned_chars += scanned
+        
+        self.scan_sessions.set(session_id, text, hits, category, snapshot.version)
+        
+        result = self._create_session_result(text, hits, matcher)
+        result['session_id'] = session_id
+        result['scanned_chars'] = scanned_chars
+        return result
+    
+    def _create_session_result(self, text: str, hits: List[Tuple[int, int, int]], matcher: NGMatcher) -> Dict[str, Any]:
+        """セッションの検出結果（matcher で走査したもの）から簡易チェック結果を作成"""
+        issues = matcher.issues_from_hits(text, select_longest(hits))
+        overall_risk, risk_counts = self._summarize_risks(issues)
+        
+        return {
+            "overall_risk": overall_risk,
+            "risk_counts": risk_counts,
+            "issues": issues,
+            "text_length": len(text),
+            "is_quick_check": True
+        }
+    
+    def _summarize_risks(self, issues: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+        """問題点リストから総合リスクとリスク別件数を集計"""
         risk_counts = {'high': 0, 'medium': 0, 'low': 0}
         
         for issue in issues:
@@ -328,14 +568,20 @@ class YakkiChecker:
         else:
             overall_risk = '低'
         
+        return overall_risk, {
+            "total": len(issues),
+            "high": risk_counts['high'],
+            "medium": risk_counts['medium'],
+            "low": risk_counts['low']
+        }
+    
+    def _create_preprocessing_fallback_response(self, text: str, issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """プリプロセシング結果をベースにしたフォールバック応答"""
+        overall_risk, risk_counts = self._summarize_risks(issues)
+        
         return {
             "overall_risk": overall_risk,
-            "risk_counts": {
-                "total": len(issues),
-                "high": risk_counts['high'],
-                "medium": risk_counts['medium'],
-                "low": risk_counts['low']
-            },
+            "risk_counts": risk_counts,
             "issues": issues,
             "rewritten_texts": {
                 "conservative": {
@@ -393,5 +639,7 @@ class YakkiChecker:
                 'max_size': self.check_cache.max_size
             },
             'data_service': self.data_service.get_cache_status(),
-            'claude_service_available': self.claude_service.is_available()
+            'claude_service_available': self.claude_service.is_available(),
+            'claude_usage': self.claude_service.get_usage_stats(),
+            'token_estimator': self.token_estimator.get_status()
         }
\ No newline at end of file
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一括チェックCLIのテストスクリプト
+CSVを入力してワーカープロセスでチェックし、全件の結果が書き出されるかを確認
+"""
+
+import sys
+import os
+import csv
+import json
+import tempfile
+
+# app.pyがあるディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_check
+
+TEST_ROWS = [
+    {'広告ID': 'A1', '本文': 'このクリームで美白、シミが消える'},
+    {'広告ID': 'A2', '本文': 'お肌にうるおいを与えます'},
+    {'広告ID': 'A3', '本文': 'むくみが治る'},
+    {'広告ID': 'A4', '本文': ''},
+]
+
+
+def _failing_chunk(records):
+    """A3を含むチャンクのみ失敗するチェック処理"""
+    if any(record['id'] == 'A3' for record in records):
+        raise RuntimeError('テスト用のエラー')
+    return batch_check._check_chunk_original(records)
+
+
+def run_batch(directory, extra_args=()):
+    """テスト用CSVを一括チェックし、JSONLの結果を返す"""
+    input_path = os.path.join(directory, 'ads.csv')
+    output_path = os.path.join(directory, 'results.jsonl')
+    with open(input_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['広告ID', '本文'])
+        writer.writeheader()
+        writer.writerows(TEST_ROWS)
+
+    args = batch_check.parse_args([
+        input_path, '-o', output_path, '--text-column', '本文', '--id-column', '広告ID',
+        '--category', '化粧品', '--workers', '1', *extra_args
+    ])
+    processed = batch_check.run(args)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        results = [json.loads(line) for line in f]
+    return processed, results
+
+
+def test_batch_run():
+    """最後の行のテキストが空のCSVも全件チェックできるかのテスト"""
+    with tempfile.TemporaryDirectory() as directory:
+        processed, results = run_batch(directory)
+
+    assert processed == len(TEST_ROWS)
+    assert [result['id'] for result in results] == [row['広告ID'] for row in TEST_ROWS]
+    assert all(result['source'] == 'local' for result in results)
+    assert results[-1]['issues'] == [] and results[-1]['overall_risk'] == '低'
+    print(f"\n一括チェック: {[(result['id'], result['overall_risk']) for result in results]}")
+
+
+def test_batch_chunk_failure():
+    """チェックに失敗したチャンクがあっても処理を続け、失敗したレコードを error として書き出すかのテスト"""
+    if batch_check.multiprocessing.get_start_method() != 'fork':
+        # spawn で起動するワーカーには差し替えたチェック処理が引き継がれない
+        print("forkでワーカーを起動できないためチャンク失敗テストをスキップ")
+        return
+
+    batch_check._check_chunk_original = batch_check._check_chunk
+    batch_check._check_chunk = _failing_chunk
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            processed, results = run_batch(directory, ['--chunk-size', '2'])
+    finally:
+        batch_check._check_chunk = batch_check._check_chunk_original
+        del batch_check._check_chunk_original
+
+    assert processed == len(TEST_ROWS)
+    assert [result['id'] for result in results] == [row['広告ID'] for row in TEST_ROWS]
+    assert [result['source'] for result in results] == ['local', 'local', 'error', 'error']
+    assert all('テスト用のエラー' in result['error'] for result in results[2:])
+
+
+class StubClaudeChecker:
+    """_call_claude_api_check の代わりに、テキストごとに決めた結果を返すスタブ"""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def _call_claude_api_check(self, text, text_type, category, special_points, medical_approval):
+        return self.responses[text]
+
+
+def test_claude_fallback_error():
+    """Claude APIのフォールバック応答（APIエラー）を低リスクとせず、error として扱うかのテスト"""
+    texts = ['うるおいを与えます', 'お肌を守ります']
+    fallback = {'overall_risk': '不明', 'issues': [], 'error': 'API呼び出しエラー: timeout', 'is_fallback': True}
+    checked = {'overall_risk': '中', 'issues': [{'fragment': '守ります', 'risk_level': '中'}]}
+    claude = batch_check.ClaudeFallback(StubClaudeChecker({texts[0]: fallback, texts[1]: checked}), 'キャッチコピー', 2)
+    local = [
+        {'id': index, 'category': '化粧品', **batch_check._summarize([]), 'issues': [], 'source': 'local'}
+        for index in range(len(texts))
+    ]
+    try:
+        results = claude.check(local, texts)
+    finally:
+        claude.close()
+
+    assert results[0]['source'] == 'error' and results[0]['overall_risk'] == ''
+    assert 'timeout' in results[0]['error']
+    assert results[1]['source'] == 'claude' and results[1]['overall_risk'] == '中'
+
+
+if __name__ == "__main__":
+    test_batch_run()
+    test_batch_chunk_failure()
+    test_claude_fallback_error()
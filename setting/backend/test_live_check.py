@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ライブチェックのテストスクリプト
+WebSocketの代わりにメッセージを直接渡し、文字数上限・デバウンス・古い世代の詳細チェック結果の破棄を確認
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+
+# app.pyがあるディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from services.live_check import LiveCheckSession, acquire_connection, release_connection
+from services.yakki_checker import YakkiChecker
+
+IDLE_SECONDS = 0.05
+OPTIONS = {'category': '化粧品', 'text_type': 'キャッチコピー'}
+
+yakki_checker = YakkiChecker()
+
+
+class StubFullCheck:
+    """check_text の代わりに呼び出しを記録し、release() まで結果を返さない詳細チェック"""
+
+    def __init__(self, blocking=False):
+        self.calls = []
+        self.started = threading.Event()
+        self.released = threading.Event()
+        if not blocking:
+            self.released.set()
+
+    def __call__(self, text, **kwargs):
+        self.calls.append(text)
+        self.started.set()
+        self.released.wait(5)
+        return {'overall_risk': '低', 'issues': [], 'text': text}
+
+    def release(self):
+        self.released.set()
+
+
+def create_session(full_check):
+    # 詳細チェック（Claude API）のみスタブに置き換え、ローカルチェックはそのまま使う
+    yakki_checker.check_text = full_check
+    return LiveCheckSession(yakki_checker, idle_seconds=IDLE_SECONDS)
+
+
+def send(session, **message):
+    return session.handle_message(json.dumps(message, ensure_ascii=False))
+
+
+def poll_until(session, message_type, timeout=2.0):
+    """指定した種類のメッセージが届くまでpoll()し、それまでに届いたメッセージを返す"""
+    messages = []
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        messages.extend(session.poll())
+        if any(message['type'] == message_type for message in messages):
+            return messages
+        time.sleep(0.01)
+    raise AssertionError(f"{message_type} が届きませんでした: {messages}")
+
+
+def test_live_check_length_limit():
+    """text・edit のどちらでも QUICK_CHECK_MAX_LENGTH を超えるテキストを走査せずにエラーを返すかのテスト"""
+    session = create_session(StubFullCheck())
+    original = Config.QUICK_CHECK_MAX_LENGTH
+    Config.QUICK_CHECK_MAX_LENGTH = 20
+    try:
+        [error] = send(session, type='text', text='あ' * 21, **OPTIONS)
+        assert error['type'] == 'error' and 'too long' in error['message']
+        assert session.scan_session_id is None and session.text == ''
+
+        [quick] = send(session, type='text', text='あ' * 20)
+        assert quick['type'] == 'quick'
+        session_id = session.scan_session_id
+
+        [error] = send(session, type='edit', edits=[{'offset': 20, 'delete': 0, 'insert': 'い'}])
+        assert error['type'] == 'error' and 'too long' in error['message']
+        assert session.scan_session_id is None and session.text == ''
+        assert yakki_checker.scan_sessions.get(session_id) is None
+        # 上限を超えたテキストの詳細チェックは行わない
+        assert session.next_timeout() is None
+
+        # 削除を含めて上限内に収まる編集は受け付ける
+        send(session, type='text', text='あ' * 20)
+        [quick] = send(session, type='edit', edits=[{'offset': 0, 'delete': 5, 'insert': 'い' * 5}])
+        assert quick['type'] == 'quick' and session.text == 'い' * 5 + 'あ' * 15
+
+        [error] = send(session, type='edit', edits='invalid')
+        assert error['type'] == 'error' and 'Invalid edit' in error['message']
+    finally:
+        Config.QUICK_CHECK_MAX_LENGTH = original
+        session.close()
+
+
+def test_live_check_debounce():
+    """入力が止まってから1回だけ、最後のテキストで詳細チェックを行うかのテスト"""
+    full_check = StubFullCheck()
+    session = create_session(full_check)
+    try:
+        for text in ('シミが', 'シミが消える', 'シミが消えるクリーム'):
+            [quick] = send(session, type='text', text=text, **OPTIONS)
+            assert quick['type'] == 'quick'
+            # 待機時間が経過するまでは詳細チェックを始めない
+            assert session.poll() == []
+
+        messages = poll_until(session, 'full')
+        assert [message['type'] for message in messages] == ['status', 'full']
+        assert full_check.calls == ['シミが消えるクリーム']
+        assert messages[-1]['generation'] == session.generation
+        assert session.next_timeout() is None
+    finally:
+        session.close()
+
+
+def test_live_check_stale_generation():
+    """詳細チェック中に入力が更新された場合、古い世代の結果を送らないかのテスト"""
+    full_check = StubFullCheck(blocking=True)
+    session = create_session(full_check)
+    try:
+        send(session, type='text', text='シミが消える', **OPTIONS)
+        [status] = poll_until(session, 'status')
+        stale_generation = status['generation']
+        assert full_check.started.wait(2)
+
+        # 詳細チェックの実行中に編集が届く（実行中のものは取り消せないため結果を破棄する）
+        send(session, type='edit', edits=[{'offset': 6, 'delete': 0, 'insert': 'クリーム'}])
+        full_check.release()
+
+        messages = poll_until(session, 'full')
+        full_results = [message for message in messages if message['type'] == 'full']
+        assert all(message['generation'] != stale_generation for message in messages)
+        assert len(full_results) == 1 and full_results[0]['text'] == 'シミが消えるクリーム'
+        assert full_check.calls == ['シミが消える', 'シミが消えるクリーム']
+    finally:
+        session.close()
+
+
+def test_live_check_connection_limit():
+    """LIVE_CHECK_MAX_CONNECTIONS を超える接続は枠を確保できず、解放後は再び確保できるかのテスト"""
+    original = Config.LIVE_CHECK_MAX_CONNECTIONS
+    Config.LIVE_CHECK_MAX_CONNECTIONS = 2
+    acquired = 0
+    try:
+        for _ in range(2):
+            assert acquire_connection()
+            acquired += 1
+        assert not acquire_connection()
+
+        release_connection()
+        acquired -= 1
+        assert acquire_connection()
+        acquired += 1
+        assert not acquire_connection()
+    finally:
+        for _ in range(acquired):
+            release_connection()
+        Config.LIVE_CHECK_MAX_CONNECTIONS = original
+
+
+if __name__ == "__main__":
+    test_live_check_length_limit()
+    test_live_check_debounce()
+    test_live_check_stale_generation()
+    test_live_check_connection_limit()
@@ -8,11 +8,47 @@ NG表現検出機能のテストスクリプト
 import sys
 import os
 import json
+import logging
+import random
+import tempfile
+from types import SimpleNamespace
 
 # app.pyがあるディレクトリをパスに追加
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import check_ng_expressions_in_text, generate_ng_patterns
+from utils.conjugation import expand_conjugations
+from utils.ng_matcher import NGMatcher
+from utils.fuzzy_matcher import FuzzyNGMatcher, find_issues_fuzzy
+from utils.bulk_scanner import BulkNGScanner, NUMPY_AVAILABLE
+from utils.category_matchers import CategoryNGMatchers
+from utils.compiled_matcher import save_compiled_matchers, load_compiled_matchers
+from utils.ng_matcher import build_pattern_bundle
+
+# ng_expressions.csv 相当のテスト用NG表現（「活用」列で語幹展開を指定）
+TEST_NG_ROWS = [
+    {'pattern': 'むくむ', 'conjugation': '五段', 'reason': '医薬品的な効能効果', 'risk_level': '高', 'alternative': 'すっきりとした印象に'},
+    {'pattern': '浮腫む', 'conjugation': '五段', 'reason': '医薬品的な効能効果', 'risk_level': '高', 'alternative': 'すっきりとした印象に'},
+    {'pattern': 'たるむ', 'conjugation': '五段', 'reason': '化粧品の効能範囲外', 'risk_level': '高', 'alternative': 'ハリを与える'},
+    {'pattern': 'パンパン', 'reason': '身体の異常状態の示唆', 'risk_level': '中', 'alternative': ''},
+    {'pattern': '治る', 'conjugation': '五段', 'reason': '治療効果の標ぼう', 'risk_level': '高', 'alternative': 'お手入れ'},
+    {'pattern': '改善する', 'conjugation': 'サ変', 'reason': '医薬品的な効能効果', 'risk_level': '高', 'alternative': '整える'},
+    {'pattern': 'アンチエイジング', 'reason': '老化防止効果の標ぼう', 'risk_level': '高', 'alternative': 'エイジングケア'},
+    {'pattern': '美白', 'reason': '薬用化粧品以外では使用不可', 'risk_level': '中', 'alternative': '透明感'},
+]
+
+ng_matcher = NGMatcher(TEST_NG_ROWS)
+fuzzy_matcher = FuzzyNGMatcher(ng_matcher)
+
+def check_ng_expressions_in_text(text):
+    """テスト用マッチャーでNG表現を検出"""
+    return ng_matcher.find_issues(text)
+
+def generate_ng_patterns():
+    """語幹ごとの展開済みパターンを生成"""
+    return {
+        row['pattern']: expand_conjugations(row['pattern'], row.get('conjugation', ''))
+        for row in TEST_NG_ROWS
+    }
 
 def test_ng_detection():
     """NG表現検出テスト"""
@@ -49,6 +85,11 @@ def test_ng_detection():
             "text": "むくみもたるみも改善！アンチエイジング効果で美白も実現",
             "expected_keywords": ["むくみ", "たるみ", "改善", "アンチエイジング", "美白"]
         },
+        {
+            "name": "治るの活用形テスト",
+            "text": "肌荒れが治って、半角のｱﾝﾁｴｲｼﾞﾝｸﾞも検出",
+            "expected_keywords": ["治って", "ｱﾝﾁｴｲｼﾞﾝｸﾞ"]
+        },
         {
             "name": "NGワードなしテスト",
             "text": "お肌にうるおいを与え、ハリのある肌へ導きます",
@@ -81,57 +122,28 @@ def test_ng_detection():
         detected_issues = check_ng_expressions_in_text(test_case['text'])
         
         # 検出されたNG表現を抽出
-        detected_words = []
-        for issue in detected_issues:
-            fragment = issue['fragment']
-            # fragmentから実際のNG表現を抽出（簡易的な方法）
-            for pattern_list in patterns.values():
-                for pattern in pattern_list:
-                    if pattern in fragment:
-                        detected_words.append(pattern)
-                        break
-        
-        # 重複を除去
-        detected_words = list(set(detected_words))
+        detected_words = [issue['fragment'] for issue in detected_issues]
         
         print(f"  期待: {test_case['expected_keywords']}")
         print(f"  検出: {detected_words}")
         print(f"  検出数: {len(detected_issues)}件")
         
         # 結果の検証
-        if test_case['expected_keywords']:
-            # NG表現が期待されるケース
-            if len(detected_issues) > 0:
-                expected_found = all(
-                    any(keyword in str(issue) for issue in detected_issues) 
-                    for keyword in test_case['expected_keywords']
-                )
-                if expected_found:
-                    print("  結果: ✅ 成功 - 期待されるNG表現を検出")
-                    success_count += 1
-                else:
-                    print("  結果: ⚠️  一部成功 - 一部のNG表現のみ検出")
-                    success_count += 1
-            else:
-                print("  結果: ❌ 失敗 - NG表現を検出できませんでした")
-                fail_count += 1
+        if set(test_case['expected_keywords']) == set(detected_words):
+            print("  結果: ✅ 成功 - 期待通りのNG表現を検出")
+            success_count += 1
         else:
-            # NG表現がないことが期待されるケース
-            if len(detected_issues) == 0:
-                print("  結果: ✅ 成功 - NG表現なし（期待通り）")
-                success_count += 1
-            else:
-                print("  結果: ❌ 失敗 - 誤検出がありました")
-                fail_count += 1
+            print("  結果: ❌ 失敗 - 検出結果が期待と異なります")
+            fail_count += 1
         
         # 詳細表示
         if detected_issues:
             print("\n  【検出された問題の詳細】")
             for j, issue in enumerate(detected_issues, 1):
                 print(f"    {j}. フラグメント: 「{issue['fragment']}」")
+                print(f"       位置: {issue['start']}-{issue['end']}")
                 print(f"       リスクレベル: {issue['risk_level']}")
-                print(f"       カテゴリ: {issue['category']}")
-                if issue['suggestions'][0]:
+                if issue['suggestions']:
                     print(f"       代替案: {issue['suggestions'][0]}")
     
     # 総合結果
@@ -147,6 +159,306 @@ def test_ng_detection():
         print("\n✅ すべてのテストに成功しました！")
     else:
         print(f"\n⚠️  {fail_count}件のテストが失敗しました。")
+    
+    assert fail_count == 0
+
+def test_fuzzy_ng_detection():
+    """記号・空白の挿入や軽微な改変を含むNG表現のあいまい検出テスト"""
+    test_cases = [
+        ("記号挿入", "むく・んだお顔に", [("むく・んだ", 'fuzzy')]),
+        ("空白挿入", "ア ン チエイジング効果", [("ア ン チエイジング", 'fuzzy')]),
+        ("1文字置換", "アンチエイジソグ効果", [("アンチエイジソグ", 'fuzzy')]),
+        ("完全一致優先", "アンチエイジングで美白", [("アンチエイジング", 'exact'), ("美白", 'exact')]),
+        ("完全一致の間", "美白、ア ン チエイジング、美白、むく・んだ", [
+            ("美白", 'exact'), ("ア ン チエイジング", 'fuzzy'), ("美白", 'exact'), ("むく・んだ", 'fuzzy')
+        ]),
+        ("文をまたがない", "美。白い肌へ", []),
+        ("短い語は改変を許容しない", "美肌を実現", []),
+    ]
+    
+    print("\n" + "="*60)
+    print("あいまい検出テスト")
+    print("="*60)
+    
+    fail_count = 0
+    for name, text, expected in test_cases:
+        detected = [(issue['fragment'], issue['match_type']) for issue in find_issues_fuzzy(ng_matcher, fuzzy_matcher, text)]
+        ok = detected == expected
+        print(f"  {'✅' if ok else '❌'} {name}: {text} -> {detected}")
+        if not ok:
+            fail_count += 1
+    
+    assert fail_count == 0
+
+def test_pattern_syntax_detection():
+    """パターン記法（選択・省略・間隔）の検出テスト"""
+    matcher = NGMatcher([
+        {'pattern': '効(く|きます)', 'syntax': 'パターン', 'reason': '医薬品的な効能効果', 'risk_level': '高'},
+        {'pattern': 'シミ.{0,3}消', 'syntax': 'パターン', 'reason': '化粧品の効能範囲外', 'risk_level': '高'},
+        {'pattern': 'シミ(が)?(消|薄)', 'syntax': 'パターン', 'reason': '化粧品の効能範囲外', 'risk_level': '高'},
+        {'pattern': '効(く', 'syntax': 'パターン', 'reason': '構文エラー（除外される）'},
+    ])
+    test_cases = [
+        ("選択", "肩こりによく効きます", ["効きます"]),
+        ("間隔", "シミがすっと消える", []),
+        ("間隔（上限内）", "シミがすぐ消える", ["シミがすぐ消"]),
+        ("省略可能", "ｼﾐ薄くなる", ["ｼﾐ薄"]),
+    ]
+    
+    print("\n" + "="*60)
+    print("パターン記法テスト")
+    print("="*60)
+    
+    fail_count = 0
+    for name, text, expected in test_cases:
+        detected = [issue['fragment'] for issue in matcher.find_issues(text)]
+        ok = detected == expected
+        print(f"  {'✅' if ok else '❌'} {name}: {text} -> {detected}")
+        if not ok:
+            fail_count += 1
+    
+    assert fail_count == 0
+
+def test_duplicate_patterns():
+    """同じNG表現の行は先の行にまとめ、内容の異なる行を除外したことを警告するかのテスト"""
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    matcher_logger = logging.getLogger('utils.ng_matcher')
+    matcher_logger.addHandler(handler)
+    # 同じ重複の警告はプロセスで1回のため、既に警告済みの記録を消してから構築する
+    sys.modules['utils.ng_matcher']._reported_duplicates.clear()
+    try:
+        matcher = NGMatcher([
+            {'pattern': '美白', 'reason': '薬用化粧品以外では使用不可', 'risk_level': '中', 'alternative': '透明感'},
+            {'pattern': 'ビハク', 'reason': '薬用化粧品以外では使用不可', 'risk_level': '中', 'alternative': '透明感'},
+            {'pattern': '美白', 'reason': '医薬品的な効能効果', 'risk_level': '高', 'alternative': 'くすみのない印象'},
+        ])
+    finally:
+        matcher_logger.removeHandler(handler)
+    
+    # 先の行の内容で検出する
+    issues = matcher.find_issues("美白クリーム")
+    assert [(issue['fragment'], issue['reason']) for issue in issues] == [('美白', '薬用化粧品以外では使用不可')]
+    assert len(matcher.patterns) == 2
+    
+    # 内容の異なる行を除外した場合のみ警告する
+    warnings = [record.getMessage() for record in records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert '医薬品的な効能効果' in warnings[0] and '薬用化粧品以外では使用不可' in warnings[0]
+
+def test_bulk_scan():
+    """一括スキャンの結果が1件ずつの検出結果と一致するかのテスト"""
+    if not NUMPY_AVAILABLE:
+        print("numpyが利用できないため一括スキャンテストをスキップ")
+        return
+    
+    texts = [
+        "むくんだお顔もスッキリ",
+        "お肌にうるおいを与えます",
+        "",
+        "半角のｱﾝﾁｴｲｼﾞﾝｸﾞと美白",
+        "絵文字😀付きで治って",
+        "パンパンパンパン",
+    ] * 50
+    expected = sorted(
+        (text_id, pattern_id, start, end)
+        for text_id, text in enumerate(texts)
+        for start, end, pattern_id in ng_matcher.find_all(text)
+    )
+    
+    scanner = BulkNGScanner(ng_matcher)
+    hits = scanner.scan(texts)
+    detected = sorted(tuple(row) for row in hits.tolist())
+    print(f"\n一括スキャン: {len(texts)}件中 {len(set(hits['text_id'].tolist()))}件で{len(hits)}件検出")
+    
+    assert detected == expected
+    
+    # 先頭・末尾が空のテキスト、空のテキストのみの場合
+    for edge_texts in (['美白です', ''], ['', '美白です'], ['', '美白です', '', ''], [''], ['', ''], []):
+        expected = sorted(
+            (text_id, pattern_id, start, end)
+            for text_id, text in enumerate(edge_texts)
+            for start, end, pattern_id in ng_matcher.find_all(text)
+        )
+        assert sorted(tuple(row) for row in scanner.scan(edge_texts).tolist()) == expected
+
+def test_compiled_matcher_file():
+    """保存したコンパイル済みマッチャーをmmapで読み込んだ検出結果が一致するかのテスト"""
+    rows = TEST_NG_ROWS + [
+        {'pattern': 'シミ.{0,5}消える', 'syntax': 'パターン', 'reason': '医薬品的な効能効果', 'risk_level': '高',
+         'categories': ('化粧品',)},
+    ]
+    matchers = CategoryNGMatchers(rows)
+    bundle = build_pattern_bundle(*matchers.all_matchers())
+    texts = [
+        "むくんだお顔もパンパン",
+        "半角のｱﾝﾁｴｲｼﾞﾝｸﾞと美白",
+        "シミがみるみる消える、治ります",
+    ]
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ng_matchers.bin')
+        save_compiled_matchers(path, matchers, 'source', bundle)
+        assert load_compiled_matchers(path, 'changed') is None
+        
+        mapped, mapped_bundle = load_compiled_matchers(path, 'source')
+        assert mapped_bundle == bundle
+        for category in ('', '化粧品'):
+            for text in texts:
+                assert mapped.get(category).find_issues(text) == matchers.get(category).find_issues(text)
+        print(f"\nコンパイル済みファイル: {os.path.getsize(path)}バイト, カテゴリ {mapped.categories}")
+
+def test_compiled_matcher_cleanup():
+    """データ更新時に削除する古いコンパイル済みファイルが、自分の保存したものに限られるかのテスト"""
+    from config import Config
+    from services.data_service import DataService
+    
+    original = Config.NG_MATCHER_CACHE_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        Config.NG_MATCHER_CACHE_DIR = directory
+        try:
+            # 同じディレクトリを使う他のデプロイ・ワーカーのファイル
+            other_path = os.path.join(directory, 'ng_matchers-0000000000000000.bin')
+            with open(other_path, 'wb') as f:
+                f.write(b'other')
+            
+            data_service = DataService(use_snapshot=False, auto_reload=False)
+            _, _, first_path = data_service._compile_ng_matchers(TEST_NG_ROWS[:4])
+            _, _, second_path = data_service._compile_ng_matchers(TEST_NG_ROWS)
+        finally:
+            Config.NG_MATCHER_CACHE_DIR = original
+        
+        assert first_path != second_path
+        assert not os.path.exists(first_path)
+        assert os.path.exists(second_path)
+        assert os.path.exists(other_path)
+
+def test_rescan_edit():
+    """編集差分による逐次再走査の結果が全文の再走査と一致するかのランダムテスト"""
+    matcher = NGMatcher(TEST_NG_ROWS + [
+        {'pattern': 'シミ.{0,5}消える', 'syntax': 'パターン', 'reason': '医薬品的な効能効果', 'risk_level': '高'},
+        {'pattern': '効(く|きます)', 'syntax': 'パターン', 'reason': '医薬品的な効能効果', 'risk_level': '高'},
+        {'pattern': 'ピカピカ', 'reason': '誇大な表現', 'risk_level': '低'},
+    ])
+    # NG表現の断片・半角カナ（直後の濁点で前の文字の正規化が変わる）・記号を組み合わせて編集する
+    pieces = ['ﾋﾟｶ', 'ﾋ', 'ｶ', 'むく', 'んだ', 'パン', 'ﾊﾟﾝ', 'ﾞ', 'シミ', 'が', 'すっと', '消える', '消', '治', 'り', '美白', '効', 'く',
+              'きます', 'ｱﾝﾁｴｲｼﾞﾝｸﾞ', 'アンチ', 'エイジング', '改善', 'し', '、', ' ', 'あ']
+    # (編集前のテキスト, offset, delete, insert)
+    cases = [
+        ("ﾋﾟｶﾋﾟｶ", 6, 0, "ﾞ"),              # 直後の濁点で検出箇所の末尾の文字が変わる
+        ("ﾋﾟｶﾋﾟｶﾞ", 6, 1, ""),              # 濁点を削除して検出される
+        ("シミがすっと消える", 3, 2, ""),    # 間隔パターンの上限内になる
+        ("シミがすぐ消える", 3, 0, "とても"),  # 間隔パターンの上限を超える
+        ("美白", 0, 0, "美白と"),            # 先頭への挿入
+        ("むくんだ", 4, 0, "美白"),          # 末尾への追加
+        ("美白", 0, 2, ""),                  # 全文の削除
+        ("", 0, 0, "治ります"),              # 空のテキストへの挿入
+    ]
+    for text, offset, delete, insert in cases:
+        new_text, new_hits, _ = matcher.rescan_edit(text, matcher.scan(text), offset, delete, insert)
+        assert new_hits == sorted(matcher.scan(new_text)), (text, offset, delete, insert)
+
+    rng = random.Random(20240601)
+
+    text = ''
+    hits = matcher.scan(text)
+    for trial in range(5000):
+        if trial % 500 == 0:
+            # 定期的に長いテキストから始め直す
+            text = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+            hits = matcher.scan(text)
+
+        # テキストの先頭・末尾の編集を多めに含める
+        offset = rng.choice([0, len(text), rng.randint(0, len(text))])
+        delete = rng.choice([0, len(text) - offset, rng.randint(0, min(6, len(text) - offset))])
+        insert = ''.join(rng.choice(pieces) for _ in range(rng.choice([0, 0, 1, 2, 3])))
+
+        new_text, new_hits, scanned = matcher.rescan_edit(text, hits, offset, delete, insert)
+        assert new_text == text[:offset] + insert + text[offset + delete:]
+        assert new_hits == sorted(matcher.scan(new_text)), (text, offset, delete, insert)
+        assert scanned <= len(new_text)
+        text, hits = new_text, new_hits
+
+    for offset, delete in ((-1, 0), (0, -1), (len(text), 1)):
+        try:
+            matcher.rescan_edit(text, hits, offset, delete, '')
+            raise AssertionError(f"範囲外の編集が受け付けられました: offset={offset}, delete={delete}")
+        except ValueError:
+            pass
+
+def test_quick_check_session_routes():
+    """逐次再走査用の簡易チェックセッションAPIの結果が全文の簡易チェックと一致するかのテスト"""
+    from flask import Flask
+    from config import Config
+    from routes.api_routes import api_bp, yakki_checker
+    
+    data_service = yakki_checker.data_service
+    original_snapshot, original_keys = data_service._snapshot, Config.VALID_API_KEYS
+    # テスト用のNG表現で照合する（APIキー認証は無効にする）
+    data_service._snapshot = SimpleNamespace(ng_matchers=CategoryNGMatchers(TEST_NG_ROWS), version='test')
+    Config.VALID_API_KEYS = []
+    try:
+        app = Flask(__name__)
+        app.register_blueprint(api_bp)
+        client = app.test_client()
+        text = "むくんだお顔もスッキリ"
+        response = client.post('/api/quick-check/session', json={'text': text, 'category': '化粧品'})
+        assert response.status_code == 200
+        result = response.get_json()
+        session_id = result['session_id']
+        assert result['issues'] == yakki_checker.quick_check(text, '化粧品')['issues']
+        
+        edits = [
+            {'offset': len(text), 'delete': 0, 'insert': '、美白で治ります'},
+            {'offset': 0, 'delete': 4, 'insert': 'パンパンの'},
+        ]
+        for edit in edits:
+            text = text[:edit['offset']] + edit['insert'] + text[edit['offset'] + edit['delete']:]
+            response = client.post(f'/api/quick-check/session/{session_id}', json=edit)
+            assert response.status_code == 200
+            result = response.get_json()
+            assert result['text_length'] == len(text)
+            assert result['scanned_chars'] <= len(text)
+            assert result['issues'] == yakki_checker.quick_check(text, '化粧品')['issues']
+        assert [issue['fragment'] for issue in result['issues']] == ['パンパン', '美白', '治り']
+        
+        # 複数の編集差分をまとめて送る
+        response = client.post(f'/api/quick-check/session/{session_id}', json={'edits': [
+            {'offset': 0, 'delete': 5, 'insert': ''},
+            {'offset': 0, 'delete': 0, 'insert': 'たるんだ'},
+        ]})
+        text = 'たるんだ' + text[5:]
+        assert response.get_json()['issues'] == yakki_checker.quick_check(text, '化粧品')['issues']
+        
+        response = client.post(f'/api/quick-check/session/{session_id}', json={'offset': len(text) + 1, 'delete': 0})
+        assert response.status_code == 400
+        response = client.post('/api/quick-check/session/unknown', json={'offset': 0, 'insert': 'a'})
+        assert response.status_code == 404
+        
+        original_length = Config.QUICK_CHECK_MAX_LENGTH
+        Config.QUICK_CHECK_MAX_LENGTH = len(text)
+        # 文字数上限を超える編集は適用・再走査しない
+        yakki_checker.update_quick_check_session = None
+        try:
+            response = client.post(f'/api/quick-check/session/{session_id}', json={'offset': 0, 'insert': 'a' * 100})
+            assert response.status_code == 400
+            assert 'too long' in response.get_json()['error']
+        finally:
+            Config.QUICK_CHECK_MAX_LENGTH = original_length
+            del yakki_checker.update_quick_check_session
+        # 文字数上限を超えたセッションは削除される
+        assert yakki_checker.scan_sessions.get(session_id) is None
+    finally:
+        data_service._snapshot, Config.VALID_API_KEYS = original_snapshot, original_keys
 
 if __name__ == "__main__":
-    test_ng_detection()
\ No newline at end of file
+    test_ng_detection()
+    test_fuzzy_ng_detection()
+    test_pattern_syntax_detection()
+    test_duplicate_patterns()
+    test_bulk_scan()
+    test_compiled_matcher_file()
+    test_compiled_matcher_cleanup()
+    test_rescan_edit()
+    test_quick_check_session_routes()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プロンプトキャッシュのテストスクリプト
+Claude APIの代わりにスタブのクライアントを使い、送信するリクエストの構成とトークン数の記録、
+入力トークン数の上限に合わせた参考データの省略を確認
+"""
+
+import sys
+import os
+import json
+import tempfile
+from types import SimpleNamespace
+
+# app.pyがあるディレクトリをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from models.data_models import NGExpressionTable
+from services.claude_service import ClaudeService, CACHE_CONTROL
+from services.data_snapshot import TRIMMED_DATA_NOTE
+from services.yakki_checker import YakkiChecker
+
+STUB_RESPONSE = {
+    "overall_risk": "低",
+    "risk_counts": {"total": 0, "high": 0, "medium": 0, "low": 0},
+    "issues": [],
+    "rewritten_texts": {
+        "conservative": {"text": "", "explanation": ""},
+        "balanced": {"text": "", "explanation": ""},
+        "appealing": {"text": "", "explanation": ""}
+    }
+}
+
+
+class StubMessages:
+    """messages.create の引数を記録し、固定のレスポンスを返すスタブ"""
+
+    def __init__(self, usages):
+        self.requests = []
+        self.usages = list(usages)
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=json.dumps(STUB_RESPONSE, ensure_ascii=False))],
+            usage=SimpleNamespace(**self.usages.pop(0))
+        )
+
+
+def create_checker(usages):
+    checker = YakkiChecker()
+    checker.claude_service.client = SimpleNamespace(messages=StubMessages(usages))
+    return checker
+
+
+def test_prompt_cache_request_shape():
+    """変わらない部分が先にキャッシュのマーカー付きで、チェック対象テキストが最後のブロックで送られるかのテスト"""
+    checker = create_checker([
+        {'input_tokens': 120, 'output_tokens': 300, 'cache_creation_input_tokens': 5000, 'cache_read_input_tokens': 0},
+        {'input_tokens': 130, 'output_tokens': 280, 'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 5000},
+    ])
+    texts = ["このクリームでシミが消える", "毎日使うと肌が生まれ変わる"]
+    for text in texts:
+        result = checker._call_claude_api_check(text, 'キャッチコピー', '化粧品', '', False)
+        assert result['overall_risk'] == '低'
+
+    requests = checker.claude_service.client.messages.requests
+    assert len(requests) == 2
+    for request, text in zip(requests, texts):
+        system = request['system']
+        assert system[-1]['cache_control'] == CACHE_CONTROL
+
+        content = request['messages'][0]['content']
+        assert [block.get('cache_control') for block in content] == [CACHE_CONTROL, CACHE_CONTROL, None]
+        assert all(text not in block['text'] for block in content[:-1])
+        assert text in content[-1]['text']
+        assert '**文章種類別ルール:**' in content[1]['text']
+        assert Config.CLAUDE_MIN_OUTPUT_TOKENS <= request['max_tokens'] <= Config.CLAUDE_MAX_OUTPUT_TOKENS
+
+    # キャッシュ対象の部分はリクエスト間で同じ
+    assert requests[0]['system'] == requests[1]['system']
+    assert requests[0]['messages'][0]['content'][:2] == requests[1]['messages'][0]['content'][:2]
+    # 変わらない部分はスナップショットで描画済みの同じ文字列を使う（リクエストごとに作り直さない）
+    for first, second in zip(requests[0]['messages'][0]['content'][:2], requests[1]['messages'][0]['content'][:2]):
+        assert first['text'] is second['text']
+
+    stats = checker.claude_service.get_usage_stats()
+    assert stats['requests'] == 2
+    assert stats['cache_creation_input_tokens'] == 5000
+    assert stats['cache_read_input_tokens'] == 5000
+    assert stats['input_tokens'] == 250
+    print(f"\nトークン使用量: {stats}")
+
+
+def test_prompt_cache_disabled():
+    """CLAUDE_PROMPT_CACHE が無効の場合はマーカーを付けずに送るかのテスト"""
+    service = ClaudeService()
+    service.client = SimpleNamespace(messages=StubMessages([{'input_tokens': 10, 'output_tokens': 5}]))
+    original = Config.CLAUDE_PROMPT_CACHE
+    Config.CLAUDE_PROMPT_CACHE = False
+    try:
+        response = service.call_api(
+            [{"type": "text", "text": "system", "cache_control": CACHE_CONTROL}],
+            [{"type": "text", "text": "reference", "cache_control": CACHE_CONTROL}, {"type": "text", "text": "request"}]
+        )
+    finally:
+        Config.CLAUDE_PROMPT_CACHE = original
+
+    request = service.client.messages.requests[0]
+    assert all('cache_control' not in block for block in request['system'])
+    assert all('cache_control' not in block for block in request['messages'][0]['content'])
+    # キャッシュのトークン数がないレスポンスは0として記録
+    assert response['token_usage']['cache_read_input_tokens'] == 0
+    assert response['token_usage']['input_tokens'] == 10
+
+
+def test_prompt_token_budget():
+    """入力トークン数の上限に合わせて参考データを省略し、最大出力トークン数をテキストの長さに合わせるかのテスト"""
+    checker = create_checker([])
+    text = "このクリームでシミが消える"
+    originals = (Config.PROMPT_INPUT_TOKEN_BUDGET, Config.PROMPT_REQUEST_TOKEN_RESERVE, Config.PROMPT_RETRIEVAL)
+    Config.PROMPT_RETRIEVAL = False
+    Config.PROMPT_REQUEST_TOKEN_RESERVE = 0
+    try:
+        Config.PROMPT_INPUT_TOKEN_BUDGET = 0
+        full, full_tokens = checker._create_user_content(text, 'キャッチコピー', '化粧品', '', False)
+        Config.PROMPT_INPUT_TOKEN_BUDGET = full_tokens // 2
+        trimmed, trimmed_tokens = checker._create_user_content(text, 'キャッチコピー', '化粧品', '', False)
+        again, _ = checker._create_user_content("毎日使うと肌が生まれ変わる", 'キャッチコピー', '化粧品', '', False)
+    finally:
+        Config.PROMPT_INPUT_TOKEN_BUDGET, Config.PROMPT_REQUEST_TOKEN_RESERVE, Config.PROMPT_RETRIEVAL = originals
+
+    assert TRIMMED_DATA_NOTE not in full[0]['text']
+    assert TRIMMED_DATA_NOTE in trimmed[0]['text']
+    assert trimmed_tokens < full_tokens
+    # ルールは省略せず、省略後の参考データもリクエスト間で同じもの（プロンプトキャッシュの対象）を使う
+    assert trimmed[1]['text'] == full[1]['text']
+    assert again[0]['text'] is trimmed[0]['text']
+
+    short = checker._estimate_max_tokens("短いテキスト")
+    long = checker._estimate_max_tokens("長いテキスト。" * 300)
+    assert Config.CLAUDE_MIN_OUTPUT_TOKENS <= short < long <= Config.CLAUDE_MAX_OUTPUT_TOKENS
+    # 短いテキストでも固定の最大トークン数（CLAUDE_MAX_TOKENS）より小さくしない
+    assert short >= Config.CLAUDE_MAX_TOKENS
+    print(f"\n推定入力トークン数: {full_tokens} → {trimmed_tokens}, 最大出力トークン数: {short} / {long}")
+
+
+def test_retrieval_without_hits():
+    """NG表現データの retrieval が hits でないマニフェスト（セクション検索のみ）でユーザープロンプトを作成できるかのテスト"""
+    originals = (Config.REFERENCE_MANIFEST_PATH, Config.PROMPT_RETRIEVAL, Config.DATA_SNAPSHOT_PATH)
+    with tempfile.TemporaryDirectory() as directory:
+        law_path = os.path.join(directory, 'law.md')
+        with open(law_path, 'w', encoding='utf-8') as f:
+            f.write("## 第1条\nシミが消えるなどの表現は医薬品的な効能効果にあたる。\n\n## 第2条\n保湿の表現は化粧品の効能の範囲内。\n")
+        manifest_path = os.path.join(directory, 'reference_manifest.json')
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': [
+                {'path': law_path, 'role': 'reference', 'retrieval': 'sections', 'priority': 100},
+                {'path': os.path.join(directory, 'ng_expressions.csv'), 'role': 'ng_expressions', 'retrieval': 'full'}
+            ]}, f, ensure_ascii=False)
+
+        Config.REFERENCE_MANIFEST_PATH = manifest_path
+        Config.PROMPT_RETRIEVAL = True
+        Config.DATA_SNAPSHOT_PATH = ''
+        try:
+            checker = create_checker([])
+            content, _ = checker._create_user_content("このクリームでシミが消える", 'キャッチコピー', '化粧品', '', False)
+        finally:
+            Config.REFERENCE_MANIFEST_PATH, Config.PROMPT_RETRIEVAL, Config.DATA_SNAPSHOT_PATH = originals
+
+    request_text = content[-1]['text']
+    assert '=== 関連する参考資料（抜粋） ===' in request_text
+    assert '第1条' in request_text
+    assert 'NG表現データベースで検出した表現' not in request_text
+
+
+def test_compact_ng_table():
+    """表形式のNG表現データで、商品カテゴリで絞り込んだ行がすべて空欄の列を除くかのテスト"""
+    checker = create_checker([])
+    table = NGExpressionTable(['表現', '理由', '代替表現', '商品カテゴリ'], [
+        ('美白', '薬用化粧品以外では使用不可', '', ''),
+        ('治る', '治療効果の標ぼう', '', ''),
+        ('脂肪燃焼', '医薬品的な効能効果', '引き締まった印象に', '美容機器・健康器具・その他'),
+    ])
+
+    compact = checker.data_service._format_csv_for_prompt(table, '化粧品', compact=True)
+    assert compact.split('\n') == ['表現|理由', '美白|薬用化粧品以外では使用不可', '治る|治療効果の標ぼう']
+
+    compact = checker.data_service._format_csv_for_prompt(table, '美容機器・健康器具・その他', compact=True)
+    assert compact.split('\n')[0] == '表現|理由|代替表現|商品カテゴリ'
+
+
+if __name__ == "__main__":
+    test_prompt_cache_request_shape()
+    test_prompt_cache_disabled()
+    test_prompt_token_budget()
+    test_retrieval_without_hits()
+    test_compact_ng_table()
@@ -6,6 +6,16 @@
 """
 
 from .cache import CacheManager
-from .file_watcher import FileWatcher
+from .file_watcher import FileWatcher, get_file_watcher
+from .ng_matcher import NGMatcher
+from .fuzzy_matcher import FuzzyNGMatcher
 
-__all__ = ['CacheManager', 'FileWatcher']
\ No newline at end of file
+__all__ = ['CacheManager', 'FileWatcher', 'get_file_watcher', 'NGMatcher', 'FuzzyNGMatcher', 'BulkNGScanner']
+
+
+def __getattr__(name):
+    # BulkNGScanner はnumpyを読み込むため、サーバーの起動時には読み込まず参照時に読み込む
+    if name == 'BulkNGScanner':
+        from .bulk_scanner import BulkNGScanner
+        return BulkNGScanner
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,195 @@
+"""
+一括NG表現スキャンモジュール
+広告アーカイブなど大量の短文を、コード点の連続配列にまとめてNumPyで一括処理する
+文字バイグラムのビット表による事前判定でNG表現を含みえないテキストを除外し、
+残ったテキストのみをコンパイル済みマッチャーで照合する
+"""
+
+import logging
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from utils.ng_matcher import NGMatcher
+from utils.text_normalizer import _normalize_piece
+
+logger = logging.getLogger(__name__)
+
+# numpyの可用性チェック
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+    logger.warning("numpyが利用できません。一括NG表現スキャンは使用できません。")
+
+# 検出結果表の型 (テキスト番号, パターンID, 開始位置, 終了位置)
+HIT_DTYPE = [('text_id', 'i8'), ('pattern_id', 'i4'), ('start', 'i4'), ('end', 'i4')]
+
+# バイグラムのビット表の大きさ（2の累乗）
+BIGRAM_TABLE_BITS = 22
+
+# 正規化表の対象（基本多言語面）。これ以外の文字を含むテキストは事前判定せず照合する
+_TABLE_SIZE = 0x10000
+_COMPLEX = -1
+
+_HASH_MULTIPLIER = 0x9E3779B1
+
+_normalization_table = None
+
+
+def _get_normalization_table():
+    """コード点 -> 正規化後のコード点の対応表（1文字に1文字で対応しない文字は _COMPLEX）"""
+    global _normalization_table
+    if _normalization_table is None:
+        table = np.full(_TABLE_SIZE, _COMPLEX, dtype=np.int32)
+        for code in range(_TABLE_SIZE):
+            if 0xD800 <= code <= 0xDFFF:
+                continue
+            normalized, simple = _normalize_piece(chr(code))
+            if simple:
+                table[code] = ord(normalized)
+        _normalization_table = table
+    return _normalization_table
+
+
+def _bigram_hash(first, second):
+    """正規化済みコード点の組をビット表の位置に変換"""
+    combined = (first.astype(np.uint64) << np.uint64(16)) | second.astype(np.uint64)
+    hashed = (combined * np.uint64(_HASH_MULTIPLIER)) & np.uint64(0xFFFFFFFF)
+    return (hashed >> np.uint64(32 - BIGRAM_TABLE_BITS)).astype(np.int64)
+
+
+def pack_texts(texts: Sequence[str]) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    テキスト群を1本のコード点配列と開始位置配列にまとめる
+
+    Returns:
+        (コード点配列 uint32, 開始位置配列 int64（長さ len(texts) + 1）)
+    """
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype='<u4')
+    return codes, offsets
+
+
+class BulkNGScanner:
+    """大量テキスト向けのNG表現一括スキャナー"""
+
+    def __init__(self, matcher: NGMatcher):
+        """
+        Args:
+            matcher: 照合に使うコンパイル済みマッチャー
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpyが利用できないため一括NG表現スキャンは使用できません")
+
+        self.matcher = matcher
+        self.table = _get_normalization_table()
+        self.bigram_bits = np.zeros(1 << BIGRAM_TABLE_BITS, dtype=bool)
+        self.unigram_bits = np.zeros(_TABLE_SIZE, dtype=bool)
+        # 事前判定できない登録語がある場合は全テキストを照合する
+        self.prefilter_enabled = True
+
+        bigrams = 0
+        for key in matcher.automaton_keys():
+            codes = [ord(ch) for ch in key]
+            if any(code >= _TABLE_SIZE for code in codes):
+                self.prefilter_enabled = False
+                logger.warning(f"基本多言語面外の文字を含むNG表現があるため事前判定を無効化: {key}")
+                continue
+            if len(codes) == 1:
+                self.unigram_bits[codes[0]] = True
+                continue
+            # 登録語を含むテキストは、その登録語のどのバイグラムも必ず含むため先頭の1つだけを登録
+            first = np.array(codes[:1], dtype=np.uint32)
+            second = np.array(codes[1:2], dtype=np.uint32)
+            self.bigram_bits[_bigram_hash(first, second)] = True
+            bigrams += 1
+
+        logger.info(
+            f"一括NG表現スキャナー構築完了: バイグラム{bigrams}件, "
+            f"1文字{int(self.unigram_bits.sum())}件（事前判定: {'有効' if self.prefilter_enabled else '無効'}）"
+        )
+
+    def prefilter(self, codes: 'np.ndarray', offsets: 'np.ndarray') -> 'np.ndarray':
+        """
+        NG表現を含みうるテキストを判定する（偽陽性はあるが偽陰性はない）
+
+        Args:
+            codes: pack_texts() のコード点配列
+            offsets: pack_texts() の開始位置配列
+
+        Returns:
+            テキストごとの真偽値配列（Trueは照合が必要）
+        """
+        text_count = len(offsets) - 1
+        if not self.prefilter_enabled:
+            return np.ones(text_count, dtype=bool)
+        candidates = np.zeros(text_count, dtype=bool)
+        if len(codes) == 0:
+            return candidates
+
+        # 正規化（対応表外・1対1で対応しない文字は _COMPLEX）
+        in_table = codes < _TABLE_SIZE
+        normalized = np.full(len(codes), _COMPLEX, dtype=np.int32)
+        normalized[in_table] = self.table[codes[in_table]]
+        complex_chars = normalized == _COMPLEX
+
+        # 事前判定できない文字を含むテキストは照合対象にする
+        matched = complex_chars.copy()
+        matched |= self.unigram_bits[np.where(complex_chars, 0, normalized)] & ~complex_chars
+
+        # テキストの境界をまたがないバイグラムのみ判定
+        if len(codes) > 1:
+            valid = ~(complex_chars[:-1] | complex_chars[1:])
+            boundaries = offsets[1:-1]
+            # 先頭・末尾の空のテキストの境界は範囲外になるため除く
+            boundaries = boundaries[(boundaries > 0) & (boundaries < len(codes))]
+            valid[boundaries - 1] = False
+            safe = np.where(complex_chars, 0, normalized).astype(np.uint32)
+            positions = _bigram_hash(safe[:-1], safe[1:])
+            matched[:-1] |= self.bigram_bits[positions] & valid
+
+        text_ids = np.searchsorted(offsets, np.flatnonzero(matched), side='right') - 1
+        candidates[text_ids] = True
+        return candidates
+
+    def scan(self, texts: Sequence[str], first_text_id: int = 0) -> 'np.ndarray':
+        """
+        テキスト群を一括スキャンする
+
+        Args:
+            texts: テキストのリスト
+            first_text_id: 結果のテキスト番号の開始値（分割処理時の通し番号用）
+
+        Returns:
+            (text_id, pattern_id, start, end) の構造化配列（重なりは最長一致で解決済み）
+        """
+        codes, offsets = pack_texts(texts)
+        candidates = np.flatnonzero(self.prefilter(codes, offsets))
+
+        rows: List[Tuple[int, int, int, int]] = []
+        find_all = self.matcher.find_all
+        for index in candidates.tolist():
+            for start, end, pattern_id in find_all(texts[index]):
+                rows.append((first_text_id + index, pattern_id, start, end))
+
+        return np.array(rows, dtype=HIT_DTYPE)
+
+    def scan_iter(self, texts: Iterable[str], chunk_size: int = 50000) -> Iterator['np.ndarray']:
+        """
+        テキストを chunk_size 件ずつ読み込んで一括スキャンし、分割ごとの結果を返す
+
+        メモリ使用量は分割1つ分に抑えられ、テキスト番号は入力全体での通し番号になる
+        """
+        chunk: List[str] = []
+        first_text_id = 0
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) >= chunk_size:
+                yield self.scan(chunk, first_text_id)
+                first_text_id += len(chunk)
+                chunk = []
+        if chunk:
+            yield self.scan(chunk, first_text_id)
@@ -0,0 +1,125 @@
+"""
+商品カテゴリ別NG表現マッチャーモジュール
+ng_expressions.csv の「商品カテゴリ」列で対象カテゴリを限定したNG表現を、
+カテゴリごとに事前コンパイルしたマッチャーへ振り分ける
+リクエストはカテゴリに該当するパターンだけを走査するため、検出後の絞り込みは不要
+"""
+
+import logging
+import threading
+from typing import Dict, List, Any, Tuple
+
+from utils.ng_matcher import NGMatcher
+from utils.fuzzy_matcher import FuzzyNGMatcher
+
+logger = logging.getLogger(__name__)
+
+# 商品カテゴリの表記ゆれ
+CATEGORY_ALIASES = {
+    'サプリメント': 'サプリメント・健康食品',
+    '健康食品': 'サプリメント・健康食品',
+    '美容機器': '美容機器・健康器具・その他',
+    '健康器具': '美容機器・健康器具・その他',
+}
+
+# 「商品カテゴリ」列で複数カテゴリを区切る文字
+_CATEGORY_SEPARATORS = ('|', '、', ',', '，', '／', '/')
+
+
+def normalize_category(category: str) -> str:
+    """商品カテゴリ名を正規化（表記ゆれを統一）"""
+    category = str(category or '').strip()
+    return CATEGORY_ALIASES.get(category, category)
+
+
+def parse_categories(value: Any) -> Tuple[str, ...]:
+    """
+    「商品カテゴリ」列の値を対象カテゴリのタプルに変換
+
+    空欄（欠損値を含む）は全カテゴリ共通を意味する空のタプルになる
+    """
+    if value is None or value != value:
+        return ()
+    text = str(value)
+    for separator in _CATEGORY_SEPARATORS[1:]:
+        text = text.replace(separator, _CATEGORY_SEPARATORS[0])
+    categories = (normalize_category(part) for part in text.split(_CATEGORY_SEPARATORS[0]))
+    return tuple(dict.fromkeys(category for category in categories if category))
+
+
+class CategoryNGMatchers:
+    """商品カテゴリごとのコンパイル済みNG表現マッチャー"""
+
+    def __init__(self, patterns: List[Dict[str, Any]], fuzzy_max_distance: int = 1):
+        """
+        Args:
+            patterns: NG表現パターン情報のリスト（対象カテゴリ 'categories' を持つ辞書。空は全カテゴリ共通）
+            fuzzy_max_distance: あいまい検出で許容する編集距離の上限
+        """
+        self.fuzzy_max_distance = fuzzy_max_distance
+
+        common = [pattern_info for pattern_info in patterns if not pattern_info.get('categories')]
+        categories = dict.fromkeys(
+            category
+            for pattern_info in patterns
+            for category in pattern_info.get('categories') or ()
+        )
+
+        # カテゴリ指定なし・未知のカテゴリには共通パターンのみのマッチャーを使う
+        self.default = NGMatcher(common)
+        self.matchers: Dict[str, NGMatcher] = {
+            category: NGMatcher(common + [
+                pattern_info for pattern_info in patterns
+                if category in (pattern_info.get('categories') or ())
+            ])
+            for category in categories
+        }
+
+        # あいまい検出用の索引は使用時にカテゴリごとに構築
+        self._fuzzy_matchers: Dict[str, FuzzyNGMatcher] = {}
+        self._fuzzy_lock = threading.Lock()
+
+        logger.info(
+            f"カテゴリ別NG表現マッチャー構築完了: 共通{len(self.default.patterns)}パターン, "
+            f"カテゴリ別{len(self.matchers)}件（{', '.join(self.matchers) or 'なし'}）"
+        )
+
+    @classmethod
+    def from_compiled(cls, default: NGMatcher, matchers: Dict[str, NGMatcher],
+                      fuzzy_max_distance: int = 1) -> 'CategoryNGMatchers':
+        """コンパイル済みのマッチャー（保存済みファイルから読み込んだものなど）から作成"""
+        instance = cls.__new__(cls)
+        instance.fuzzy_max_distance = fuzzy_max_distance
+        instance.default = default
+        instance.matchers = dict(matchers)
+        instance._fuzzy_matchers = {}
+        instance._fuzzy_lock = threading.Lock()
+        return instance
+
+    @property
+    def categories(self) -> List[str]:
+        """専用パターンを持つ商品カテゴリの一覧"""
+        return list(self.matchers)
+
+    def get(self, category: str = '') -> NGMatcher:
+        """商品カテゴリに対応するマッチャーを取得"""
+        return self.matchers.get(normalize_category(category), self.default)
+
+    def get_fuzzy(self, category: str = '') -> FuzzyNGMatcher:
+        """商品カテゴリに対応するあいまい検出マッチャーを取得"""
+        key = normalize_category(category)
+        if key not in self.matchers:
+            key = ''
+
+        fuzzy_matcher = self._fuzzy_matchers.get(key)
+        if fuzzy_matcher is None:
+            with self._fuzzy_lock:
+                fuzzy_matcher = self._fuzzy_matchers.get(key)
+                if fuzzy_matcher is None:
+                    fuzzy_matcher = FuzzyNGMatcher(self.get(key), max_distance=self.fuzzy_max_distance)
+                    self._fuzzy_matchers[key] = fuzzy_matcher
+        return fuzzy_matcher
+
+    def all_matchers(self) -> List[NGMatcher]:
+        """共通マッチャーとカテゴリ別マッチャーの一覧"""
+        return [self.default] + list(self.matchers.values())
@@ -0,0 +1,342 @@
+"""
+コンパイル済みNG表現マッチャーのファイル保存モジュール
+オートマトン（CSR形式の遷移表・失敗リンク・出力）とパターン情報をフラットなバイナリファイルに書き出し、
+各ワーカープロセスは読み取り専用のmmapで参照する
+全プロセスが1つの物理コピーを共有し、新しいワーカーはCSVを解析せずに起動できる
+"""
+
+import os
+import json
+import hashlib
+import logging
+from array import array
+from typing import Dict, List, Any, Optional, Tuple
+
+from utils.ng_matcher import NGMatcher, Hit
+from utils.category_matchers import CategoryNGMatchers
+from utils.section_file import SectionFile, SectionFileError, write_section_file
+
+logger = logging.getLogger(__name__)
+
+# ファイル形式の版（形式を変更した場合に上げる）
+FORMAT_VERSION = 2
+
+# プロセス内で辞書に展開して保持する状態数の上限（共有されないメモリの上限）
+TRANSITION_CACHE_MAX = 65536
+
+# コンパイル結果に影響するモジュール（内容が変わればファイルを作り直す）
+_COMPILER_MODULES = (
+    'ng_matcher.py', 'conjugation.py', 'pattern_dsl.py', 'text_normalizer.py',
+    'category_matchers.py', 'compiled_matcher.py'
+)
+
+
+def source_fingerprint(paths: List[str]) -> str:
+    """
+    コンパイル元（データファイル・コンパイラのソース）の内容ハッシュ
+
+    Args:
+        paths: コンパイル結果に影響するファイル（存在しないファイルも区別して扱う）
+    """
+    digest = hashlib.sha256(f"format:{FORMAT_VERSION}".encode('utf-8'))
+    utils_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in list(paths) + [os.path.join(utils_dir, name) for name in _COMPILER_MODULES]:
+        digest.update(os.path.basename(path).encode('utf-8') + b'\0')
+        try:
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+
+def _uint32(values) -> bytes:
+    return array('I', values).tobytes()
+
+
+def _int32(values) -> bytes:
+    return array('i', values).tobytes()
+
+
+def _json_bytes(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def serialize_matcher(matcher: NGMatcher, prefix: str) -> Dict[str, bytes]:
+    """マッチャーをセクション（名前 -> バイト列）に変換"""
+    if isinstance(matcher, MappedNGMatcher):
+        return matcher.serialize(prefix)
+
+    goto_offsets = [0]
+    goto_chars = []
+    goto_targets = []
+    output_offsets = [0]
+    output_ids = []
+    output_lengths = []
+
+    for state, transitions in enumerate(matcher._goto):
+        # 状態ごとの遷移は文字コード順に並べ、読み込み側は二分探索で引く
+        for code, target in sorted((ord(ch), target) for ch, target in transitions.items()):
+            goto_chars.append(code)
+            goto_targets.append(target)
+        goto_offsets.append(len(goto_chars))
+
+        for pattern_id, length in matcher._output[state]:
+            output_ids.append(pattern_id)
+            output_lengths.append(length)
+        output_offsets.append(len(output_ids))
+
+    pattern_offsets = [0]
+    pattern_data = bytearray()
+    for pattern_info in matcher.patterns:
+        pattern_data += _json_bytes(pattern_info)
+        pattern_offsets.append(len(pattern_data))
+
+    meta = {
+        'max_pattern_length': matcher.max_pattern_length,
+        'gap_patterns': [[pattern_id, gaps] for pattern_id, gaps in matcher._gap_patterns.items()],
+        'segment_refs': matcher._segment_refs
+    }
+
+    return {
+        prefix + 'goto_offsets': _uint32(goto_offsets),
+        prefix + 'goto_chars': _uint32(goto_chars),
+        prefix + 'goto_targets': _uint32(goto_targets),
+        prefix + 'fail': _uint32(matcher._fail),
+        prefix + 'dict_link': _uint32(matcher._dict_link),
+        prefix + 'output_offsets': _uint32(output_offsets),
+        prefix + 'output_ids': _int32(output_ids),
+        prefix + 'output_lengths': _uint32(output_lengths),
+        prefix + 'pattern_offsets': _uint32(pattern_offsets),
+        prefix + 'patterns': bytes(pattern_data),
+        prefix + 'keys': _json_bytes(matcher.keys),
+        prefix + 'meta': _json_bytes(meta),
+    }
+
+
+class _MappedPatterns:
+    """mmap上のパターン情報を必要になった分だけ読み込むシーケンス"""
+
+    def __init__(self, offsets: memoryview, data: memoryview):
+        self._offsets = offsets
+        self._data = data
+        self._cache: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, pattern_id: int) -> Dict[str, Any]:
+        pattern_info = self._cache.get(pattern_id)
+        if pattern_info is None:
+            if pattern_id < 0:
+                pattern_id += len(self)
+            start, end = self._offsets[pattern_id], self._offsets[pattern_id + 1]
+            pattern_info = json.loads(bytes(self._data[start:end]))
+            self._cache[pattern_id] = pattern_info
+        return pattern_info
+
+    def __iter__(self):
+        for pattern_id in range(len(self)):
+            yield self[pattern_id]
+
+
+class MappedNGMatcher(NGMatcher):
+    """mmapしたコンパイル済みファイルを参照するマッチャー（構築処理なし）"""
+
+    def __init__(self, section_file: SectionFile, prefix: str):
+        self._section_file = section_file
+        self._prefix = prefix
+
+        self._goto_offsets = section_file.array(prefix + 'goto_offsets', 'I')
+        self._goto_chars = section_file.array(prefix + 'goto_chars', 'I')
+        self._goto_targets = section_file.array(prefix + 'goto_targets', 'I')
+        self._fail = section_file.array(prefix + 'fail', 'I')
+        self._dict_link = section_file.array(prefix + 'dict_link', 'I')
+        self._output_offsets = section_file.array(prefix + 'output_offsets', 'I')
+        self._output_ids = section_file.array(prefix + 'output_ids', 'i')
+        self._output_lengths = section_file.array(prefix + 'output_lengths', 'I')
+        self.patterns = _MappedPatterns(
+            section_file.array(prefix + 'pattern_offsets', 'I'),
+            section_file.bytes(prefix + 'patterns')
+        )
+
+        meta = section_file.json(prefix + 'meta')
+        self.max_pattern_length = meta['max_pattern_length']
+        self._gap_patterns = {
+            pattern_id: [tuple(gap) for gap in gaps] for pattern_id, gaps in meta['gap_patterns']
+        }
+        self._segment_refs = [tuple(ref) for ref in meta['segment_refs']]
+        self._keys = None
+
+        # 走査で通った状態の遷移はプロセス内で辞書に展開して再利用する（上限まで。ルートは常に展開）
+        self._transition_cache: Dict[int, Dict[str, int]] = {}
+        self._transitions(0)
+
+    def serialize(self, prefix: str) -> Dict[str, bytes]:
+        """読み込んだセクションを別の接頭辞でそのまま書き出す（別ファイルへの再保存用）"""
+        return {
+            prefix + name[len(self._prefix):]: bytes(self._section_file.bytes(name))
+            for name in self._section_file.section_names()
+            if name.startswith(self._prefix)
+        }
+
+    @property
+    def keys(self) -> List[Tuple[str, int]]:
+        """正規化・活用展開済みの登録語（初回参照時に読み込む）"""
+        if self._keys is None:
+            self._keys = [tuple(key) for key in self._section_file.json(self._prefix + 'keys')]
+        return self._keys
+
+    def _transitions(self, state: int) -> Dict[str, int]:
+        """状態からの遷移を辞書として取得（CSR形式の遷移表から展開）"""
+        transitions = self._transition_cache.get(state)
+        if transitions is None:
+            goto_chars = self._goto_chars
+            goto_targets = self._goto_targets
+            transitions = {
+                chr(goto_chars[index]): goto_targets[index]
+                for index in range(self._goto_offsets[state], self._goto_offsets[state + 1])
+            }
+            if len(self._transition_cache) < TRANSITION_CACHE_MAX:
+                self._transition_cache[state] = transitions
+        return transitions
+
+    def _scan_normalized(self, text: str) -> List[Hit]:
+        """正規化済みテキストをmmap上のオートマトンで走査"""
+        transition_cache = self._transition_cache
+        get_transitions = self._transitions
+        fail = self._fail
+        dict_link = self._dict_link
+        output_offsets = self._output_offsets
+        output_ids = self._output_ids
+        output_lengths = self._output_lengths
+
+        hits = []
+        state = 0
+        for index, ch in enumerate(text):
+            while True:
+                transitions = transition_cache.get(state)
+                if transitions is None:
+                    transitions = get_transitions(state)
+                next_state = transitions.get(ch)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+
+            out_state = state if output_offsets[state] != output_offsets[state + 1] else dict_link[state]
+            while out_state:
+                end_index = index + 1
+                for position in range(output_offsets[out_state], output_offsets[out_state + 1]):
+                    hits.append((end_index - output_lengths[position], end_index, output_ids[position]))
+                out_state = dict_link[out_state]
+
+        return hits
+
+    def automaton_keys(self) -> List[str]:
+        """オートマトンに登録された全文字列（間隔付きパターンの区間を含む）"""
+        keys = []
+        stack = [(0, '')]
+        while stack:
+            state, prefix = stack.pop()
+            if self._output_offsets[state] != self._output_offsets[state + 1]:
+                keys.append(prefix)
+            for index in range(self._goto_offsets[state], self._goto_offsets[state + 1]):
+                stack.append((self._goto_targets[index], prefix + chr(self._goto_chars[index])))
+        return keys
+
+
+def compiled_matcher_sections(matchers: CategoryNGMatchers, pattern_bundle: Tuple[str, bytes],
+                              prefix: str = '') -> Tuple[Dict[str, bytes], Dict[str, Any]]:
+    """
+    カテゴリ別マッチャーとブラウザ用パターンバンドルをセクションに変換
+
+    Args:
+        matchers: カテゴリ別マッチャー
+        pattern_bundle: (バージョン, JSONバイト列)
+        prefix: セクション名の接頭辞（他のセクションと同じファイルにまとめる場合に使う）
+
+    Returns:
+        (セクション, 目次メタデータの 'ng_matchers' に格納する値)
+    """
+    sections: Dict[str, bytes] = {}
+    categories = {}
+    for index, (category, matcher) in enumerate([('', matchers.default)] + list(matchers.matchers.items())):
+        matcher_prefix = f"{prefix}m{index}."
+        sections.update(serialize_matcher(matcher, matcher_prefix))
+        categories[category] = matcher_prefix
+
+    bundle_version, bundle_body = pattern_bundle
+    sections[prefix + 'bundle'] = bundle_body
+
+    return sections, {
+        'format_version': FORMAT_VERSION,
+        'matchers': categories,
+        'bundle_section': prefix + 'bundle',
+        'bundle_version': bundle_version
+    }
+
+
+def matchers_from_section_file(section_file: SectionFile, fuzzy_max_distance: int = 1
+                               ) -> Optional[Tuple[CategoryNGMatchers, Tuple[str, bytes]]]:
+    """
+    mmap済みのファイルからカテゴリ別マッチャーとパターンバンドルを取り出す
+
+    Returns:
+        (カテゴリ別マッチャー, パターンバンドル)。マッチャーを含まない・形式が異なる場合はNone
+    """
+    metadata = section_file.metadata.get('ng_matchers')
+    if not metadata or metadata.get('format_version') != FORMAT_VERSION:
+        return None
+
+    prefixes = dict(metadata['matchers'])
+    default = MappedNGMatcher(section_file, prefixes.pop(''))
+    matchers = {category: MappedNGMatcher(section_file, prefix) for category, prefix in prefixes.items()}
+    pattern_bundle = (metadata['bundle_version'], bytes(section_file.bytes(metadata['bundle_section'])))
+    return CategoryNGMatchers.from_compiled(default, matchers, fuzzy_max_distance), pattern_bundle
+
+
+def save_compiled_matchers(path: str, matchers: CategoryNGMatchers, source_hash: str,
+                           pattern_bundle: Tuple[str, bytes]):
+    """カテゴリ別マッチャーとブラウザ用パターンバンドルをファイルに保存"""
+    sections, matcher_metadata = compiled_matcher_sections(matchers, pattern_bundle)
+    write_section_file(path, sections, metadata={
+        'source_hash': source_hash,
+        'ng_matchers': matcher_metadata
+    })
+    logger.info(f"コンパイル済みNG表現マッチャーを保存: {path}（{os.path.getsize(path)}バイト）")
+
+
+def load_compiled_matchers(path: str, source_hash: Optional[str],
+                           fuzzy_max_distance: int = 1) -> Optional[Tuple[CategoryNGMatchers, Tuple[str, bytes]]]:
+    """
+    保存済みのカテゴリ別マッチャーをmmapで読み込む
+
+    Args:
+        path: コンパイル済みファイル（データスナップショットを含む）のパス
+        source_hash: コンパイル元の内容ハッシュ（Noneの場合は照合しない。照合済みのファイルを子プロセスで開く場合など）
+        fuzzy_max_distance: あいまい検出で許容する編集距離の上限
+
+    Returns:
+        (カテゴリ別マッチャー, パターンバンドル)。ファイルがない・コンパイル元と一致しない場合はNone
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        section_file = SectionFile(path)
+    except (OSError, ValueError, SectionFileError) as e:
+        logger.warning(f"コンパイル済みNG表現マッチャーを読み込めません: {e}")
+        return None
+
+    loaded = None
+    if source_hash is None or section_file.metadata.get('source_hash') == source_hash:
+        loaded = matchers_from_section_file(section_file, fuzzy_max_distance)
+    if loaded is None:
+        logger.info("コンパイル済みNG表現マッチャーがデータと一致しないため再構築します")
+        return None
+
+    logger.info(f"コンパイル済みNG表現マッチャーを読み込み: {path}")
+    return loaded
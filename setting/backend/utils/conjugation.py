@@ -0,0 +1,91 @@
+"""
+活用展開モジュール
+ng_expressions.csv の「活用」列で指定された活用型に従い、NG表現の活用形を列挙する
+展開はマッチャーのコンパイル時に一度だけ行い、検索時のコストは増やさない
+"""
+
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# 五段活用: 語尾 -> (ア段, イ段, ウ段, エ段, オ段, 音便, 音便後の助詞・助動詞)
+_GODAN_ROWS = {
+    'う': ('わ', 'い', 'う', 'え', 'お', 'っ', ('た', 'て')),
+    'く': ('か', 'き', 'く', 'け', 'こ', 'い', ('た', 'て')),
+    'ぐ': ('が', 'ぎ', 'ぐ', 'げ', 'ご', 'い', ('だ', 'で')),
+    'す': ('さ', 'し', 'す', 'せ', 'そ', 'し', ('た', 'て')),
+    'つ': ('た', 'ち', 'つ', 'て', 'と', 'っ', ('た', 'て')),
+    'ぬ': ('な', 'に', 'ぬ', 'ね', 'の', 'ん', ('だ', 'で')),
+    'ぶ': ('ば', 'び', 'ぶ', 'べ', 'ぼ', 'ん', ('だ', 'で')),
+    'む': ('ま', 'み', 'む', 'め', 'も', 'ん', ('だ', 'で')),
+    'る': ('ら', 'り', 'る', 'れ', 'ろ', 'っ', ('た', 'て')),
+}
+
+_ICHIDAN_SUFFIXES = ('る', 'れ', 'ろ', 'よ', 'た', 'て', 'ない', 'ます', 'させ', 'られ')
+_SAHEN_SUFFIXES = ('', 'する', 'すれ', 'しろ', 'せよ', 'し', 'した', 'して', 'しない',
+                   'され', 'させ', 'でき', 'できる')
+_ADJECTIVE_SUFFIXES = ('い', 'く', 'かっ', 'かった', 'くて', 'けれ', 'さ', 'そう')
+
+# 活用型の表記ゆれ
+CONJUGATION_ALIASES = {
+    '五段': '五段',
+    '五段動詞': '五段',
+    '一段': '一段',
+    '一段動詞': '一段',
+    '上一段': '一段',
+    '下一段': '一段',
+    'サ変': 'サ変',
+    'サ行変格': 'サ変',
+    '形容詞': '形容詞',
+}
+
+
+def expand_conjugations(expression: str, conjugation: str = '') -> List[str]:
+    """
+    NG表現を活用型に従って展開する
+
+    Args:
+        expression: 終止形（辞書形）のNG表現（例: むくむ、消える、改善する、若々しい）
+        conjugation: 活用型（五段・一段・サ変・形容詞）。空の場合は展開しない
+
+    Returns:
+        元の表現を含む活用形のリスト
+    """
+    conjugation_type = CONJUGATION_ALIASES.get((conjugation or '').strip())
+    if not expression or not conjugation_type:
+        if conjugation and str(conjugation).strip():
+            logger.warning(f"未知の活用型のため展開しません: {expression} ({conjugation})")
+        return [expression] if expression else []
+
+    forms = [expression]
+
+    if conjugation_type == '五段':
+        row = _GODAN_ROWS.get(expression[-1])
+        if row is None or len(expression) < 2:
+            logger.warning(f"五段活用として展開できません: {expression}")
+            return forms
+        stem = expression[:-1]
+        forms.extend(stem + ending for ending in row[:5])
+        forms.extend(stem + row[5] + auxiliary for auxiliary in row[6])
+
+    elif conjugation_type == '一段':
+        if not expression.endswith('る') or len(expression) < 2:
+            logger.warning(f"一段活用として展開できません: {expression}")
+            return forms
+        stem = expression[:-1]
+        forms.extend(stem + suffix for suffix in _ICHIDAN_SUFFIXES)
+
+    elif conjugation_type == 'サ変':
+        stem = expression[:-2] if expression.endswith('する') else expression
+        forms.extend(stem + suffix for suffix in _SAHEN_SUFFIXES if stem + suffix)
+
+    elif conjugation_type == '形容詞':
+        if not expression.endswith('い') or len(expression) < 2:
+            logger.warning(f"形容詞として展開できません: {expression}")
+            return forms
+        stem = expression[:-1]
+        forms.extend(stem + suffix for suffix in _ADJECTIVE_SUFFIXES)
+
+    # 重複を除去（順序は維持）
+    return list(dict.fromkeys(forms))
@@ -2,14 +2,19 @@
 # 変更内容: ファイル監視とリアルタイム更新機能を独立したモジュールに移動
 """
 ファイル監視モジュール
-データファイルとルールファイルの変更をリアルタイムで監視
+データファイルとルールファイルの変更をプロセス内で1つの監視サービスが検知し、購読者へ配信する
+
+- 短時間に続くイベントはまとめて1回の通知にする（デバウンス）
+- 内容が変わっていない保存（ハッシュが同じ）は通知しない
+- watchdog がない場合は os.scandir による定期確認で検知する
 """
 
 import os
 import time
+import hashlib
 import threading
 import logging
-from typing import Callable, List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Tuple, Any
 
 logger = logging.getLogger(__name__)
 
@@ -20,229 +25,295 @@ try:
     WATCHDOG_AVAILABLE = True
 except ImportError:
     WATCHDOG_AVAILABLE = False
+    # FileChangeHandler の基底クラス（watchdog がない場合は定期確認のみで、ハンドラーは使われない）
+    FileSystemEventHandler = object
     logger.warning("watchdogが利用できません。ファイル監視機能が制限されます。")
 
+# 変更されたファイルのパスのリストを受け取るコールバック
+ChangeCallback = Callable[[List[str]], None]
+
+# ファイルがない状態を表すハッシュ値
+_MISSING = None
+
+
+def _is_ignored(path: str) -> bool:
+    """エディタの一時ファイル・隠しファイルは監視対象外"""
+    name = os.path.basename(path)
+    return name.startswith('.') or name.endswith('~') or name.endswith('.swp')
+
+
+def _content_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return _MISSING
+
+
+def _scan_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """ディレクトリ直下のファイル -> (サイズ, 更新時刻)"""
+    entries = {}
+    try:
+        with os.scandir(directory) as iterator:
+            for entry in iterator:
+                if entry.is_file() and not _is_ignored(entry.path):
+                    stat = entry.stat()
+                    entries[entry.path] = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        pass
+    return entries
+
+
 class FileWatcher:
-    """ファイル監視とイベント処理クラス"""
-    
-    def __init__(self, debounce_time: float = 1.0):
-        self.observers = []
-        self.event_handlers = {}
+    """プロセス内で共有するファイル監視サービス（get_file_watcher() で取得）"""
+
+    def __init__(self, debounce_time: float = 1.0, poll_interval: float = 2.0):
+        """
+        Args:
+            debounce_time: 最後のイベントからこの秒数だけ変更が続かなければ通知する
+            poll_interval: watchdog がない場合にディレクトリを確認する間隔（秒）
+        """
         self.debounce_time = debounce_time
-        self.last_event_times = {}
-        self.lock = threading.Lock()
+        self.poll_interval = poll_interval
+        self.mode = 'watchdog' if WATCHDOG_AVAILABLE else 'polling'
         self.is_running = False
-    
-    def add_watch_directory(self, directory: str, callback: Callable[[str, str], None], 
-                          recursive: bool = False) -> bool:
-        """監視ディレクトリを追加"""
-        if not WATCHDOG_AVAILABLE:
-            logger.warning("watchdogが利用できないため、ファイル監視を開始できません")
-            return False
-        
-        if not os.path.exists(directory):
-            logger.error(f"監視ディレクトリが存在しません: {directory}")
-            return False
-        
-        try:
-            event_handler = FileChangeHandler(self, callback)
-            observer = Observer()
-            observer.schedule(event_handler, directory, recursive=recursive)
-            
-            self.observers.append(observer)
-            self.event_handlers[directory] = event_handler
-            
-            logger.info(f"ファイル監視ディレクトリ追加: {directory} (recursive={recursive})")
-            return True
-            
-        except Exception as e:
-            logger.error(f"ファイル監視の設定に失敗: {directory} - {e}")
-            return False
-    
-    def start_watching(self) -> bool:
-        """ファイル監視を開始"""
-        if not WATCHDOG_AVAILABLE or not self.observers:
-            logger.info("ファイル監視を開始できません（watchdog未利用またはobserver未設定）")
-            return False
-        
-        try:
-            for observer in self.observers:
-                observer.start()
-            
-            self.is_running = True
-            logger.info(f"ファイル監視開始: {len(self.observers)}個のディレクトリを監視中")
-            return True
-            
-        except Exception as e:
-            logger.error(f"ファイル監視の開始に失敗: {e}")
-            return False
-    
-    def stop_watching(self) -> None:
-        """ファイル監視を停止"""
-        if not self.is_running:
+
+        self.lock = threading.Lock()
+        self._condition = threading.Condition(self.lock)
+        self._subscriptions: Dict[int, Tuple[str, ChangeCallback]] = {}
+        self._next_subscription_id = 1
+        self._directories: Dict[str, Dict[str, Tuple[int, int]]] = {}  # 監視ディレクトリ -> 直下のファイルの状態
+        self._hashes: Dict[str, Optional[str]] = {}  # ファイル -> 最後に通知した時点の内容ハッシュ
+        self._pending: Dict[str, float] = {}  # 未処理のイベント（ファイル -> 最終イベント時刻）
+        self._observer = None
+        self._thread: Optional[threading.Thread] = None
+        self._last_poll = 0.0
+        self._stats = {'events': 0, 'ignored_unchanged': 0, 'notifications': 0}
+
+    def subscribe(self, directory: str, callback: ChangeCallback) -> int:
+        """
+        ディレクトリ直下のファイルの変更を購読（監視は最初の購読時に開始）
+
+        Args:
+            directory: 監視するディレクトリ
+            callback: 変更されたファイルのパスのリストを受け取る関数
+
+        Returns:
+            購読ID（unsubscribe に渡す）
+        """
+        directory = os.path.abspath(directory)
+        with self.lock:
+            subscription_id = self._next_subscription_id
+            self._next_subscription_id += 1
+            self._subscriptions[subscription_id] = (directory, callback)
+            is_new_directory = directory not in self._directories
+            if is_new_directory:
+                # 現在の内容を基準にし、内容の変わらない保存を通知しないようにする
+                entries = _scan_directory(directory)
+                self._directories[directory] = entries
+                for path in entries:
+                    self._hashes[path] = _content_hash(path)
+
+        if is_new_directory and self._observer is not None:
+            self._schedule(directory)
+        self.start()
+        return subscription_id
+
+    def unsubscribe(self, subscription_id: int) -> None:
+        """購読を解除"""
+        with self.lock:
+            self._subscriptions.pop(subscription_id, None)
+
+    def notify(self, path: str) -> None:
+        """ファイルの変更を通知（watchdog のイベントや手動での変更通知）"""
+        if _is_ignored(path):
             return
-        
-        for observer in self.observers:
+        with self._condition:
+            self._pending[os.path.abspath(path)] = time.monotonic()
+            self._stats['events'] += 1
+            self._condition.notify()
+
+    def start(self) -> bool:
+        """監視を開始（開始済みの場合は何もしない）"""
+        with self.lock:
+            if self.is_running:
+                return True
+            self.is_running = True
+            directories = list(self._directories)
+
+        if self.mode == 'watchdog':
             try:
-                observer.stop()
-                observer.join(timeout=5.0)
+                self._observer = Observer()
+                self._observer.daemon = True
+                for directory in directories:
+                    self._schedule(directory)
+                self._observer.start()
+            except Exception as e:
+                logger.error(f"ファイル監視の開始に失敗。ポーリングで監視します: {e}")
+                self._observer = None
+                self.mode = 'polling'
+
+        self._thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self._thread.start()
+        logger.info(f"ファイル監視開始（{self.mode}）: {len(directories)}個のディレクトリ")
+        return True
+
+    def stop(self) -> None:
+        """監視を停止"""
+        with self._condition:
+            if not self.is_running:
+                return
+            self.is_running = False
+            self._condition.notify()
+
+        if self._observer is not None:
+            try:
+                self._observer.stop()
+                self._observer.join(timeout=5.0)
             except Exception as e:
                 logger.error(f"ファイル監視の停止に失敗: {e}")
-        
-        self.observers.clear()
-        self.event_handlers.clear()
-        self.is_running = False
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
         logger.info("ファイル監視を停止しました")
-    
-    def should_process_event(self, file_path: str) -> bool:
-        """デバウンス処理: イベントを処理すべきかチェック"""
-        with self.lock:
-            current_time = time.time()
-            last_time = self.last_event_times.get(file_path, 0)
-            
-            if current_time - last_time < self.debounce_time:
-                return False
-            
-            self.last_event_times[file_path] = current_time
-            return True
-    
-    def get_status(self) -> Dict[str, any]:
+
+    def get_status(self) -> Dict[str, Any]:
         """ファイル監視の状態を取得"""
-        return {
-            'is_running': self.is_running,
-            'watchdog_available': WATCHDOG_AVAILABLE,
-            'monitored_directories': len(self.observers),
-            'last_events_count': len(self.last_event_times)
-        }
-
-class FileChangeHandler:
-    """ファイル変更イベントハンドラー"""
-    
-    def __init__(self, file_watcher: FileWatcher, callback: Callable[[str, str], None]):
-        self.file_watcher = file_watcher
-        self.callback = callback
-    
-    def on_modified(self, event):
-        """ファイル変更時の処理"""
-        if event.is_directory:
-            return
-        
-        file_path = event.src_path
-        if not self.file_watcher.should_process_event(file_path):
-            return
-        
-        filename = os.path.basename(file_path)
-        logger.info(f"ファイル変更検知: {filename}")
-        
-        try:
-            self.callback(file_path, 'modified')
-        except Exception as e:
-            logger.error(f"ファイル変更コールバックでエラー: {filename} - {e}")
-    
-    def on_created(self, event):
-        """ファイル作成時の処理"""
-        if event.is_directory:
-            return
-        
-        file_path = event.src_path
-        filename = os.path.basename(file_path)
-        logger.info(f"新規ファイル作成検知: {filename}")
-        
-        try:
-            self.callback(file_path, 'created')
-        except Exception as e:
-            logger.error(f"ファイル作成コールバックでエラー: {filename} - {e}")
-    
-    def on_deleted(self, event):
-        """ファイル削除時の処理"""
-        if event.is_directory:
+        with self.lock:
+            return {
+                'is_running': self.is_running,
+                'mode': self.mode,
+                'watchdog_available': WATCHDOG_AVAILABLE,
+                'monitored_directories': len(self._directories),
+                'subscriptions': len(self._subscriptions),
+                **self._stats
+            }
+
+    def _schedule(self, directory: str) -> None:
+        if not os.path.isdir(directory):
+            logger.warning(f"監視ディレクトリが存在しません: {directory}")
             return
-        
-        file_path = event.src_path
-        filename = os.path.basename(file_path)
-        logger.info(f"ファイル削除検知: {filename}")
-        
         try:
-            self.callback(file_path, 'deleted')
+            self._observer.schedule(FileChangeHandler(self), directory, recursive=False)
         except Exception as e:
-            logger.error(f"ファイル削除コールバックでエラー: {filename} - {e}")
+            logger.error(f"ファイル監視の設定に失敗: {directory} - {e}")
 
-# watchdog が利用可能な場合のみ FileSystemEventHandler を継承
-if WATCHDOG_AVAILABLE:
-    class FileChangeHandler(FileSystemEventHandler, FileChangeHandler):
-        pass
+    def _run(self) -> None:
+        """イベントをまとめて処理するループ（ポーリング時はディレクトリの確認も行う）"""
+        while True:
+            with self._condition:
+                if not self.is_running:
+                    return
+
+                now = time.monotonic()
+                timeouts = []
+                if self._pending:
+                    timeouts.append(max(self._pending.values()) + self.debounce_time - now)
+                if self.mode == 'polling':
+                    timeouts.append(self._last_poll + self.poll_interval - now)
+                timeout = min(timeouts) if timeouts else None
+                if timeout is None or timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+                batch = []
+                if self._pending and max(self._pending.values()) + self.debounce_time <= now:
+                    batch = list(self._pending)
+                    self._pending.clear()
 
-class PollingFileWatcher:
-    """ポーリングベースのファイル監視（watchdog代替）"""
-    
-    def __init__(self, interval: float = 5.0):
-        self.interval = interval
-        self.watched_files = {}
-        self.callbacks = {}
-        self.running = False
-        self.thread = None
-        self.lock = threading.Lock()
-    
-    def add_file(self, file_path: str, callback: Callable[[str, str], None]) -> bool:
-        """監視ファイルを追加"""
-        if not os.path.exists(file_path):
-            logger.warning(f"監視ファイルが存在しません: {file_path}")
-            return False
-        
-        with self.lock:
             try:
-                mtime = os.path.getmtime(file_path)
-                self.watched_files[file_path] = mtime
-                self.callbacks[file_path] = callback
-                logger.info(f"ポーリング監視ファイル追加: {file_path}")
-                return True
-            except OSError as e:
-                logger.error(f"ファイルの監視設定に失敗: {file_path} - {e}")
-                return False
-    
-    def start(self) -> None:
-        """ポーリング監視を開始"""
-        if self.running:
+                if self.mode == 'polling' and time.monotonic() >= self._last_poll + self.poll_interval:
+                    self._last_poll = time.monotonic()
+                    self._poll()
+                if batch:
+                    self._dispatch(batch)
+            except Exception as e:
+                logger.error(f"ファイル監視でエラー: {e}")
+
+    def _poll(self) -> None:
+        """監視ディレクトリを確認し、追加・変更・削除されたファイルをイベントとして登録"""
+        with self.lock:
+            directories = list(self._directories)
+
+        for directory in directories:
+            entries = _scan_directory(directory)
+            with self.lock:
+                previous = self._directories.get(directory, {})
+                self._directories[directory] = entries
+            for path in set(previous) | set(entries):
+                if previous.get(path) != entries.get(path):
+                    self.notify(path)
+
+    def _dispatch(self, paths: List[str]) -> None:
+        """内容が変わったファイルのみを、そのディレクトリの購読者へ購読ごとに1回で通知"""
+        changed = []
+        for path in paths:
+            content_hash = _content_hash(path)
+            with self.lock:
+                if path in self._hashes and self._hashes[path] == content_hash:
+                    self._stats['ignored_unchanged'] += 1
+                    continue
+                self._hashes[path] = content_hash
+            changed.append(path)
+
+        if not changed:
             return
-        
-        self.running = True
-        self.thread = threading.Thread(target=self._polling_loop, daemon=True)
-        self.thread.start()
-        logger.info(f"ポーリングベースファイル監視開始: {len(self.watched_files)}ファイル")
-    
-    def stop(self) -> None:
-        """ポーリング監視を停止"""
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=self.interval + 1)
-        logger.info("ポーリングベースファイル監視停止")
-    
-    def _polling_loop(self) -> None:
-        """ポーリングループ"""
-        while self.running:
+
+        with self.lock:
+            subscriptions = list(self._subscriptions.items())
+        for subscription_id, (directory, callback) in subscriptions:
+            targets = [path for path in changed if os.path.dirname(path) == directory]
+            if not targets:
+                continue
+            logger.info(f"ファイル変更検知: {', '.join(os.path.basename(path) for path in targets)}")
+            self._stats['notifications'] += 1
             try:
-                with self.lock:
-                    for file_path, old_mtime in list(self.watched_files.items()):
-                        if not os.path.exists(file_path):
-                            # ファイルが削除された
-                            callback = self.callbacks.get(file_path)
-                            if callback:
-                                callback(file_path, 'deleted')
-                            continue
-                        
-                        try:
-                            new_mtime = os.path.getmtime(file_path)
-                            if new_mtime > old_mtime:
-                                # ファイルが変更された
-                                self.watched_files[file_path] = new_mtime
-                                callback = self.callbacks.get(file_path)
-                                if callback:
-                                    callback(file_path, 'modified')
-                        except OSError:
-                            continue
-                
-                time.sleep(self.interval)
-                
+                callback(targets)
             except Exception as e:
-                logger.error(f"ポーリング監視でエラー: {e}")
-                time.sleep(self.interval)
\ No newline at end of file
+                logger.error(f"ファイル変更コールバックでエラー: {e}")
+
+
+class FileChangeHandler(FileSystemEventHandler):
+    """watchdog のイベントを監視サービスへ渡すハンドラー（watchdog が利用可能な場合のみ FileSystemEventHandler を継承）"""
+
+    def __init__(self, file_watcher: FileWatcher):
+        super().__init__()
+        self.file_watcher = file_watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.file_watcher.notify(event.src_path)
+        # 一時ファイルからの置き換えで保存するエディタは移動先が対象のファイルになる
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.file_watcher.notify(dest_path)
+
+
+_file_watcher: Optional[FileWatcher] = None
+_file_watcher_lock = threading.Lock()
+
+
+def get_file_watcher(debounce_time: float = 1.0, poll_interval: float = 2.0) -> FileWatcher:
+    """
+    プロセス内で共有するファイル監視サービスを取得
+
+    引数は最初の呼び出しで監視サービスを作成する場合のみ使用する
+    """
+    global _file_watcher
+    with _file_watcher_lock:
+        if _file_watcher is None:
+            _file_watcher = FileWatcher(debounce_time=debounce_time, poll_interval=poll_interval)
+        return _file_watcher
+
+
+def _reset_after_fork() -> None:
+    # 監視スレッドはfork先に引き継がれないため、子プロセスでは作り直す
+    global _file_watcher, _file_watcher_lock
+    _file_watcher = None
+    _file_watcher_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
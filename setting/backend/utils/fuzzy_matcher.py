@@ -0,0 +1,224 @@
+"""
+あいまいNG表現マッチャーモジュール
+記号・空白の挿入（例: 完・治、ア ン チエイジング）や1文字程度の改変で完全一致を回避した表現を検出する
+NG表現の文字バイグラム転置索引で候補位置を絞り込んでから、上限付き編集距離で照合するため、
+処理量はテキスト長にほぼ比例する
+"""
+
+import bisect
+import logging
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Tuple
+
+from utils.ng_matcher import NGMatcher, select_longest
+from utils.text_normalizer import normalize_with_offsets
+
+logger = logging.getLogger(__name__)
+
+# あいまい検出結果 (開始位置, 終了位置, パターンID, 編集距離)
+FuzzyHit = Tuple[int, int, int, int]
+
+# 読み飛ばす文字のUnicodeカテゴリ（空白・句読点・記号）
+_SKIP_CATEGORIES = ('Z', 'P', 'S')
+
+# 文の区切りは読み飛ばさない（文をまたいだ誤検出を防ぐ）
+_BOUNDARY_CHARS = frozenset('。．.！!？?\n\r')
+
+
+def is_skip_char(ch: str) -> bool:
+    """NG表現の途中に挿入されても無視する文字かどうか"""
+    if ch in _BOUNDARY_CHARS:
+        return False
+    return ch.isspace() or unicodedata.category(ch)[0] in _SKIP_CATEGORIES
+
+
+class FuzzyNGMatcher:
+    """NG表現のあいまい検出（読み飛ばし文字と上限付き編集距離を許容）"""
+
+    def __init__(self, matcher: NGMatcher, max_distance: int = 1, min_edit_length: int = 4):
+        """
+        Args:
+            matcher: 完全一致用のコンパイル済みマッチャー（登録語とパターン情報を共有）
+            max_distance: 許容する編集距離の上限
+            min_edit_length: 編集距離を許容する登録語の最小文字数（これより短い語は読み飛ばしのみ許容）
+        """
+        self.matcher = matcher
+        self.max_distance = max_distance
+        self.min_edit_length = min_edit_length
+
+        # 索引対象の登録語 (登録語, パターンID, 許容編集距離)
+        self.entries: List[Tuple[str, int, int]] = []
+        # バイグラム -> [(登録語番号, 登録語内の位置)]
+        self._index: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        candidates = [
+            (key, pattern_id) for key, pattern_id in matcher.keys
+            # 1文字の語と、読み飛ばし文字を含む語（No.1、100% など）は完全一致のみ
+            if len(key) >= 2 and not any(is_skip_char(ch) for ch in key)
+        ]
+        frequency = Counter(key[i:i + 2] for key, _ in candidates for i in range(len(key) - 1))
+
+        for key, pattern_id in candidates:
+            distance = self._allowed_distance(len(key))
+            entry_id = len(self.entries)
+            self.entries.append((key, pattern_id, distance))
+
+            # 編集距離k以内の一致は、登録語のバイグラムのうち最も珍しい 2k+1 個の
+            # いずれかを必ず含むため、それらだけを索引に登録する
+            grams = sorted(
+                ((key[i:i + 2], i) for i in range(len(key) - 1)),
+                key=lambda gram: (frequency[gram[0]], gram[1])
+            )
+            for gram, position in grams[:2 * distance + 1]:
+                self._index[gram].append((entry_id, position))
+
+        self._index = dict(self._index)
+        logger.info(
+            f"あいまいNG表現マッチャー構築完了: {len(self.entries)}語, "
+            f"{len(self._index)}バイグラム（編集距離上限: {max_distance}）"
+        )
+
+    def _allowed_distance(self, length: int) -> int:
+        """登録語の長さに応じた許容編集距離（索引の絞り込みが効く範囲に制限）"""
+        if length < self.min_edit_length:
+            return 0
+        return max(0, min(self.max_distance, (length - 2) // 2))
+
+    def scan(self, text: str) -> List[FuzzyHit]:
+        """
+        読み飛ばし文字を除いたテキスト上で、許容編集距離以内の一致を検出する
+
+        Returns:
+            (開始位置, 終了位置, パターンID, 編集距離) のリスト（位置は元テキスト基準）
+        """
+        normalized = normalize_with_offsets(text)
+
+        # 読み飛ばし文字を除いたテキストと、正規化テキスト上の位置
+        chars = []
+        positions = []
+        for index, ch in enumerate(normalized.text):
+            if not is_skip_char(ch):
+                chars.append(ch)
+                positions.append(index)
+        compact = ''.join(chars)
+
+        # 候補位置（登録語の先頭が来るはずの位置）を登録語ごとに収集
+        candidates: Dict[int, set] = defaultdict(set)
+        index = self._index
+        for i in range(len(compact) - 1):
+            postings = index.get(compact[i:i + 2])
+            if postings:
+                for entry_id, position in postings:
+                    candidates[entry_id].add(i - position)
+
+        hits = []
+        for entry_id, diagonals in candidates.items():
+            key, pattern_id, distance = self.entries[entry_id]
+            for start, end, found in self._verify(compact, key, distance, sorted(diagonals)):
+                normalized_start = positions[start]
+                normalized_end = positions[end - 1] + 1
+                hits.append(normalized.to_original(normalized_start, normalized_end) + (pattern_id, found))
+
+        return hits
+
+    def _verify(self, compact: str, key: str, distance: int,
+                diagonals: List[int]) -> List[Tuple[int, int, int]]:
+        """候補位置の周辺を編集距離で照合し、(開始位置, 終了位置, 編集距離) を返す"""
+        length = len(key)
+
+        # 重なり合う照合窓をまとめる
+        windows = []
+        for diagonal in diagonals:
+            window_start = max(0, diagonal - distance)
+            window_end = min(len(compact), diagonal + length + distance)
+            if windows and window_start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], window_end)
+            else:
+                windows.append([window_start, window_end])
+
+        results = []
+        for window_start, window_end in windows:
+            results.extend(_approximate_find(key, compact, window_start, window_end, distance))
+        return results
+
+
+def _approximate_find(key: str, text: str, window_start: int, window_end: int,
+                      distance: int) -> List[Tuple[int, int, int]]:
+    """
+    text[window_start:window_end] 内で key との編集距離が distance 以下の部分文字列を探す
+
+    部分文字列の開始位置を自由にした編集距離（Sellersのアルゴリズム）を1列ずつ計算し、
+    連続する終了位置の候補からは編集距離が最小のものを1件だけ採用する。
+    """
+    length = len(key)
+    costs = list(range(length + 1))
+    starts = [window_start] * (length + 1)
+
+    matches = []
+    group = None
+    for j in range(window_start, window_end):
+        ch = text[j]
+        new_costs = [0] * (length + 1)
+        new_starts = [j + 1] * (length + 1)
+        for i in range(1, length + 1):
+            best = costs[i - 1] + (key[i - 1] != ch)
+            best_start = starts[i - 1]
+            if costs[i] + 1 < best:
+                best, best_start = costs[i] + 1, starts[i]
+            if new_costs[i - 1] + 1 < best:
+                best, best_start = new_costs[i - 1] + 1, new_starts[i - 1]
+            new_costs[i] = best
+            new_starts[i] = best_start
+        costs, starts = new_costs, new_starts
+
+        if costs[length] <= distance and starts[length] < j + 1:
+            match = (starts[length], j + 1, costs[length])
+            if group is None or match[2] < group[2]:
+                group = match
+        elif group is not None:
+            matches.append(group)
+            group = None
+
+    if group is not None:
+        matches.append(group)
+    return matches
+
+
+def find_issues_fuzzy(matcher: NGMatcher, fuzzy_matcher: FuzzyNGMatcher, text: str) -> List[Dict[str, Any]]:
+    """
+    完全一致とあいまい一致を合わせた問題点を返す
+
+    完全一致の検出結果を優先し、それと重ならないあいまい一致のみを追加する。
+    各問題点には match_type（'exact' / 'fuzzy'）を付与する。
+    """
+    exact_hits = matcher.find_all(text)
+    # select_longest() の結果は開始位置順で重ならないため、終了位置も昇順になる
+    exact_starts = [start for start, _, _ in exact_hits]
+    exact_ends = [end for _, end, _ in exact_hits]
+
+    fuzzy_hits = []
+    distances = {}
+    for start, end, pattern_id, distance in fuzzy_matcher.scan(text):
+        # start より後で終わる最初の完全一致と重なるかを確認
+        index = bisect.bisect_right(exact_ends, start)
+        if index < len(exact_starts) and exact_starts[index] < end:
+            continue
+        hit = (start, end, pattern_id)
+        if hit not in distances or distance < distances[hit]:
+            distances[hit] = distance
+            fuzzy_hits.append(hit)
+
+    issues = []
+    for issue in matcher.issues_from_hits(text, exact_hits):
+        issue['match_type'] = 'exact'
+        issues.append(issue)
+
+    selected = select_longest(list(dict.fromkeys(fuzzy_hits)))
+    for hit, issue in zip(selected, matcher.issues_from_hits(text, selected)):
+        issue['match_type'] = 'fuzzy'
+        issue['distance'] = distances[hit]
+        issues.append(issue)
+
+    issues.sort(key=lambda issue: issue['start'])
+    return issues
@@ -0,0 +1,443 @@
+"""
+NG表現マッチャーモジュール
+Aho-Corasick法によるマルチパターン検索で、全NG表現を1回の線形走査で検出
+表記ゆれ（全角半角・ひらがなカタカナ・大文字小文字）は正規化後のテキスト上で吸収し、
+活用形とパターン記法の選択・省略はコンパイル時にオートマトンへ展開する
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, List, Any, Tuple
+
+from utils.conjugation import expand_conjugations
+from utils.pattern_dsl import CompiledPattern, PatternSyntaxError, compile_pattern, is_pattern_syntax
+from utils.text_normalizer import normalize_text, normalize_with_offsets
+
+logger = logging.getLogger(__name__)
+
+# 検出結果 (開始位置, 終了位置, パターンID)
+Hit = Tuple[int, int, int]
+
+# 同じNG表現の行で内容が異なる場合に警告する項目
+DUPLICATE_CHECK_FIELDS = ('reason', 'risk_level', 'alternative', 'categories')
+# 警告済みの重複（カテゴリ別のマッチャーごとに同じ警告を繰り返さない）
+_reported_duplicates = set()
+
+
+def _warn_duplicate(dropped: Dict[str, Any], kept: Dict[str, Any]):
+    """同じNG表現の行が内容の異なる先の行にまとめられて除外される場合に警告"""
+    differences = [field for field in DUPLICATE_CHECK_FIELDS if dropped.get(field) != kept.get(field)]
+    if not differences:
+        return
+    report_key = tuple(str(info.get(field)) for info in (dropped, kept) for field in ('pattern',) + DUPLICATE_CHECK_FIELDS)
+    if report_key in _reported_duplicates:
+        return
+    _reported_duplicates.add(report_key)
+    logger.warning(
+        f"重複するNG表現の行を除外: {dropped.get('pattern')}"
+        f"（{', '.join(f'{field}={dropped.get(field)!r}' for field in differences)}）"
+        f" -> 先の行 {kept.get('pattern')}"
+        f"（{', '.join(f'{field}={kept.get(field)!r}' for field in differences)}）を使用"
+    )
+
+
+class NGMatcher:
+    """NG表現のコンパイル済みマルチパターンマッチャー"""
+
+    def __init__(self, patterns: List[Dict[str, Any]]):
+        """
+        Args:
+            patterns: NG表現パターン情報のリスト
+                      （'pattern', 'reason', 'risk_level', 'alternative',
+                        任意で活用型 'conjugation'、記法 'syntax' を持つ辞書）
+        """
+        self.patterns: List[Dict[str, Any]] = []
+        # 正規化・活用展開済みの登録語と対応するパターンID
+        self.keys: List[Tuple[str, int]] = []
+        self.max_pattern_length = 0
+
+        # 間隔（.{m,n}）を含むパターン: パターンID -> 区間の間の間隔
+        # 各区間の文字列は負の出力ID（-(区間番号 + 1)）でオートマトンに登録し、走査後に連結する
+        self._gap_patterns: Dict[int, List[Tuple[int, int]]] = {}
+        self._segment_refs: List[Tuple[int, int]] = []
+
+        # オートマトン（状態0がルート）
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Tuple[int, int], ...]] = [()]
+        self._dict_link: List[int] = [0]
+
+        key_owners: Dict[str, int] = {}  # 登録語 -> 最初に登録したパターンID
+        duplicates = 0
+        invalid = 0
+        for pattern_info in patterns:
+            if is_pattern_syntax(pattern_info.get('syntax')):
+                try:
+                    compiled = compile_pattern(str(pattern_info.get('pattern') or ''))
+                except PatternSyntaxError as e:
+                    logger.error(f"NG表現パターンの構文エラーのため除外: {e}")
+                    invalid += 1
+                    continue
+                if compiled.gaps:
+                    if not self._add_gap_pattern(compiled, pattern_info):
+                        invalid += 1
+                    continue
+                forms = compiled.segments[0]
+            else:
+                forms = expand_conjugations(
+                    str(pattern_info.get('pattern') or ''),
+                    pattern_info.get('conjugation') or ''
+                )
+            # 正規化後に同一となる表記ゆれは1パターンにまとめる
+            pattern_id = len(self.patterns)
+            keys = []
+            duplicate_of = None
+            for form in forms:
+                key = normalize_text(form)
+                if not key:
+                    continue
+                if key in key_owners:
+                    duplicate_of = key_owners[key] if duplicate_of is None else duplicate_of
+                    continue
+                key_owners[key] = pattern_id
+                keys.append(key)
+            if not keys:
+                if duplicate_of is not None:
+                    duplicates += 1
+                    _warn_duplicate(pattern_info, self.patterns[duplicate_of])
+                continue
+
+            for key in keys:
+                self._add_pattern(key, pattern_id)
+                self.keys.append((key, pattern_id))
+            self.patterns.append(pattern_info)
+
+        self._build_links()
+        logger.info(
+            f"NG表現マッチャー構築完了: {len(self.patterns)}パターン（活用形含め{len(self.keys)}語, "
+            f"間隔指定{len(self._gap_patterns)}件）, {len(self._goto)}状態"
+            f"（表記ゆれ統合: {duplicates}件, 構文エラー: {invalid}件）"
+        )
+
+    def automaton_keys(self) -> List[str]:
+        """オートマトンに登録された全文字列（間隔付きパターンの区間を含む）"""
+        keys = []
+        stack = [(0, '')]
+        while stack:
+            state, prefix = stack.pop()
+            if self._output[state]:
+                keys.append(prefix)
+            for ch, next_state in self._goto[state].items():
+                stack.append((next_state, prefix + ch))
+        return keys
+
+    def _add_gap_pattern(self, compiled: CompiledPattern, pattern_info: Dict[str, Any]) -> bool:
+        """間隔を含むパターンの各区間をオートマトンに登録（登録できない場合はFalse）"""
+        segment_keys = [
+            list(dict.fromkeys(key for key in (normalize_text(form) for form in forms) if key))
+            for forms in compiled.segments
+        ]
+        if not all(segment_keys):
+            logger.error(f"NG表現パターンに正規化後に空になる区間があるため除外: {compiled.expression}")
+            return False
+
+        pattern_id = len(self.patterns)
+        self.patterns.append(pattern_info)
+        self._gap_patterns[pattern_id] = compiled.gaps
+
+        max_length = sum(gap_max for _, gap_max in compiled.gaps)
+        for segment_index, keys in enumerate(segment_keys):
+            output_id = -(len(self._segment_refs) + 1)
+            self._segment_refs.append((pattern_id, segment_index))
+            for key in keys:
+                self._add_pattern(key, output_id)
+            max_length += max(len(key) for key in keys)
+
+        self.max_pattern_length = max(self.max_pattern_length, max_length)
+        return True
+
+    def _add_pattern(self, key: str, pattern_id: int):
+        """トライ木にパターンを追加（間隔付きパターンの区間は負の出力ID）"""
+        state = 0
+        for ch in key:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._dict_link.append(0)
+                self._goto[state][ch] = next_state
+            state = next_state
+
+        self._output[state] = self._output[state] + ((pattern_id, len(key)),)
+        self.max_pattern_length = max(self.max_pattern_length, len(key))
+
+    def _build_links(self):
+        """失敗リンクと出力リンクを幅優先で構築"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # 出力を持つ最も近い接尾辞状態へのリンク
+                fail_state = self._fail[next_state]
+                self._dict_link[next_state] = fail_state if self._output[fail_state] else self._dict_link[fail_state]
+                queue.append(next_state)
+
+    def scan(self, text: str) -> List[Hit]:
+        """
+        テキストを1回走査し、重なりを含む全ての検出結果を返す
+
+        Returns:
+            (開始位置, 終了位置, パターンID) のリスト（位置は元テキスト基準）
+        """
+        normalized = normalize_with_offsets(text)
+        hits = self._scan_normalized(normalized.text)
+
+        if self._gap_patterns:
+            hits = self._join_gap_segments(hits)
+
+        if normalized.starts is None:
+            return hits
+        to_original = normalized.to_original
+        return [to_original(start, end) + (pattern_id,) for start, end, pattern_id in hits]
+
+    def _scan_normalized(self, text: str) -> List[Hit]:
+        """正規化済みテキストをオートマトンで走査（位置は正規化後の基準、区間は負の出力ID）"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        dict_link = self._dict_link
+
+        hits = []
+        state = 0
+        for index, ch in enumerate(text):
+            while True:
+                next_state = goto[state].get(ch)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+
+            out_state = state if output[state] else dict_link[state]
+            while out_state:
+                end = index + 1
+                for pattern_id, length in output[out_state]:
+                    hits.append((end - length, end, pattern_id))
+                out_state = dict_link[out_state]
+
+        return hits
+
+    def _join_gap_segments(self, hits: List[Hit]) -> List[Hit]:
+        """
+        区間の検出結果を間隔の条件で連結し、間隔付きパターンの検出結果に置き換える
+
+        各区間の終了位置ごとに最も遅い開始位置（最短一致）だけを保持するため、
+        処理量は区間の検出数と間隔の最大文字数に比例する
+        """
+        direct = []
+        segment_hits: Dict[Tuple[int, int], List[Tuple[int, int]]] = defaultdict(list)
+        for start, end, output_id in hits:
+            if output_id >= 0:
+                direct.append((start, end, output_id))
+            else:
+                segment_hits[self._segment_refs[-output_id - 1]].append((start, end))
+
+        for (pattern_id, segment_index), first_hits in list(segment_hits.items()):
+            if segment_index != 0:
+                continue
+
+            # 終了位置 -> 一致の開始位置
+            states: Dict[int, int] = {}
+            for start, end in first_hits:
+                states[end] = max(start, states.get(end, start))
+
+            for index, (gap_min, gap_max) in enumerate(self._gap_patterns[pattern_id], 1):
+                candidates = sorted(segment_hits.get((pattern_id, index), ()))
+                starts = [start for start, _ in candidates]
+                next_states: Dict[int, int] = {}
+                for end, origin in states.items():
+                    low = bisect.bisect_left(starts, end + gap_min)
+                    high = bisect.bisect_right(starts, end + gap_max)
+                    for _, segment_end in candidates[low:high]:
+                        if next_states.get(segment_end, -1) < origin:
+                            next_states[segment_end] = origin
+                states = next_states
+                if not states:
+                    break
+
+            direct.extend((origin, end, pattern_id) for end, origin in states.items())
+
+        return direct
+
+    def find_all(self, text: str) -> List[Hit]:
+        """重なりを最長一致で解決した検出結果を返す"""
+        return select_longest(self.scan(text))
+
+    def find_issues(self, text: str) -> List[Dict[str, Any]]:
+        """検出結果をチェック結果の問題点形式に変換"""
+        return self.issues_from_hits(text, self.find_all(text))
+
+    def issues_from_hits(self, text: str, hits: List[Hit]) -> List[Dict[str, Any]]:
+        """重なり解決済みの検出結果を問題点形式に変換"""
+        issues = []
+        for start, end, pattern_id in hits:
+            pattern_info = self.patterns[pattern_id]
+            alternative = pattern_info.get('alternative')
+            issues.append({
+                'fragment': text[start:end],
+                'reason': pattern_info.get('reason', ''),
+                'risk_level': pattern_info.get('risk_level', '中'),
+                'suggestions': [alternative] if alternative else [],
+                'start': start,
+                'end': end
+            })
+        return issues
+
+
+    def rescan_edit(self, text: str, hits: List[Hit], offset: int, delete_length: int,
+                    insert_text: str) -> Tuple[str, List[Hit], int]:
+        """
+        編集差分を適用し、編集の影響範囲だけを再走査する
+
+        編集位置の前後1文字（半角濁点などの合成で隣接文字の正規化が変わるため）を影響範囲とし、
+        影響範囲に重なる検出結果のみを入れ替える。再走査は影響範囲の前後に
+        最長パターン分の余白を加えた窓に限定し、それ以外の検出結果は位置をずらして再利用する。
+
+        Args:
+            text: 編集前のテキスト
+            hits: 編集前テキストに対する scan() の結果（重なり解決前）
+            offset: 編集開始位置
+            delete_length: 削除する文字数
+            insert_text: 挿入する文字列
+
+        Returns:
+            (編集後のテキスト, 編集後の検出結果（重なり解決前）, 再走査した文字数)
+        """
+        if offset < 0 or delete_length < 0 or offset + delete_length > len(text):
+            raise ValueError(f"編集範囲がテキストの範囲外です: offset={offset}, delete={delete_length}")
+
+        new_text = text[:offset] + insert_text + text[offset + delete_length:]
+        delta = len(insert_text) - delete_length
+
+        # 影響範囲（編集前・編集後の座標）
+        old_start = max(0, offset - 1)
+        old_end = offset + delete_length + 1
+        new_start = old_start
+        new_end = offset + len(insert_text) + 1
+
+        updated = []
+        for start, end, pattern_id in hits:
+            if start < old_end and end > old_start:
+                continue
+            if start >= offset + delete_length:
+                updated.append((start + delta, end + delta, pattern_id))
+            else:
+                updated.append((start, end, pattern_id))
+
+        # 合成文字は元テキストで最大2文字になるため、余白は最長パターンの2倍
+        margin = self.max_pattern_length * 2
+        window_start = max(0, new_start - margin)
+        window_end = min(len(new_text), new_end + margin)
+        for start, end, pattern_id in self.scan(new_text[window_start:window_end]):
+            start += window_start
+            end += window_start
+            if start < new_end and end > new_start:
+                updated.append((start, end, pattern_id))
+
+        updated.sort()
+        return new_text, updated, window_end - window_start
+
+
+# ブラウザ向けパターンバンドルに含めるパターン情報の項目
+BUNDLE_FIELDS = ('pattern', 'reason', 'risk_level', 'alternative', 'categories')
+
+
+def _bundle_value(value: Any) -> str:
+    """バンドル用に値を文字列化（欠損値は空文字、カテゴリのタプルは | 区切り）"""
+    if value is None or value != value:
+        return ''
+    if isinstance(value, (tuple, list)):
+        return '|'.join(str(item) for item in value)
+    return str(value)
+
+
+def build_pattern_bundle(*matchers: NGMatcher) -> Tuple[str, bytes]:
+    """
+    コンパイル済みマッチャーからブラウザ簡易チェック用のパターンバンドルを作成する
+
+    登録語はサーバーと同じ正規化・活用展開を済ませた状態で収録するため、
+    ブラウザ側は同じ正規化を適用したテキストを照合するだけでよい。
+    カテゴリ別マッチャーを複数渡した場合、共有するパターンは1件にまとめ、
+    対象カテゴリ（'categories'、空は全カテゴリ共通）で使い分けられるようにする。
+
+    Returns:
+        (バージョン（内容ハッシュ）, JSONバイト列)
+    """
+    patterns: List[Dict[str, Any]] = []
+    bundle_ids: Dict[int, int] = {}
+    keys: Dict[Tuple[str, int], None] = {}
+
+    for matcher in matchers:
+        for key, pattern_id in matcher.keys:
+            pattern_info = matcher.patterns[pattern_id]
+            bundle_id = bundle_ids.get(id(pattern_info))
+            if bundle_id is None:
+                bundle_id = bundle_ids[id(pattern_info)] = len(patterns)
+                patterns.append(pattern_info)
+            keys[(key, bundle_id)] = None
+
+    payload = {
+        'normalization': 'nfkc+hiragana+lower',
+        'fields': list(BUNDLE_FIELDS),
+        'patterns': [
+            [_bundle_value(pattern_info.get(field)) for field in BUNDLE_FIELDS]
+            for pattern_info in patterns
+        ],
+        'keys': [[key, bundle_id] for key, bundle_id in keys]
+    }
+    content = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+    # バージョン自体はハッシュ対象外として本文の先頭に付与
+    body = json.dumps({'version': version, **payload}, ensure_ascii=False, separators=(',', ':'))
+    return version, body.encode('utf-8')
+
+
+def select_longest(hits: List[Hit]) -> List[Hit]:
+    """
+    重なり合う検出結果を最長一致優先で解決する
+
+    長いものから順に採用し、既に採用した範囲と重なるものは除外する。
+    同じ長さの場合は先に出現したものを優先する。
+    """
+    starts: List[int] = []
+    ends: List[int] = []
+    selected: List[Hit] = []
+
+    for hit in sorted(hits, key=lambda h: (h[0] - h[1], h[0], h[2])):
+        start, end, _ = hit
+        index = bisect.bisect_right(starts, start)
+        # 直前の採用範囲と直後の採用範囲との重なりを確認
+        if index > 0 and ends[index - 1] > start:
+            continue
+        if index < len(starts) and starts[index] < end:
+            continue
+        starts.insert(index, start)
+        ends.insert(index, end)
+        selected.append(hit)
+
+    selected.sort()
+    return selected
@@ -0,0 +1,208 @@
+"""
+NG表現パターン記法モジュール
+ng_expressions.csv の「記法」列が「パターン」の行で使える限定的なパターン記法を解析する
+
+    効(く|きます)      選択
+    (とても)?効く      省略可能
+    シミ.{0,3}消       間に0〜3文字を挟む（上限 GAP_MAX 文字）
+    [くき]             文字の選択
+    \\.                記号そのもの
+
+正規表現と異なり、すべて有限個の文字列と上限付きの間隔に展開してからマッチャーに登録するため、
+検索時のバックトラックは発生せず、処理時間はテキスト長に比例する
+"""
+
+from typing import List, Tuple
+
+# 「記法」列でパターン記法を表す値
+PATTERN_SYNTAX_NAMES = frozenset(['パターン', 'pattern'])
+
+# 間隔（.{m,n}）で許容する最大文字数
+GAP_MAX = 10
+
+# 1区間あたりの展開後の文字列数の上限
+EXPANSION_MAX = 256
+
+_SPECIAL_CHARS = frozenset('()|?.{}[]\\')
+
+
+class PatternSyntaxError(ValueError):
+    """パターン記法の構文エラー"""
+
+    def __init__(self, expression: str, position: int, message: str):
+        self.expression = expression
+        self.position = position
+        super().__init__(f"{message}（位置 {position}）: {expression}")
+
+
+class CompiledPattern:
+    """解析済みパターン（間隔で区切られた区間ごとの展開文字列と、区間の間の間隔）"""
+
+    __slots__ = ('expression', 'segments', 'gaps')
+
+    def __init__(self, expression: str, segments: List[List[str]], gaps: List[Tuple[int, int]]):
+        self.expression = expression
+        # segments[i]: i番目の区間に一致する文字列の一覧
+        self.segments = segments
+        # gaps[i]: segments[i] と segments[i + 1] の間に挟める文字数 (最小, 最大)
+        self.gaps = gaps
+
+    @property
+    def max_length(self) -> int:
+        """一致しうる最長の文字数"""
+        return (sum(max(len(form) for form in forms) for forms in self.segments)
+                + sum(gap_max for _, gap_max in self.gaps))
+
+
+def is_pattern_syntax(value) -> bool:
+    """「記法」列の値がパターン記法を表すかどうか"""
+    if value is None or value != value:
+        return False
+    return str(value).strip().lower() in PATTERN_SYNTAX_NAMES
+
+
+def compile_pattern(expression: str) -> CompiledPattern:
+    """
+    パターン記法の文字列を解析する
+
+    Raises:
+        PatternSyntaxError: 構文が不正な場合、展開数が上限を超える場合
+    """
+    return _Parser(expression).parse()
+
+
+class _Parser:
+    """パターン記法の再帰下降パーサー"""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.position = 0
+
+    def error(self, message: str) -> PatternSyntaxError:
+        return PatternSyntaxError(self.expression, self.position, message)
+
+    def peek(self) -> str:
+        return self.expression[self.position] if self.position < len(self.expression) else ''
+
+    def parse(self) -> CompiledPattern:
+        if not self.expression:
+            raise self.error("パターンが空です")
+
+        segments: List[List[str]] = []
+        gaps: List[Tuple[int, int]] = []
+        current = ['']
+
+        while self.position < len(self.expression):
+            if self.peek() == '.':
+                gap = self.parse_gap()
+                if current == ['']:
+                    raise self.error("パターンの先頭や間隔の直後に間隔は置けません")
+                segments.append(self.finish_segment(current))
+                gaps.append(gap)
+                current = ['']
+            else:
+                current = self.concat(current, self.parse_item())
+
+        if current == ['']:
+            raise self.error("パターンの末尾に間隔は置けません")
+        segments.append(self.finish_segment(current))
+        return CompiledPattern(self.expression, segments, gaps)
+
+    def finish_segment(self, forms: List[str]) -> List[str]:
+        """区間の展開結果を検証"""
+        if '' in forms:
+            raise self.error("空文字列に一致する区間は使用できません")
+        return list(dict.fromkeys(forms))
+
+    def concat(self, left: List[str], right: List[str]) -> List[str]:
+        """2つの展開結果を連結（展開数の上限を検査）"""
+        if len(left) * len(right) > EXPANSION_MAX:
+            raise self.error(f"展開数が上限（{EXPANSION_MAX}）を超えています")
+        return [a + b for a in left for b in right]
+
+    def parse_gap(self) -> Tuple[int, int]:
+        """.{m,n}（または . のみで1文字）を解析"""
+        self.position += 1
+        if self.peek() != '{':
+            return 1, 1
+
+        close = self.expression.find('}', self.position)
+        if close < 0:
+            raise self.error("間隔の } がありません")
+        body = self.expression[self.position + 1:close]
+        parts = body.split(',')
+        try:
+            if len(parts) == 1:
+                gap_min = gap_max = int(parts[0])
+            elif len(parts) == 2:
+                gap_min, gap_max = int(parts[0] or 0), int(parts[1])
+            else:
+                raise ValueError(body)
+        except ValueError:
+            raise self.error(f"間隔の指定が不正です: {{{body}}}")
+
+        if gap_min < 0 or gap_min > gap_max:
+            raise self.error(f"間隔の指定が不正です: {{{body}}}")
+        if gap_max > GAP_MAX:
+            raise self.error(f"間隔の最大文字数は{GAP_MAX}までです: {{{body}}}")
+
+        self.position = close + 1
+        return gap_min, gap_max
+
+    def parse_item(self) -> List[str]:
+        """1要素（文字・文字の選択・グループ）と省略記号 ? を解析"""
+        ch = self.peek()
+        if ch == '(':
+            self.position += 1
+            forms = self.parse_alternation()
+            if self.peek() != ')':
+                raise self.error("グループの ) がありません")
+            self.position += 1
+        elif ch == '[':
+            forms = self.parse_class()
+        elif ch == '\\':
+            self.position += 1
+            if not self.peek():
+                raise self.error("\\ の後に文字がありません")
+            forms = [self.peek()]
+            self.position += 1
+        elif ch == '.':
+            raise self.error("間隔（.）はグループの外でのみ使用できます")
+        elif ch in _SPECIAL_CHARS:
+            raise self.error(f"予期しない記号 {ch} があります（記号そのものは \\{ch} と書きます）")
+        else:
+            forms = [ch]
+            self.position += 1
+
+        if self.peek() == '?':
+            self.position += 1
+            forms = list(dict.fromkeys([''] + forms))
+        return forms
+
+    def parse_alternation(self) -> List[str]:
+        """グループ内の a|b|c を解析"""
+        forms = self.parse_sequence()
+        while self.peek() == '|':
+            self.position += 1
+            forms = forms + self.parse_sequence()
+            if len(forms) > EXPANSION_MAX:
+                raise self.error(f"展開数が上限（{EXPANSION_MAX}）を超えています")
+        return list(dict.fromkeys(forms))
+
+    def parse_sequence(self) -> List[str]:
+        """グループ内の連接を解析"""
+        forms = ['']
+        while self.peek() and self.peek() not in '|)':
+            forms = self.concat(forms, self.parse_item())
+        return forms
+
+    def parse_class(self) -> List[str]:
+        """[abc] を解析"""
+        close = self.expression.find(']', self.position + 1)
+        if close < 0:
+            raise self.error("文字の選択の ] がありません")
+        chars = self.expression[self.position + 1:close]
+        if not chars:
+            raise self.error("文字の選択が空です")
+        self.position = close + 1
+        return list(dict.fromkeys(chars))
@@ -0,0 +1,144 @@
+"""
+参考データ最小化モジュール
+プロンプトに含める参考資料・ルールのマークダウン装飾を除き、繰り返される定型文をまとめ、
+NG表現の表を列名を1回だけ記載する表形式にして、入力トークン数を減らす
+
+見出し（#）はセクション検索の区切りに使うため残す
+"""
+
+import re
+from typing import Iterable, List, Optional, Sequence, Set
+
+# これより短い行は定型文とみなさない（短い注記は各条文に必要な場合がある）
+DEDUPE_MIN_CHARS = 40
+# 表の列の区切り
+TABLE_SEPARATOR = '|'
+
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_HORIZONTAL_RULE = re.compile(r'^\s{0,3}([-*_])(\s*\1){2,}\s*$')
+_TABLE_DELIMITER = re.compile(r'^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_BLOCKQUOTE = re.compile(r'^(\s*)(>\s?)+')
+_BULLET = re.compile(r'^(\s*)[*+]\s+')
+_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_STRONG = re.compile(r'(\*\*|__)(?=\S)(.+?)(?<=\S)\1')
+_EMPHASIS = re.compile(r'(?<![*A-Za-z0-9])\*(?=\S)([^*\n]+?)(?<=\S)\*(?![*A-Za-z0-9])')
+_INLINE_CODE = re.compile(r'`([^`\n]+)`')
+_SPACES = re.compile(r'\s+')
+
+
+def _strip_inline(text: str) -> str:
+    """強調・リンク・インラインコードの記号を除く（表示される文字はそのまま）"""
+    text = _IMAGE.sub(r'\1', text)
+    text = _LINK.sub(r'\1', text)
+    text = _STRONG.sub(r'\2', text)
+    text = _EMPHASIS.sub(r'\1', text)
+    return _INLINE_CODE.sub(r'\1', text)
+
+
+def _compact_table_row(line: str) -> str:
+    """「| a | b |」形式の表の行を「a|b」にする"""
+    cells = line.strip().strip('|').split('|')
+    return TABLE_SEPARATOR.join(cell.strip() for cell in cells)
+
+
+def _join_lines(lines: List[str]) -> str:
+    """連続する空行を1行にまとめ、前後の空行を除いて結合"""
+    compacted: List[str] = []
+    for line in lines:
+        if not line and (not compacted or not compacted[-1]):
+            continue
+        compacted.append(line)
+    while compacted and not compacted[-1]:
+        compacted.pop()
+    return '\n'.join(compacted)
+
+
+def minify_markdown(text: str) -> str:
+    """
+    マークダウンの装飾を除く
+
+    - HTMLコメント・水平線・表の区切り行・コードブロックの囲みを除く
+    - 強調・リンク・画像・インラインコードは表示される文字のみにする
+    - 引用の記号を除き、箇条書きの記号を「-」に揃える
+    - 表の行の前後・区切りの空白を除く
+    - 行末の空白を除き、連続する空行を1行にする
+    """
+    lines = []
+    in_code = False
+    for line in _HTML_COMMENT.sub('', text).split('\n'):
+        line = line.rstrip()
+        if _FENCE.match(line):
+            in_code = not in_code
+            continue
+        if in_code:
+            lines.append(line)
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            lines.append(f"{heading.group(1)} {_strip_inline(heading.group(2))}")
+            continue
+        if _HORIZONTAL_RULE.match(line) or _TABLE_DELIMITER.match(line):
+            continue
+
+        line = _BLOCKQUOTE.sub(r'\1', line)
+        line = _BULLET.sub(r'\1- ', line)
+        if line.lstrip().startswith('|'):
+            line = _compact_table_row(line)
+        lines.append(_strip_inline(line))
+
+    return _join_lines(lines)
+
+
+def dedupe_lines(text: str, seen: Optional[Set[str]] = None, min_chars: int = DEDUPE_MIN_CHARS) -> str:
+    """
+    繰り返される定型文（同じ内容の長い行）を2回目以降除く
+
+    Args:
+        text: テキスト
+        seen: 既に含めた行（空白を詰めた内容）。指定した場合は他のファイルと共通の行も除き、このファイルの行を追加する
+        min_chars: 定型文とみなす最小の文字数（見出し・表の行は対象外）
+
+    Returns:
+        定型文を除いたテキスト
+    """
+    if seen is None:
+        seen = set()
+    lines = []
+    for line in text.split('\n'):
+        key = _SPACES.sub(' ', line).strip()
+        if len(key) >= min_chars and not key.startswith('#') and TABLE_SEPARATOR not in key:
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+
+    # 除いた行の前後の空行が続かないようにする
+    return _join_lines(lines)
+
+
+def format_table_compact(columns: Sequence[str], rows: Iterable[Sequence[str]],
+                         keep_columns: Optional[Sequence[str]] = None) -> str:
+    """
+    表を列名の行と値の行からなる区切り文字形式にする（列名を行ごとに繰り返さない）
+
+    Args:
+        columns: 列名
+        rows: 列順に値を並べた行
+        keep_columns: 含める列（省略時は全列）。値のない列を除く場合などに指定する
+
+    Returns:
+        1行目が列名、2行目以降が値（行末の空欄は省略）のテキスト
+    """
+    indexes = [index for index, column in enumerate(columns) if keep_columns is None or column in keep_columns]
+
+    def cell(value: str) -> str:
+        return _SPACES.sub(' ', str(value)).strip().replace(TABLE_SEPARATOR, '｜')
+
+    lines = [TABLE_SEPARATOR.join(cell(columns[index]) for index in indexes)]
+    for row in rows:
+        lines.append(TABLE_SEPARATOR.join(cell(row[index]) for index in indexes).rstrip(TABLE_SEPARATOR))
+    return '\n'.join(lines)
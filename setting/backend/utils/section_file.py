@@ -0,0 +1,124 @@
+"""
+セクションファイルモジュール
+名前付きのバイト列（セクション）を1つのフラットなバイナリファイルにまとめて書き出し、
+読み取り専用のmmapで開いてコピーせずに参照する
+同じファイルをmmapした複数のプロセスは、OSのページキャッシュ上の1つの物理コピーを共有する
+
+ファイル形式:
+    マジック（8バイト） | 目次の長さ（uint32） | 目次（JSON） | 各セクション（8バイト境界に整列）
+"""
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+import logging
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'YKSECT01'
+_ALIGNMENT = 8
+_HEADER = struct.Struct('<8sI')
+
+
+class SectionFileError(ValueError):
+    """セクションファイルの形式エラー"""
+
+
+def _padding(size: int) -> int:
+    return -size % _ALIGNMENT
+
+
+def write_section_file(path: str, sections: Dict[str, bytes], metadata: Dict[str, Any] = None):
+    """
+    セクションをファイルに書き出す
+
+    一時ファイルに書き出してから置き換えるため、読み込み中のプロセスが
+    書きかけのファイルを開くことはない
+
+    Args:
+        path: 出力先のパス
+        sections: セクション名 -> バイト列
+        metadata: 目次に含める任意のメタデータ（JSONで表せる値）
+    """
+    # 目次の長さが決まらないとセクションの位置が決まらないため、位置は目次の直後からの相対値で持つ
+    table = {}
+    position = 0
+    for name, data in sections.items():
+        table[name] = [position, len(data)]
+        position += len(data) + _padding(len(data))
+
+    header = json.dumps(
+        {'byteorder': 'little', 'metadata': metadata or {}, 'sections': table},
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+    header += b' ' * _padding(_HEADER.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for data in sections.values():
+                f.write(data)
+                f.write(b'\0' * _padding(len(data)))
+        # mkstemp は所有者のみ読み書き可で作成するため、他のユーザーのプロセスからも読めるようにする
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class SectionFile:
+    """読み取り専用でmmapしたセクションファイル"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+        if len(view) < _HEADER.size:
+            raise SectionFileError(f"セクションファイルが短すぎます: {path}")
+        magic, header_length = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise SectionFileError(f"セクションファイルではありません: {path}")
+
+        header = json.loads(bytes(view[_HEADER.size:_HEADER.size + header_length]))
+        if header.get('byteorder') != 'little' or struct.pack('=I', 1) != struct.pack('<I', 1):
+            raise SectionFileError(f"バイトオーダーが一致しません: {path}")
+
+        self.metadata: Dict[str, Any] = header.get('metadata', {})
+        self._view = view
+        self._base = _HEADER.size + header_length
+        self._sections: Dict[str, List[int]] = header.get('sections', {})
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def section_names(self) -> List[str]:
+        """セクション名の一覧（書き出し順）"""
+        return list(self._sections)
+
+    def bytes(self, name: str) -> memoryview:
+        """セクションをコピーせずにバイト列として参照"""
+        try:
+            offset, length = self._sections[name]
+        except KeyError:
+            raise SectionFileError(f"セクションがありません: {name}")
+        start = self._base + offset
+        return self._view[start:start + length]
+
+    def array(self, name: str, typecode: str) -> memoryview:
+        """セクションを数値配列（'I': uint32, 'i': int32 など）として参照"""
+        return self.bytes(name).cast(typecode)
+
+    def json(self, name: str) -> Any:
+        """JSONセクションを読み込む"""
+        return json.loads(bytes(self.bytes(name)))
@@ -0,0 +1,191 @@
+"""
+参考資料セクション検索モジュール
+マークダウンの参考資料を見出し単位のセクションに分割し、文字n-gramのBM25転置インデックスで
+チェック対象テキストに関連するセクションを検索する
+形態素解析や外部サービスを使わず、プロセス内で数ミリ秒で検索できる
+"""
+
+import re
+import math
+import heapq
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Iterable, Collection
+
+from utils.text_normalizer import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# 1セクションの最大文字数（超える場合は段落単位で分割）
+SECTION_MAX_CHARS = 1200
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class Section:
+    """参考資料のセクション（見出しと本文）"""
+    __slots__ = ('source', 'title', 'heading', 'text')
+
+    def __init__(self, source: str, title: str, heading: str, text: str):
+        self.source = source  # 参照ファイルのパス
+        self.title = title  # 参照ファイルの見出し
+        self.heading = heading  # 「章 > 節」形式の見出し（見出しより前の本文は空）
+        self.text = text
+
+    def format(self) -> str:
+        """プロンプト用の表記"""
+        label = f"{self.title}｜{self.heading}" if self.heading else self.title
+        return f"【{label}】\n{self.text}"
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    """長い本文を段落（空行）単位でまとめ直し、1段落が長すぎる場合は文字数で分割"""
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_markdown_sections(text: str, source: str, title: str,
+                            max_chars: int = SECTION_MAX_CHARS) -> List[Section]:
+    """
+    マークダウンを見出し単位のセクションに分割
+
+    Args:
+        text: マークダウンのテキスト
+        source: 参照ファイルのパス
+        title: 参照ファイルの見出し
+        max_chars: 1セクションの最大文字数
+
+    Returns:
+        本文のあるセクションのリスト（文書内の順）
+    """
+    sections = []
+    headings: List[Tuple[int, str]] = []
+    body: List[str] = []
+
+    def flush():
+        content = '\n'.join(body).strip()
+        body.clear()
+        if not content:
+            return
+        heading = ' > '.join(heading_text for _, heading_text in headings)
+        for chunk in _split_long(content, max_chars):
+            sections.append(Section(source, title, heading, chunk))
+
+    for line in text.split('\n'):
+        match = _HEADING.match(line)
+        if match is None:
+            body.append(line)
+            continue
+        flush()
+        level = len(match.group(1))
+        while headings and headings[-1][0] >= level:
+            headings.pop()
+        headings.append((level, match.group(2)))
+    flush()
+    return sections
+
+
+def char_ngrams(text: str, n: int = 2) -> Counter:
+    """正規化（全角半角・ひらがなカタカナ・大文字小文字の同一視）・空白除去後の文字n-gramの出現回数"""
+    normalized = _WHITESPACE.sub('', normalize_text(text))
+    if len(normalized) < n:
+        return Counter([normalized] if normalized else [])
+    return Counter(normalized[i:i + n] for i in range(len(normalized) - n + 1))
+
+
+class SectionIndex:
+    """セクションの文字n-gram BM25転置インデックス"""
+
+    def __init__(self, sections: Iterable[Section], n: int = 2, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            sections: 索引に登録するセクション
+            n: n-gramの文字数
+            k1: BM25の語頻度の飽和パラメータ
+            b: BM25の文書長の正規化パラメータ
+        """
+        self.sections: List[Section] = list(sections)
+        self.n = n
+        self.k1 = k1
+
+        # n-gram -> [(セクション番号, 出現回数)]
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths = []
+        for doc_id, section in enumerate(self.sections):
+            grams = char_ngrams(f"{section.heading}\n{section.text}", n)
+            lengths.append(sum(grams.values()))
+            for gram, count in grams.items():
+                self.postings.setdefault(gram, []).append((doc_id, count))
+
+        total = len(self.sections)
+        average_length = (sum(lengths) / total) if total else 0.0
+        # 文書長による正規化項 k1 * (1 - b + b * dl / avgdl) はセクションごとに事前計算
+        self._length_norms = [
+            k1 * (1 - b + b * length / average_length) if average_length else k1
+            for length in lengths
+        ]
+        self._idf = {
+            gram: math.log((total - len(posting) + 0.5) / (len(posting) + 0.5) + 1.0)
+            for gram, posting in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def search(self, query: str, top_k: int = 5, sources: Optional[Collection[str]] = None,
+               max_query_terms: int = 256) -> List[Tuple[float, Section]]:
+        """
+        クエリに関連するセクションを検索
+
+        Args:
+            query: 検索テキスト（チェック対象テキストなど）
+            top_k: 返すセクションの最大数
+            sources: 対象とする参照ファイルのパス（省略時は全ファイル）
+            max_query_terms: 使用するクエリのn-gramの最大数（IDFの高いものを優先）
+
+        Returns:
+            (スコア, セクション) のリスト（スコアの高い順）
+        """
+        if top_k <= 0 or not self.sections:
+            return []
+
+        # ありふれたn-gramはスコアへの寄与が小さく、転置リストが長いため、IDFの高いものから使う
+        terms = [gram for gram in char_ngrams(query, self.n) if gram in self._idf]
+        if len(terms) > max_query_terms:
+            terms = heapq.nlargest(max_query_terms, terms, key=self._idf.__getitem__)
+
+        k1 = self.k1
+        length_norms = self._length_norms
+        scores: Dict[int, float] = {}
+        for gram in terms:
+            idf = self._idf[gram]
+            for doc_id, count in self.postings[gram]:
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (k1 + 1) / (count + length_norms[doc_id])
+
+        if sources is not None:
+            sources = set(sources)
+            scores = {doc_id: score for doc_id, score in scores.items() if self.sections[doc_id].source in sources}
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(score, self.sections[doc_id]) for doc_id, score in best]
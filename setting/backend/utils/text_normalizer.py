@@ -0,0 +1,106 @@
+"""
+テキスト正規化モジュール
+NG表現マッチング用にNFKC・全角半角・ひらがなカタカナ・大文字小文字を同一視した表記へ変換し、
+正規化後の位置から元テキストの位置へ戻すためのオフセット対応表を提供
+"""
+
+import unicodedata
+from array import array
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# カタカナ（ァ〜ヶ）をひらがなへ寄せるための差分
+_KATAKANA_START = 0x30A1
+_KATAKANA_END = 0x30F6
+_KANA_OFFSET = 0x60
+
+
+@lru_cache(maxsize=8192)
+def normalize_char(ch: str) -> str:
+    """
+    1文字を正規化する
+
+    NFKC（全角英数・半角カナの統一を含む）→ カタカナのひらがな化 → 小文字化の順に適用する。
+    結果は0文字以上の文字列（例: 「㌔」→「きろ」、半角濁点は結合文字）になる。
+    """
+    normalized = unicodedata.normalize('NFKC', ch)
+    folded = []
+    for c in normalized:
+        code = ord(c)
+        if _KATAKANA_START <= code <= _KATAKANA_END:
+            c = chr(code - _KANA_OFFSET)
+        folded.append(c)
+    return ''.join(folded).lower()
+
+
+@lru_cache(maxsize=8192)
+def _normalize_piece(ch: str) -> Tuple[str, bool]:
+    """正規化結果と、元の1文字に1文字で対応するかどうかを返す"""
+    normalized = normalize_char(ch)
+    return normalized, len(normalized) == 1 and not unicodedata.combining(normalized)
+
+
+class NormalizedText:
+    """正規化済みテキストと元テキストへのオフセット対応表"""
+
+    __slots__ = ('text', 'starts', 'ends')
+
+    def __init__(self, text: str, starts: Optional[array] = None, ends: Optional[array] = None):
+        self.text = text
+        # 1文字ずつ対応する場合は対応表を持たない（恒等写像）
+        self.starts = starts
+        self.ends = ends
+
+    def to_original(self, start: int, end: int) -> Tuple[int, int]:
+        """正規化後の範囲 [start, end) を元テキストの範囲に変換"""
+        if self.starts is None:
+            return start, end
+        return self.starts[start], self.ends[end - 1]
+
+
+def normalize_text(text: str) -> str:
+    """テキストを正規化する（オフセット対応表なし）"""
+    return normalize_with_offsets(text).text
+
+
+def normalize_with_offsets(text: str) -> NormalizedText:
+    """
+    テキストを正規化し、元テキストへのオフセット対応表を作成する
+
+    Args:
+        text: 元テキスト
+
+    Returns:
+        NormalizedText（正規化後の各文字について元テキストでの開始・終了位置を保持）
+    """
+    chars = []
+    starts = None
+    ends = None
+
+    for index, ch in enumerate(text):
+        normalized, simple = _normalize_piece(ch)
+        if simple:
+            chars.append(normalized)
+            if starts is not None:
+                starts.append(index)
+                ends.append(index + 1)
+            continue
+
+        # 1対1で対応しない文字が現れた時点で対応表を作成する
+        if starts is None:
+            starts = array('l', range(len(chars)))
+            ends = array('l', range(1, len(chars) + 1))
+
+        for c in normalized:
+            # 結合文字（半角カナの濁点など）は直前の文字と合成する
+            if chars and unicodedata.combining(c):
+                composed = unicodedata.normalize('NFC', chars[-1] + c)
+                if len(composed) == 1:
+                    chars[-1] = composed
+                    ends[-1] = index + 1
+                    continue
+            chars.append(c)
+            starts.append(index)
+            ends.append(index + 1)
+
+    return NormalizedText(''.join(chars), starts, ends)
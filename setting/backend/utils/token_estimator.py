@@ -0,0 +1,99 @@
+"""
+トークン数推定モジュール
+Claude APIを呼び出さずに、テキストのトークン数を文字種ごとの係数から推定する
+日本語（漢字・かな）を多く含むプロンプトの大きさの比較・確認に使う概算値
+"""
+
+import re
+from typing import Dict, Any
+
+# 文字種ごとの1文字あたりのトークン数（概算）
+KANJI_TOKENS_PER_CHAR = 1.0
+KANA_TOKENS_PER_CHAR = 0.8
+SYMBOL_TOKENS_PER_CHAR = 1.0
+# 英数字は単語ごとに何文字で1トークンになるか
+ASCII_CHARS_PER_TOKEN = 4
+
+_KANJI_RANGES = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3005\u3006'
+_KANA_RANGES = '\u3040-\u30ff\uff66-\uff9f'
+_KANJI = re.compile(f'[{_KANJI_RANGES}]')
+_KANA = re.compile(f'[{_KANA_RANGES}]')
+_ASCII_WORD = re.compile(r'[A-Za-z0-9]+')
+_SYMBOL = re.compile(f'[^\\sA-Za-z0-9{_KANJI_RANGES}{_KANA_RANGES}]')
+
+
+def _count(pattern: re.Pattern, text: str) -> int:
+    return sum(1 for _ in pattern.finditer(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    テキストのトークン数を推定
+
+    漢字・かな・記号は1文字ごと、英数字は単語ごとに文字数から推定し、空白は数えない
+    """
+    if not text:
+        return 0
+    ascii_tokens = sum(
+        -(-len(word) // ASCII_CHARS_PER_TOKEN) for word in _ASCII_WORD.findall(text)
+    )
+    return int(round(
+        _count(_KANJI, text) * KANJI_TOKENS_PER_CHAR
+        + _count(_KANA, text) * KANA_TOKENS_PER_CHAR
+        + _count(_SYMBOL, text) * SYMBOL_TOKENS_PER_CHAR
+        + ascii_tokens
+    ))
+
+
+class TokenEstimator:
+    """
+    実際のトークン数で補正するトークン数推定
+
+    APIレスポンスの usage から得た実際の入力トークン数と推定値の比を指数移動平均で保持し、推定値に掛ける
+    """
+
+    def __init__(self, scale: float = 1.0, smoothing: float = 0.2, min_scale: float = 0.5, max_scale: float = 2.0):
+        """
+        Args:
+            scale: 初期の補正係数
+            smoothing: 新しい観測値の重み（0〜1）
+            min_scale: 補正係数の下限
+            max_scale: 補正係数の上限
+        """
+        self.scale = scale
+        self.smoothing = smoothing
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.observations = 0
+
+    def estimate(self, text: str) -> int:
+        """補正後の推定トークン数"""
+        return self.apply(estimate_tokens(text))
+
+    def apply(self, raw_tokens: int) -> int:
+        """estimate_tokens() の推定値に補正係数を掛ける"""
+        return int(raw_tokens * self.scale + 0.5)
+
+    def unapply(self, tokens: int) -> int:
+        """補正後のトークン数を estimate_tokens() の単位に戻す"""
+        return int(tokens / self.scale)
+
+    def observe(self, raw_tokens: int, actual_tokens: int) -> None:
+        """
+        実際のトークン数を記録して補正係数を更新
+
+        Args:
+            raw_tokens: 送信したテキストの estimate_tokens() の推定値
+            actual_tokens: APIが返した実際のトークン数
+        """
+        if raw_tokens <= 0 or actual_tokens <= 0:
+            return
+        ratio = min(max(actual_tokens / raw_tokens, self.min_scale), self.max_scale)
+        # 最初の観測値はそのまま使い、以降は少しずつ寄せる
+        weight = 1.0 if self.observations == 0 else self.smoothing
+        self.scale = self.scale * (1 - weight) + ratio * weight
+        self.observations += 1
+
+    def get_status(self) -> Dict[str, Any]:
+        """補正係数と観測回数"""
+        return {'scale': round(self.scale, 4), 'observations': self.observations}
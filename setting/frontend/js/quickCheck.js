@@ -1,10 +1,24 @@
 /**
  * 薬機法リスクチェッカー ローカル簡易チェック機能
  * Claude APIを呼び出す前に、明らかなNG表現を即座に検出
+ * サーバーのNG表現パターンバンドルを読み込めた場合はそれを優先して使用
  */
 
 class QuickChecker {
     constructor() {
+        // サーバーから取得したパターンバンドル（未取得時は内蔵パターンを使用）
+        this.bundle = null;
+        // 商品カテゴリごとのマッチャー（使用時に構築）
+        this.automata = new Map();
+        
+        // 商品カテゴリの表記ゆれ（サーバーの CATEGORY_ALIASES と同じ）
+        this.categoryAliases = {
+            'サプリメント': 'サプリメント・健康食品',
+            '健康食品': 'サプリメント・健康食品',
+            '美容機器': '美容機器・健康器具・その他',
+            '健康器具': '美容機器・健康器具・その他'
+        };
+        
         // 明らかなNG表現のデータベース
         this.ngPatterns = {
             // 効果・効能の断定的表現
@@ -50,7 +64,7 @@ class QuickChecker {
             }
         };
         
-        // カテゴリ別の特殊ルール
+        // カテゴリ別の特殊ルール（パターンバンドル未取得時のみ使用）
         this.categorySpecificRules = {
             'サプリメント': ['病気', '疾病', '疾患', '症状', '診断', '処方'],
             '化粧品': ['シミが消える', 'シワが消える', 'たるみ解消', '美白効果', 'アンチエイジング'],
@@ -59,6 +73,179 @@ class QuickChecker {
         };
     }
     
+    /**
+     * サーバーのNG表現パターンバンドルを読み込む
+     * バンドル本体は内容ハッシュ付きURLでブラウザに無期限キャッシュされ、
+     * CSVが更新された場合のみ再ダウンロードされる
+     * @returns {Promise<boolean>} 読み込みに成功したか
+     */
+    async loadPatternBundle() {
+        const api = window.yakkiApi;
+        if (!api || !api.baseUrl) {
+            return false;
+        }
+        
+        try {
+            const headers = api.apiKey ? { 'X-API-Key': api.apiKey } : {};
+            
+            const infoResponse = await fetch(`${api.baseUrl}/api/patterns`, { headers });
+            if (!infoResponse.ok) {
+                throw new Error(`HTTP ${infoResponse.status}: ${infoResponse.statusText}`);
+            }
+            const info = await infoResponse.json();
+            
+            if (this.bundle && this.bundle.version === info.version) {
+                return true;
+            }
+            
+            const bundleResponse = await fetch(`${api.baseUrl}${info.url}`, { headers });
+            if (!bundleResponse.ok) {
+                throw new Error(`HTTP ${bundleResponse.status}: ${bundleResponse.statusText}`);
+            }
+            
+            this.setPatternBundle(await bundleResponse.json());
+            console.log(`NG表現パターンバンドル読み込み完了: v${info.version}（${this.bundle.keys.length}語）`);
+            return true;
+            
+        } catch (error) {
+            console.warn('NG表現パターンバンドルの読み込みに失敗 - 内蔵パターンを使用します:', error.message);
+            return false;
+        }
+    }
+    
+    /**
+     * パターンバンドルを設定（マッチャーは商品カテゴリごとに使用時に構築）
+     * @param {Object} bundle - サーバーが配信するパターンバンドル
+     */
+    setPatternBundle(bundle) {
+        this.bundle = bundle;
+        this.automata = new Map();
+        
+        // 各パターンの対象カテゴリ（空は全カテゴリ共通）
+        const categoriesIndex = bundle.fields.indexOf('categories');
+        this.patternCategories = bundle.patterns.map(values =>
+            categoriesIndex >= 0 && values[categoriesIndex] ? values[categoriesIndex].split('|') : []
+        );
+    }
+    
+    /**
+     * 商品カテゴリに該当するパターンのマッチャー（Aho-Corasick法）を取得
+     * @param {string} category - 商品カテゴリ
+     * @returns {Object} オートマトンのルート
+     */
+    getAutomaton(category) {
+        const key = this.categoryAliases[category] || category || '';
+        if (this.automata.has(key)) {
+            return this.automata.get(key);
+        }
+        
+        const root = { next: new Map(), fail: null, out: [] };
+        
+        for (const [patternKey, patternId] of this.bundle.keys) {
+            const categories = this.patternCategories[patternId];
+            if (categories.length && !categories.includes(key)) {
+                continue;
+            }
+            let node = root;
+            for (const ch of patternKey) {
+                let child = node.next.get(ch);
+                if (!child) {
+                    child = { next: new Map(), fail: root, out: [] };
+                    node.next.set(ch, child);
+                }
+                node = child;
+            }
+            node.out.push([patternId, [...patternKey].length]);
+        }
+        
+        // 失敗リンクを幅優先で構築し、出力を接尾辞状態から引き継ぐ
+        const queue = [...root.next.values()];
+        for (let head = 0; head < queue.length; head++) {
+            const node = queue[head];
+            for (const [ch, child] of node.next) {
+                let fail = node.fail;
+                while (fail && !fail.next.has(ch)) {
+                    fail = fail.fail;
+                }
+                child.fail = fail ? fail.next.get(ch) : root;
+                child.out = child.out.concat(child.fail.out);
+                queue.push(child);
+            }
+        }
+        
+        this.automata.set(key, root);
+        return root;
+    }
+    
+    /**
+     * サーバーと同じ規則でテキストを正規化（NFKC・カタカナ→ひらがな・小文字化）
+     * @param {string} text - 元テキスト
+     * @returns {Object} 正規化後の文字配列と、各文字の元テキストでの開始・終了位置
+     */
+    normalizeWithOffsets(text) {
+        const chars = [];
+        const starts = [];
+        const ends = [];
+        let index = 0;
+        
+        for (const ch of text) {
+            const end = index + ch.length;
+            const normalized = ch.normalize('NFKC')
+                .replace(/[\u30A1-\u30F6]/g, c => String.fromCharCode(c.charCodeAt(0) - 0x60))
+                .toLowerCase();
+            
+            for (const c of normalized) {
+                // 結合文字（半角カナの濁点など）は直前の文字と合成する
+                if (chars.length && /\p{M}/u.test(c)) {
+                    const composed = (chars[chars.length - 1] + c).normalize('NFC');
+                    if ([...composed].length === 1) {
+                        chars[chars.length - 1] = composed;
+                        ends[ends.length - 1] = end;
+                        continue;
+                    }
+                }
+                chars.push(c);
+                starts.push(index);
+                ends.push(end);
+            }
+            index = end;
+        }
+        
+        return { chars, starts, ends };
+    }
+    
+    /**
+     * パターンバンドルでNG表現を検出（重なりは最長一致を優先）
+     * @param {string} text - チェック対象のテキスト
+     * @param {string} category - 商品カテゴリ
+     * @returns {Array} [開始位置, 終了位置, パターンID] の配列
+     */
+    scanWithBundle(text, category) {
+        const { chars, starts, ends } = this.normalizeWithOffsets(text);
+        const root = this.getAutomaton(category);
+        const hits = [];
+        let node = root;
+        
+        chars.forEach((ch, i) => {
+            while (node !== root && !node.next.has(ch)) {
+                node = node.fail;
+            }
+            node = node.next.get(ch) || root;
+            for (const [patternId, length] of node.out) {
+                hits.push([starts[i - length + 1], ends[i], patternId]);
+            }
+        });
+        
+        hits.sort((a, b) => (b[1] - b[0]) - (a[1] - a[0]) || a[0] - b[0]);
+        const selected = [];
+        for (const hit of hits) {
+            if (selected.every(s => hit[1] <= s[0] || s[1] <= hit[0])) {
+                selected.push(hit);
+            }
+        }
+        return selected.sort((a, b) => a[0] - b[0]);
+    }
+    
     /**
      * テキストの簡易チェックを実行
      * @param {string} text - チェック対象のテキスト
@@ -74,24 +261,43 @@ class QuickChecker {
             checkedIn: 0
         };
         
-        // 基本的なNG表現チェック
-        for (const [patternType, pattern] of Object.entries(this.ngPatterns)) {
-            for (const word of pattern.words) {
-                if (text.includes(word)) {
-                    results.hasIssues = true;
-                    results.issues.push({
-                        word: word,
-                        type: patternType,
-                        message: pattern.message,
-                        riskLevel: pattern.riskLevel,
-                        position: text.indexOf(word)
-                    });
+        // サーバーのパターンバンドルによるNG表現チェック（カテゴリ別のNG表現を含む）
+        if (this.bundle) {
+            const fields = this.bundle.fields;
+            for (const [start, end, patternId] of this.scanWithBundle(text, category)) {
+                const values = this.bundle.patterns[patternId];
+                const pattern = Object.fromEntries(fields.map((field, i) => [field, values[i]]));
+                results.hasIssues = true;
+                results.issues.push({
+                    word: text.slice(start, end),
+                    type: pattern.pattern,
+                    message: pattern.reason || '薬機法上問題となる可能性がある表現です',
+                    riskLevel: pattern.risk_level || '中',
+                    position: start
+                });
+            }
+        }
+        
+        // 基本的なNG表現チェック（パターンバンドル未取得時の内蔵パターン）
+        if (!this.bundle) {
+            for (const [patternType, pattern] of Object.entries(this.ngPatterns)) {
+                for (const word of pattern.words) {
+                    if (text.includes(word)) {
+                        results.hasIssues = true;
+                        results.issues.push({
+                            word: word,
+                            type: patternType,
+                            message: pattern.message,
+                            riskLevel: pattern.riskLevel,
+                            position: text.indexOf(word)
+                        });
+                    }
                 }
             }
         }
         
-        // カテゴリ別の特殊ルールチェック
-        if (this.categorySpecificRules[category]) {
+        // カテゴリ別の特殊ルールチェック（パターンバンドル未取得時）
+        if (!this.bundle && this.categorySpecificRules[category]) {
             for (const word of this.categorySpecificRules[category]) {
                 if (text.includes(word)) {
                     results.hasIssues = true;
@@ -180,5 +386,6 @@ class QuickChecker {
 
 // グローバルに公開
 window.quickChecker = new QuickChecker();
+window.quickChecker.loadPatternBundle();
 
 console.log('薬機法リスクチェッカー quickCheck.js 読み込み完了');
\ No newline at end of file